@@ -1,60 +1,137 @@
 """
 Raspberry Pi motor control using PCA9685 (keeps original logic).
 Relies on a module `PCA9685` providing `PCA9685.setPWMFreq` and `setMotorPwm(chan, duty)`.
+
+Motor remembers the last duty written to each of the 8 PWM channels and skips the I2C
+transaction when a channel is unchanged, so repeating the same command costs nothing.
+RampedMotor moves towards the commanded duties at a bounded rate on a background
+timer; brake() bypasses the ramp. FakePCA9685 stands in for the board off-device and
+records every write (python scripts/bench_motor.py compares the variants).
 """
+import threading
 import time
 
-try:
-    from PCA9685 import PCA9685  # Provided by your board/vendor library
-except Exception as e:
-    raise SystemExit("Missing PCA9685 module. Install your vendor's `PCA9685` Python lib.\n"
-                     f"Import error: {e}")
+class FakePCA9685:
+    """Records setMotorPwm traffic; write_s simulates the I2C transaction time."""
+
+    def __init__(self, address=0x40, debug=False, write_s: float = 0.0):
+        self.write_s = write_s
+        self.log = []  # (perf_counter time, channel, duty)
+
+    def setPWMFreq(self, freq):
+        pass
+
+    def setMotorPwm(self, channel, duty):
+        if self.write_s:
+            time.sleep(self.write_s)
+        self.log.append((time.perf_counter(), channel, duty))
+
+    @property
+    def writes(self) -> int:
+        return len(self.log)
+
+def default_pwm():
+    try:
+        from PCA9685 import PCA9685  # Provided by your board/vendor library
+    except Exception as e:
+        raise SystemExit("Missing PCA9685 module. Install your vendor's `PCA9685` Python lib.\n"
+                         f"Import error: {e}")
+    return PCA9685(0x40, debug=True)
 
 class Motor:
-    def __init__(self):
-        self.pwm = PCA9685(0x40, debug=True)
+    def __init__(self, pwm=None, coalesce: bool = True):
+        self.pwm = pwm if pwm is not None else default_pwm()
         self.pwm.setPWMFreq(50)
+        self.coalesce = coalesce
+        self.channels = [None] * 8  # last duty written per channel
+        self.writes = self.skipped = 0
+
+    def _write(self, chan, duty):
+        if self.coalesce and self.channels[chan] == duty:
+            self.skipped += 1
+            return
+        self.pwm.setMotorPwm(chan, duty)
+        self.channels[chan] = duty
+        self.writes += 1
 
     def duty_range(self, d1, d2, d3, d4):
         def clamp(v):
             return 4095 if v > 4095 else (-4095 if v < -4095 else v)
         return clamp(d1), clamp(d2), clamp(d3), clamp(d4)
 
-    def left_Upper_Wheel(self, duty):
+    def _wheel(self, fwd_chan, rev_chan, duty):
+        # forward: rev channel 0, fwd channel duty; reverse: the other way round; 0: both high (brake)
         if duty > 0:
-            self.pwm.setMotorPwm(0, 0); self.pwm.setMotorPwm(1, duty)
+            self._write(rev_chan, 0); self._write(fwd_chan, duty)
         elif duty < 0:
-            self.pwm.setMotorPwm(1, 0); self.pwm.setMotorPwm(0, abs(duty))
+            self._write(fwd_chan, 0); self._write(rev_chan, abs(duty))
         else:
-            self.pwm.setMotorPwm(0, 4095); self.pwm.setMotorPwm(1, 4095)
+            self._write(rev_chan, 4095); self._write(fwd_chan, 4095)
+
+    def left_Upper_Wheel(self, duty):
+        self._wheel(1, 0, duty)
 
     def left_Lower_Wheel(self, duty):
-        if duty > 0:
-            self.pwm.setMotorPwm(3, 0); self.pwm.setMotorPwm(2, duty)
-        elif duty < 0:
-            self.pwm.setMotorPwm(2, 0); self.pwm.setMotorPwm(3, abs(duty))
-        else:
-            self.pwm.setMotorPwm(2, 4095); self.pwm.setMotorPwm(3, 4095)
+        self._wheel(2, 3, duty)
 
     def right_Upper_Wheel(self, duty):
-        if duty > 0:
-            self.pwm.setMotorPwm(6, 0); self.pwm.setMotorPwm(7, duty)
-        elif duty < 0:
-            self.pwm.setMotorPwm(7, 0); self.pwm.setMotorPwm(6, abs(duty))
-        else:
-            self.pwm.setMotorPwm(6, 4095); self.pwm.setMotorPwm(7, 4095)
+        self._wheel(7, 6, duty)
 
     def right_Lower_Wheel(self, duty):
-        if duty > 0:
-            self.pwm.setMotorPwm(4, 0); self.pwm.setMotorPwm(5, duty)
-        elif duty < 0:
-            self.pwm.setMotorPwm(5, 0); self.pwm.setMotorPwm(4, abs(duty))
-        else:
-            self.pwm.setMotorPwm(4, 4095); self.pwm.setMotorPwm(5, 4095)
+        self._wheel(5, 4, duty)
 
     def setMotorModel(self, d1, d2, d3, d4):
         d1, d2, d3, d4 = self.duty_range(d1, d2, d3, d4)
         self.left_Upper_Wheel(d1)
         self.left_Lower_Wheel(d2)
         self.right_Upper_Wheel(d3)
-        self.right_Lower_Wheel(d4)
\ No newline at end of file
+        self.right_Lower_Wheel(d4)
+
+    def brake(self):
+        self.setMotorModel(0, 0, 0, 0)
+
+    def close(self):
+        self.brake()
+
+    def stats(self) -> str:
+        return f"{self.writes} PWM writes, {self.skipped} unchanged skipped"
+
+class RampedMotor:
+    """Wraps a Motor: setMotorModel() sets a target that a timer thread approaches at `rate` duty/s."""
+
+    def __init__(self, motor: Motor, rate: float = 4000.0, period: float = 0.02):
+        self.motor, self.rate, self.period = motor, rate, period
+        self.target = [0, 0, 0, 0]
+        self.current = [0, 0, 0, 0]
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="motor-ramp", daemon=True)
+        self.thread.start()
+
+    def setMotorModel(self, d1, d2, d3, d4):
+        with self.lock:
+            self.target = list(self.motor.duty_range(d1, d2, d3, d4))
+
+    def brake(self):
+        """Immediate stop, not ramped."""
+        with self.lock:
+            self.target = [0, 0, 0, 0]
+            self.current = [0, 0, 0, 0]
+            self.motor.brake()
+
+    def _run(self):
+        step = self.rate * self.period
+        while not self.stop_event.wait(self.period):
+            with self.lock:
+                if self.current == self.target:
+                    continue
+                self.current = [c + max(-step, min(step, t - c)) for c, t in zip(self.current, self.target)]
+                self.motor.setMotorModel(*(int(round(c)) for c in self.current))
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join(timeout=1.0)
+        self.brake()
+
+    def stats(self) -> str:
+        return self.motor.stats()
@@ -0,0 +1,231 @@
+"""
+Background HC-SR04 ranging: edge-timed echoes, a fixed sample rate and a filtered,
+non-blocking latest() for the robot loop.
+
+A worker thread fires the trigger at `rate_hz` and sleeps until the echo's falling edge
+(or the timeout) instead of spinning on GPIO.input; the echo edges are timestamped in
+the GPIO edge callback. Each distance goes into a short window; latest() returns the
+median of the in-range samples after dropping those more than `max_jump_cm` from the
+window median, with the time of the last sample and whether it is stale.
+
+Backends:
+    RPiGPIOBackend   RPi.GPIO with add_event_detect(BOTH) on the echo pin; the edge
+                     direction alternates from the level read before each trigger
+    FakeEchoBackend  simulated echoes (distance function, noise, dropouts, outliers)
+                     for running the service and its filtering on any machine
+
+Usage:
+    python -m raspberry.ranging --trigger 23 --echo 24        # on the Pi
+    python -m raspberry.ranging --fake --seconds 3            # anywhere
+"""
+import argparse
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import numpy as np
+
+SPEED_OF_SOUND_CM_S = 34300.0  # ~343 m/s
+
+EdgeCallback = Callable[[bool, float], None]  # (rising, perf_counter timestamp)
+
+class RPiGPIOBackend:
+    def __init__(self, trigger_pin: int = 23, echo_pin: int = 24):
+        import RPi.GPIO as GPIO  # type: ignore
+        self.GPIO, self.trigger_pin, self.echo_pin = GPIO, trigger_pin, echo_pin
+        self.high = False  # echo level after the last edge
+
+    def setup(self, on_edge: EdgeCallback) -> None:
+        GPIO = self.GPIO
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(self.trigger_pin, GPIO.OUT, initial=GPIO.LOW)
+        GPIO.setup(self.echo_pin, GPIO.IN)
+
+        def edge(ch):
+            # Reading GPIO.input(ch) here would see the level after a short echo has already
+            # ended; edges alternate, so toggle instead, timestamped on entry.
+            t = time.perf_counter()
+            self.high = not self.high
+            on_edge(self.high, t)
+        GPIO.add_event_detect(self.echo_pin, GPIO.BOTH, callback=edge)
+
+    def trigger(self) -> None:
+        self.high = bool(self.GPIO.input(self.echo_pin))  # resync between pings, when no edge is due
+        # 10µs trigger pulse
+        self.GPIO.output(self.trigger_pin, self.GPIO.HIGH)
+        time.sleep(1e-5)
+        self.GPIO.output(self.trigger_pin, self.GPIO.LOW)
+
+    def cleanup(self) -> None:
+        self.GPIO.remove_event_detect(self.echo_pin)
+        self.GPIO.cleanup((self.trigger_pin, self.echo_pin))
+
+class FakeEchoBackend:
+    """Echo edges for a simulated target at distance_fn(t) cm, delivered from a timer thread."""
+
+    def __init__(self, distance_fn: Optional[Callable[[float], float]] = None, noise_cm: float = 0.5,
+                 dropout: float = 0.0, outlier: float = 0.0, latency_s: float = 2e-4, seed: int = 0):
+        self.distance_fn = distance_fn or (lambda t: 100.0)
+        self.noise_cm, self.dropout, self.outlier, self.latency_s = noise_cm, dropout, outlier, latency_s
+        self.rng = random.Random(seed)
+        self.on_edge: Optional[EdgeCallback] = None
+        self.t0 = time.perf_counter()
+
+    def setup(self, on_edge: EdgeCallback) -> None:
+        self.on_edge = on_edge
+
+    def trigger(self) -> None:
+        t = time.perf_counter()
+        if self.rng.random() < self.dropout:
+            return  # no echo
+        if self.rng.random() < self.outlier:
+            d = self.rng.uniform(2, 400)
+        else:
+            d = self.distance_fn(t - self.t0) + self.rng.gauss(0, self.noise_cm)
+        width = 2 * max(d, 0.0) / SPEED_OF_SOUND_CM_S
+        t_rise = t + self.latency_s
+
+        def fire():
+            self.on_edge(True, t_rise)
+            self.on_edge(False, t_rise + width)
+        timer = threading.Timer(self.latency_s + width, fire)
+        timer.daemon = True
+        timer.start()
+
+    def cleanup(self) -> None:
+        pass
+
+@dataclass
+class Reading:
+    distance_cm: float  # filtered; inf when most recent samples had no echo
+    raw_cm: float       # last single measurement
+    t: float            # perf_counter time of the last measurement
+    age_s: float        # seconds since then, at the latest() call
+    stale: bool         # age_s above the ranger's stale_after
+
+class Ranger:
+    def __init__(self, backend, rate_hz: float = 15.0, timeout_s: float = 0.03, window: int = 5,
+                 min_cm: float = 2.0, max_cm: float = 400.0, max_jump_cm: float = 30.0,
+                 stale_after: float = 0.25):
+        self.backend, self.rate_hz, self.timeout_s = backend, rate_hz, timeout_s
+        self.min_cm, self.max_cm, self.max_jump_cm, self.stale_after = min_cm, max_cm, max_jump_cm, stale_after
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+        self.echo_done = threading.Event()
+        self.stop_event = threading.Event()
+        self.t_rise = self.t_fall = None
+        self.last: Optional[tuple] = None  # (filtered, raw, t)
+        self.n_samples = self.n_timeouts = 0
+        self.thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "Ranger":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self.backend.setup(self._on_edge)
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="ranger", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+        self.backend.cleanup()
+
+    def _on_edge(self, rising: bool, t: float) -> None:
+        if rising:
+            self.t_rise = t
+        elif self.t_rise is not None:
+            self.t_fall = t
+            self.echo_done.set()
+
+    def _measure(self) -> float:
+        """One trigger/echo cycle; inf on timeout. The thread sleeps while waiting."""
+        self.t_rise = self.t_fall = None
+        self.echo_done.clear()
+        self.backend.trigger()
+        if not self.echo_done.wait(2 * self.timeout_s):
+            return float("inf")
+        width = self.t_fall - self.t_rise
+        return float("inf") if width > self.timeout_s else width * SPEED_OF_SOUND_CM_S / 2.0
+
+    def filtered(self) -> float:
+        """Median of in-range window samples near the window median; inf if most samples had no echo."""
+        valid = np.array([d for d in self.samples if self.min_cm <= d <= self.max_cm])
+        if len(valid) * 2 <= len(self.samples):
+            return float("inf")
+        inliers = valid[np.abs(valid - np.median(valid)) <= self.max_jump_cm]
+        return float(np.median(inliers))
+
+    def _run(self) -> None:
+        period = 1.0 / self.rate_hz
+        t_next = time.perf_counter()
+        while not self.stop_event.wait(max(0.0, t_next - time.perf_counter())):
+            t_next = max(t_next + period, time.perf_counter())  # fixed rate, no catch-up bursts
+            raw = self._measure()
+            t = time.perf_counter()
+            with self.lock:
+                self.samples.append(raw)
+                self.n_samples += 1
+                self.n_timeouts += raw == float("inf")
+                self.last = (self.filtered(), raw, t)
+
+    def latest(self) -> Optional[Reading]:
+        """Most recent filtered distance without blocking; None before the first sample."""
+        with self.lock:
+            last = self.last
+        if last is None:
+            return None
+        age = time.perf_counter() - last[2]
+        return Reading(last[0], last[1], last[2], age, age > self.stale_after)
+
+    def stats(self) -> str:
+        return f"{self.n_samples} pings, {self.n_timeouts} without echo"
+
+def make_ranger(spec: str, **kw) -> Optional[Ranger]:
+    """Ranger from a --ultrasonic option: '' (none), 'fake' or 'TRIGGER,ECHO' BCM pins."""
+    if not spec:
+        return None
+    if spec == "fake":
+        return Ranger(FakeEchoBackend(), **kw)
+    trigger, echo = (int(v) for v in spec.split(","))
+    return Ranger(RPiGPIOBackend(trigger, echo), **kw)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Background ultrasonic ranging (HC-SR04)")
+    ap.add_argument("--trigger", type=int, default=23, help="BCM pin for TRIGGER")
+    ap.add_argument("--echo", type=int, default=24, help="BCM pin for ECHO")
+    ap.add_argument("--fake", action="store_true", help="simulated sensor: a target swinging 30-150 cm with noise")
+    ap.add_argument("--rate", type=float, default=15.0, help="pings per second")
+    ap.add_argument("--seconds", type=float, default=0.0, help="stop after this long (0: until Ctrl+C)")
+    args = ap.parse_args()
+
+    if args.fake:
+        backend = FakeEchoBackend(lambda t: 90 + 60 * np.sin(t), noise_cm=1.0, dropout=0.05, outlier=0.05)
+    else:
+        backend = RPiGPIOBackend(args.trigger, args.echo)
+    t_end = time.perf_counter() + args.seconds if args.seconds else float("inf")
+    cpu0 = time.process_time()
+    with Ranger(backend, rate_hz=args.rate) as ranger:
+        try:
+            while time.perf_counter() < t_end:
+                time.sleep(0.2)
+                r = ranger.latest()
+                if r is not None:
+                    print(f"Distance: {r.distance_cm:7.2f} cm (raw {r.raw_cm:7.2f}, age {r.age_s * 1e3:4.0f} ms"
+                          f"{', STALE' if r.stale else ''})")
+        except KeyboardInterrupt:
+            pass
+        print(f"{ranger.stats()}; process CPU {time.process_time() - cpu0:.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+"""
+Event-loop robot runtime: camera, vision, ranging and motors as independent asyncio tasks.
+
+robot_run.py does capture -> detect -> classify -> drive -> sleep in one thread, so the
+motors are updated at the pace of the slowest stage and nothing notices a hung
+classifier. Here every task runs at its own rate and only the latest value is shared:
+
+    camera    reads frames (the blocking read runs in an I/O thread), keeps the newest
+    vision    detects, tracks and classifies the newest frame in an executor thread;
+              frames that arrive meanwhile are dropped, a run longer than
+              --vision-deadline is a deadline miss
+    ranging   polls the background Ranger and brakes as soon as an obstacle shows up
+    motor     drives the current decision at --motor-hz (Motor skips unchanged PWM
+              writes, so repeating it is free); obstacles and "no sign" brake
+    watchdog  zeroes the motors and holds them there while the newest decision is older
+              than --stale (frame capture time to now): hung vision, dead camera
+
+Periodic tasks record how late they wake up against their period; every deadline is
+summarized at exit.
+
+With --simulate the camera pastes a sign image onto a blank frame along a scripted
+timeline, the echo sensor is a FakeEchoBackend and the motors a FakePCA9685. The
+scripted events (sign appears, obstacle, obstacle gone, vision hangs, sign gone) are
+matched against the motor commands and the reaction latency of each is printed.
+
+Usage:
+    python -m raspberry.robot_async --model models/knn.npz --ultrasonic 23,24
+    python -m raspberry.robot_async --source data/frames --fake-motor --seconds 10
+    python -m raspberry.robot_async --simulate --model models/knn.npz
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from tsr.cascade import predict_confidence
+from tsr.detect import CircleDetector, PRESETS, parse_roi
+from tsr.features import crops_to_features
+from tsr.npz_model import load_bundle
+from tsr.online import ModelWatcher
+from tsr.sources import FrameSource
+from tsr.tracking import SignTracker
+from raspberry.ranging import FakeEchoBackend, Ranger, make_ranger
+from raspberry.robot_run import open_camera
+from raspberry.speed_profiles import duty_tuple
+
+STOP_COMMANDS = ("brake", "obstacle", "watchdog")  # every other command is a sign label to drive at
+
+class Deadline:
+    """Count of samples over a budget: wake-up lateness of a periodic task, or job duration."""
+
+    def __init__(self, name: str, budget_s: float):
+        self.name, self.budget_s = name, budget_s
+        self.n = self.misses = 0
+        self.worst = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.n += 1
+        self.misses += seconds > self.budget_s
+        self.worst = max(self.worst, seconds)
+
+    def __str__(self) -> str:
+        return (f"{self.name}: {self.misses}/{self.n} over {self.budget_s * 1e3:.0f} ms "
+                f"(worst {self.worst * 1e3:.1f} ms)")
+
+async def every(period: float, deadline: Deadline, stop: asyncio.Event):
+    """Tick at a fixed rate without catch-up bursts, recording how late each tick fires."""
+    t_next = time.perf_counter()
+    while not stop.is_set():
+        delay = t_next - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        now = time.perf_counter()
+        deadline.record(now - t_next)
+        yield now
+        t_next = max(t_next + period, time.perf_counter())
+
+@dataclass
+class Decision:
+    label: Optional[str]  # None: no sign in view
+    t_frame: float        # perf_counter time the frame was captured
+    t_done: float
+
+class RobotRuntime:
+    def __init__(self, cam: FrameSource, bundle: dict, detector: CircleDetector, motor,
+                 ranger: Optional[Ranger] = None, watcher: Optional[ModelWatcher] = None,
+                 camera_hz: float = 30.0, motor_hz: float = 50.0, sensor_hz: float = 20.0,
+                 watchdog_hz: float = 20.0, vision_deadline: float = 0.15, stale_s: float = 0.5,
+                 brake_cm: float = 25.0, min_confidence: float = 0.0,
+                 before_vision: Optional[Callable[[], None]] = None, log: Callable[[str], None] = print):
+        self.cam, self.bundle, self.detector, self.motor = cam, bundle, detector, motor
+        self.ranger, self.watcher, self.log = ranger, watcher, log
+        self.camera_hz, self.motor_hz, self.sensor_hz, self.watchdog_hz = camera_hz, motor_hz, sensor_hz, watchdog_hz
+        self.vision_deadline, self.stale_s, self.brake_cm = vision_deadline, stale_s, brake_cm
+        self.min_confidence = min_confidence
+        self.before_vision = before_vision
+        self.tracker = SignTracker()
+        self.deadlines: Dict[str, Deadline] = {
+            "camera": Deadline("camera tick", 1.0 / camera_hz),
+            "vision": Deadline("vision job", vision_deadline),
+            "ranging": Deadline("ranging tick", 1.0 / sensor_hz),
+            "motor": Deadline("motor tick", 1.0 / motor_hz),
+            "watchdog": Deadline("watchdog tick", 1.0 / watchdog_hz),
+        }
+        self.frame: Optional[Tuple[np.ndarray, float, int]] = None  # (image, capture time, sequence number)
+        self.decision: Optional[Decision] = None
+        self.obstacle = ranger is not None  # blocked until the first range reading
+        self.tripped = False
+        self.commands: List[Tuple[float, str]] = []  # (perf_counter time, command) on every change
+        self.frames_read = self.frames_dropped = 0
+        self.io_pool = ThreadPoolExecutor(1, thread_name_prefix="camera")
+        self.vision_pool = ThreadPoolExecutor(1, thread_name_prefix="vision")
+
+    def command(self, cmd: str, now: float) -> None:
+        if cmd in STOP_COMMANDS:
+            self.motor.brake()
+        else:
+            self.motor.setMotorModel(*duty_tuple(cmd, reverse=True))
+        if not self.commands or self.commands[-1][1] != cmd:
+            self.commands.append((now, cmd))
+
+    def classify(self, crops):
+        feats = crops_to_features([cv2.cvtColor(c, cv2.COLOR_BGR2RGB) for c in crops], self.bundle.get("pipeline"))
+        if not self.min_confidence:
+            return [self.bundle["classes"][p] for p in self.bundle["model"].predict(feats)]
+        pred, conf = predict_confidence(self.bundle["model"], feats)
+        return [self.bundle["classes"][p] if c >= self.min_confidence else None for p, c in zip(pred, conf)]
+
+    def perceive(self, frame: np.ndarray) -> Optional[str]:
+        """Label of the nearest (largest) confidently tracked sign, or None. Runs in the vision thread."""
+        if self.before_vision is not None:
+            self.before_vision()
+        circles, crops = self.detector(frame)
+        tracks = self.tracker.update(circles, crops, self.classify)
+        track = max((t for t in tracks if t.label is not None), key=lambda t: t.r, default=None)
+        return None if track is None else str(track.label)
+
+    def reload(self) -> Optional[dict]:
+        """Vision thread: swap in a bundle updated by tsr.online, dropping the old labels."""
+        bundle = self.watcher.poll()
+        if bundle is not None:
+            self.bundle, self.tracker = bundle, SignTracker()
+        return bundle
+
+    async def camera_task(self) -> None:
+        loop = asyncio.get_running_loop()
+        async for _ in every(1.0 / self.camera_hz, self.deadlines["camera"], self.stop):
+            img = await loop.run_in_executor(self.io_pool, self.cam.read)
+            if img is None:
+                self.log("Frame source exhausted.")
+                self.stop.set()
+                return
+            self.frames_read += 1
+            self.frame = (img, time.perf_counter(), self.frames_read)
+            self.new_frame.set()
+
+    async def vision_task(self) -> None:
+        loop = asyncio.get_running_loop()
+        seen = 0
+        while True:
+            await self.new_frame.wait()
+            self.new_frame.clear()
+            img, t_frame, seq = self.frame
+            self.frames_dropped += seq - seen - 1
+            seen = seq
+            if self.watcher is not None and await loop.run_in_executor(self.vision_pool, self.reload):
+                self.log(f"Reloaded model (version {self.bundle.get('version', 0)})")
+            t0 = time.perf_counter()
+            job = loop.run_in_executor(self.vision_pool, self.perceive, img)
+            done, _ = await asyncio.wait({job}, timeout=self.vision_deadline)
+            if not done:
+                self.log(f"Vision over its {self.vision_deadline * 1e3:.0f} ms deadline; waiting for it.")
+            label = await job
+            t_done = time.perf_counter()
+            self.deadlines["vision"].record(t_done - t0)
+            if self.decision is None or label != self.decision.label:
+                self.log(f"Detected sign: {label}" if label is not None else "No circle detected.")
+            self.decision = Decision(label, t_frame, t_done)
+
+    async def ranging_task(self) -> None:
+        async for now in every(1.0 / self.sensor_hz, self.deadlines["ranging"], self.stop):
+            r = self.ranger.latest()
+            blocked = r is None or r.stale or r.distance_cm < self.brake_cm
+            if blocked != self.obstacle:
+                self.log(("Obstacle: " + ("no recent range reading" if r is None or r.stale
+                                          else f"{r.distance_cm:.0f} cm") + "; braking.") if blocked
+                         else "Obstacle cleared.")
+                self.obstacle = blocked
+            if blocked and not self.tripped:
+                self.command("obstacle", now)  # now, not at the next motor tick
+
+    async def motor_task(self) -> None:
+        async for now in every(1.0 / self.motor_hz, self.deadlines["motor"], self.stop):
+            if self.tripped:
+                continue  # the watchdog holds the motors at zero
+            d = self.decision
+            if self.obstacle:
+                self.command("obstacle", now)
+            elif d is None or d.label is None:
+                self.command("brake", now)
+            else:
+                self.command(d.label, now)
+
+    async def watchdog_task(self) -> None:
+        t_start = time.perf_counter()
+        async for now in every(1.0 / self.watchdog_hz, self.deadlines["watchdog"], self.stop):
+            d = self.decision
+            age = now - (d.t_frame if d is not None else t_start)
+            if age > self.stale_s and not self.tripped:
+                self.log(f"Watchdog: newest decision is {age * 1e3:.0f} ms old; motors to zero.")
+                self.tripped = True
+                self.command("watchdog", now)
+            elif age <= self.stale_s and self.tripped:
+                self.log("Watchdog: decisions fresh again.")
+                self.tripped = False
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            self.log(f"Task {task.get_name()} failed: {task.exception()!r}; stopping.")
+            self.stop.set()
+
+    async def run(self, seconds: float = 0.0) -> None:
+        """Run every task until the source ends, a task fails, `seconds` pass or stop is set."""
+        self.stop, self.new_frame = asyncio.Event(), asyncio.Event()
+        coros = {"camera": self.camera_task(), "vision": self.vision_task(),
+                 "motor": self.motor_task(), "watchdog": self.watchdog_task()}
+        if self.ranger is not None:
+            coros["ranging"] = self.ranging_task()
+        tasks = [asyncio.create_task(c, name=name) for name, c in coros.items()]
+        for t in tasks:
+            t.add_done_callback(self._task_done)
+        try:
+            await asyncio.wait_for(self.stop.wait(), seconds or None)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.stop.set()
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.command("brake", time.perf_counter())
+            self.io_pool.shutdown(wait=False, cancel_futures=True)
+            self.vision_pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> str:
+        return "\n".join([f"Frames: {self.frames_read} read, {self.frames_dropped} skipped while vision was busy"]
+                         + [f"Deadline {d}" for d in self.deadlines.values() if d.n])
+
+class SimCamera(FrameSource):
+    """Camera stand-in: blank frames at `fps`, with a sign image pasted in while visible() is true."""
+
+    def __init__(self, sign_bgr: np.ndarray, visible: Callable[[], bool], fps: float = 30.0,
+                 size: Tuple[int, int] = (640, 480), sign_px: int = 200):
+        super().__init__(ring_size=0)
+        w, h = size
+        self.blank = np.full((h, w, 3), 90, np.uint8)
+        self.with_sign = self.blank.copy()
+        y, x = (h - sign_px) // 2, (w - sign_px) // 2
+        self.with_sign[y:y + sign_px, x:x + sign_px] = cv2.resize(sign_bgr, (sign_px, sign_px))
+        self.visible, self.fps = visible, fps
+        self.t_next = 0.0
+
+    def _open(self) -> None:
+        self.t_next = time.perf_counter()
+
+    def _grab(self, out):
+        delay = self.t_next - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)  # a camera read blocks until the next frame is exposed
+        self.t_next = max(self.t_next + 1.0 / self.fps, time.perf_counter())
+        return (self.with_sign if self.visible() else self.blank).copy()
+
+@dataclass
+class Scenario:
+    """Scripted simulation timeline, in seconds from start()."""
+    sign_on: float = 0.5
+    obstacle_on: float = 1.5
+    obstacle_off: float = 2.5
+    hang_on: float = 3.5
+    hang_s: float = 1.0
+    sign_off: float = 5.5
+    end: float = 6.5
+    t0: float = 0.0
+
+    def start(self) -> None:
+        self.t0 = time.perf_counter()
+
+    def now(self) -> float:
+        return time.perf_counter() - self.t0
+
+    def sign_visible(self) -> bool:
+        return self.sign_on <= self.now() < self.sign_off
+
+    def distance_cm(self, _t: float = 0.0) -> float:
+        return 10.0 if self.obstacle_on <= self.now() < self.obstacle_off else 100.0
+
+    def hang(self) -> None:
+        """Vision thread: stall once for hang_s when the hang starts."""
+        left = self.hang_on + self.hang_s - self.now()
+        if self.hang_on <= self.now() and left > 0:
+            time.sleep(left)
+
+    def expectations(self) -> List[Tuple[str, float, Callable[[str], bool]]]:
+        """(event, time, does a motor command answer it)."""
+        drive = lambda c: c not in STOP_COMMANDS
+        return [("sign appears", self.sign_on, drive),
+                ("obstacle", self.obstacle_on, lambda c: c == "obstacle"),
+                ("obstacle gone", self.obstacle_off, drive),
+                ("vision hangs", self.hang_on, lambda c: c == "watchdog"),
+                ("vision back", self.hang_on + self.hang_s, drive),
+                ("sign gone", self.sign_off, lambda c: c == "brake")]
+
+def reaction_latencies(sc: Scenario, commands: List[Tuple[float, str]]) -> List[Tuple[str, float, Optional[float], str]]:
+    """(event, time, seconds until the first command answering it or None, that command)."""
+    rows = []
+    for name, t_event, answers in sc.expectations():
+        hit = next(((t - sc.t0, c) for t, c in commands if t - sc.t0 >= t_event and answers(c)), None)
+        rows.append((name, t_event, hit[0] - t_event if hit else None, hit[1] if hit else "-"))
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="models/knn.joblib",
+                    help="model bundle from tsr.knn_baseline (.joblib), its NumPy-only export (.npz) or a tsr.cnn network (.npz)")
+    ap.add_argument("--source", default="picamera", help="picamera, camera index, video file or image folder")
+    ap.add_argument("--red-mask", action="store_true", help="only search around red blobs")
+    ap.add_argument("--pyramid", type=int, default=0, help="detect on a frame downscaled this many times by 2")
+    ap.add_argument("--roi", default="", help="search region as frame fractions x0,y0,x1,y1 (e.g. 0.5,0,1,0.7)")
+    ap.add_argument("--reload-every", type=float, default=1.0,
+                    help="seconds between checks for an updated model bundle (0: never reload)")
+    ap.add_argument("--ultrasonic", default="", help="obstacle sensor: TRIGGER,ECHO BCM pins, 'fake', or '' for none")
+    ap.add_argument("--brake-cm", type=float, default=25.0, help="stop when the filtered distance is below this")
+    ap.add_argument("--ramp", type=float, default=4000.0, help="max duty change per second between speeds (0: jump)")
+    ap.add_argument("--fake-motor", action="store_true", help="record PWM writes instead of driving a PCA9685")
+    ap.add_argument("--min-confidence", type=float, default=0.0,
+                    help="ignore classifications less confident than this (0..1; 0: keep all)")
+    ap.add_argument("--camera-hz", type=float, default=30.0, help="frame reads per second")
+    ap.add_argument("--motor-hz", type=float, default=50.0, help="motor command updates per second")
+    ap.add_argument("--sensor-hz", type=float, default=20.0, help="range checks per second")
+    ap.add_argument("--watchdog-hz", type=float, default=20.0, help="watchdog checks per second")
+    ap.add_argument("--vision-deadline", type=float, default=0.15, help="budget of one detect+classify run (s)")
+    ap.add_argument("--stale", type=float, default=0.5, help="watchdog: max age of the newest decision (s)")
+    ap.add_argument("--seconds", type=float, default=0.0, help="stop after this long (0: until the source ends or Ctrl+C)")
+    ap.add_argument("--simulate", action="store_true",
+                    help="fake camera, echo sensor and motors on a scripted timeline; prints reaction latencies")
+    ap.add_argument("--sim-sign", default="data/train/50.bmp", help="image the simulated camera shows as the sign")
+    args = ap.parse_args()
+
+    bundle = load_bundle(args.model)
+    detector = CircleDetector(PRESETS["robot"], red_mask=args.red_mask, pyramid=args.pyramid,
+                              roi=parse_roi(args.roi), pad=15)
+    from raspberry.motor import Motor, RampedMotor, FakePCA9685  # PCA9685 imported only for real motors
+    motor = Motor(FakePCA9685() if args.fake_motor or args.simulate else None)
+    if args.ramp:
+        motor = RampedMotor(motor, rate=args.ramp)
+
+    sc = None
+    if args.simulate:
+        sc = Scenario()
+        sign = cv2.imread(args.sim_sign)
+        if sign is None:
+            raise SystemExit(f"Could not read {args.sim_sign}")
+        cam = SimCamera(sign, sc.sign_visible, fps=args.camera_hz)
+        ranger = Ranger(FakeEchoBackend(sc.distance_cm, noise_cm=1.0))
+        watcher, seconds = None, args.seconds or sc.end
+    else:
+        cam, ranger = open_camera(args.source, ring_size=0), make_ranger(args.ultrasonic)  # vision holds frames across reads
+        watcher, seconds = ModelWatcher(args.model, args.reload_every), args.seconds
+    rt = RobotRuntime(cam, bundle, detector, motor, ranger, watcher,
+                      camera_hz=args.camera_hz, motor_hz=args.motor_hz, sensor_hz=args.sensor_hz,
+                      watchdog_hz=args.watchdog_hz, vision_deadline=args.vision_deadline, stale_s=args.stale,
+                      brake_cm=args.brake_cm, min_confidence=args.min_confidence, before_vision=sc.hang if sc else None)
+
+    print("Robot runtime started. Ctrl+C to stop.")
+    try:
+        with cam:
+            if ranger is not None:
+                ranger.start()
+            if sc is not None:
+                sc.start()
+            asyncio.run(rt.run(seconds))
+    except KeyboardInterrupt:
+        print("Stopping...")
+    finally:
+        motor.close()
+        if ranger is not None:
+            ranger.stop()
+        print(rt.stats())
+        print("Tracking:", rt.tracker.stats())
+        print("Motors:", motor.stats())
+        if ranger is not None:
+            print("Ranging:", ranger.stats())
+    if sc is not None:
+        print(f"{'event':<16}{'at s':>6}{'reaction ms':>14}  command")
+        for name, t_event, latency, cmd in reaction_latencies(sc, rt.commands):
+            print(f"{name:<16}{t_event:>6.2f}{'missed' if latency is None else f'{latency * 1e3:.0f}':>14}  {cmd}")
+
+if __name__ == "__main__":
+    main()
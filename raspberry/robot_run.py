@@ -1,85 +1,177 @@
 """
 Run the robot loop:
-- Capture image with Picamera2
-- Detect circle (Hough)
-- Crop/resize to 100x100
-- Flatten RGB and classify with models/knn.joblib
-- Map class label to motor duties and drive
+- Stream frames from Picamera2 (or a camera index / video / image folder for off-device runs)
+- Detect circles (Hough) and crop/resize them to 100x100
+- Track signs across frames; flatten RGB (through the bundle's feature pipeline, if any) and
+  classify with models/knn.joblib only new or changed tracks
+- Map the nearest sign's vote-smoothed label to motor duties and drive; with --min-confidence,
+  classifications below it (kNN vote share, or a cascade's calibrated confidence) do not vote
+- With --ultrasonic, brake whenever the background ranger reports an obstacle (or goes stale)
+
+Usage:
+    python -m raspberry.run_robot                                  # Picamera2 stream
+    python -m raspberry.run_robot --source data/frames --dwell 0   # replay a folder
+    python -m raspberry.run_robot --model models/knn.npz           # NumPy-only model: no sklearn/joblib import
+    python -m raspberry.run_robot --ultrasonic 23,24 --brake-cm 25  # HC-SR04 on BCM 23/24 (or "fake")
+    python -m raspberry.run_robot --source data/frames --fake-motor --ultrasonic fake   # no hardware at all
+
+The time to first decision (first motor command) is printed, split into imports, model
+load and the first frame.
+
+This loop is sequential; raspberry/robot_async.py runs the same stages as concurrent
+tasks with deadlines and a stale-decision watchdog.
 """
 import time
-from pathlib import Path
+T_START = time.perf_counter()
+
+import argparse
+from contextlib import nullcontext
 
 import cv2
-import numpy as np
-import joblib
 
-from tsr.features import image_array_to_rgb_list
-from raspberry.motor import Motor
+from tsr.detect import CircleDetector, PRESETS, parse_roi
+from tsr.cascade import predict_confidence
+from tsr.features import crops_to_features
+from tsr.instrument import make_timer
+from tsr.npz_model import load_bundle
+from tsr.online import ModelWatcher
+from tsr.sources import FrameSource, make_source
+from tsr.tracking import SignTracker
+from raspberry.ranging import make_ranger
 from raspberry.speed_profiles import duty_tuple
-from raspberry.camera_still import capture_to
-
-IMG_PATH = Path("/home/pi/TIPE/image.jpg")  # you can change this path
-
-def detect_crop(img_bgr: np.ndarray):
-    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
-    gray = cv2.medianBlur(gray, 5)
-    circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, 1, 20,
-                               param1=150, param2=40, minRadius=80, maxRadius=150)
-    if circles is None:
-        return None
-    circles = np.uint16(np.around(circles))
-    x, y, r = circles[0, :][0]  # take first
-    # bounding box with small expansion
-    expansion = 15
-    x0 = max(x - r - expansion, 0)
-    y0 = max(y - r - expansion, 0)
-    x1 = min(x + r + expansion, img_bgr.shape[1])
-    y1 = min(y + r + expansion, img_bgr.shape[0])
-    crop = img_bgr[y0:y1, x0:x1]
-    if crop.size == 0:
-        return None
-    crop = cv2.resize(crop, (100, 100), interpolation=cv2.INTER_AREA)
-    return crop
+
+T_IMPORTED = time.perf_counter()
+
+def open_camera(source: str, ring_size: int = 2) -> FrameSource:
+    """'picamera' keeps a Picamera2 stream open; anything else goes to tsr.sources.make_source."""
+    if source == "picamera":
+        from raspberry.camera_stream import Picamera2Source
+        return Picamera2Source(ring_size=ring_size)
+    return make_source(source, ring_size=ring_size)
 
 def main():
-    bundle = joblib.load("models/knn.joblib")
-    clf = bundle["model"]; classes = bundle["classes"]
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="models/knn.joblib",
+                    help="model bundle from tsr.knn_baseline (.joblib), its NumPy-only export (.npz) or a tsr.cnn network (.npz)")
+    ap.add_argument("--source", default="picamera", help="picamera, camera index, video file or image folder")
+    ap.add_argument("--dwell", type=float, default=0.2, help="pause between iterations (s)")
+    ap.add_argument("--red-mask", action="store_true", help="only search around red blobs")
+    ap.add_argument("--pyramid", type=int, default=0, help="detect on a frame downscaled this many times by 2")
+    ap.add_argument("--roi", default="", help="search region as frame fractions x0,y0,x1,y1 (e.g. 0.5,0,1,0.7)")
+    ap.add_argument("--stats", type=float, default=5.0, help="seconds between stage timing log lines (0: off)")
+    ap.add_argument("--trace", default="", help="optional per-iteration timing trace (.csv or .jsonl)")
+    ap.add_argument("--reload-every", type=float, default=1.0,
+                    help="seconds between checks for an updated model bundle (0: never reload)")
+    ap.add_argument("--ultrasonic", default="", help="obstacle sensor: TRIGGER,ECHO BCM pins, 'fake', or '' for none")
+    ap.add_argument("--brake-cm", type=float, default=25.0, help="stop when the filtered distance is below this")
+    ap.add_argument("--ramp", type=float, default=4000.0, help="max duty change per second between speeds (0: jump)")
+    ap.add_argument("--fake-motor", action="store_true", help="record PWM writes instead of driving a PCA9685")
+    ap.add_argument("--min-confidence", type=float, default=0.0,
+                    help="ignore classifications less confident than this (0..1; 0: keep all)")
+    args = ap.parse_args()
+    timer = make_timer(args.stats, args.trace, stages=("capture", "detect", "classify", "motor"))
+
+    t_load = time.perf_counter()
+    bundle = load_bundle(args.model)
+    t_loaded = time.perf_counter()
+    watcher = ModelWatcher(args.model, args.reload_every)
+
+    @timer.timed("classify")
+    def classify(crops):
+        feats = crops_to_features([cv2.cvtColor(c, cv2.COLOR_BGR2RGB) for c in crops], bundle.get("pipeline"))
+        if not args.min_confidence:
+            return [bundle["classes"][p] for p in bundle["model"].predict(feats)]
+        pred, conf = predict_confidence(bundle["model"], feats)
+        return [bundle["classes"][p] if c >= args.min_confidence else None for p, c in zip(pred, conf)]
 
-    motor = Motor()
+    from raspberry.motor import Motor, RampedMotor, FakePCA9685  # PCA9685 imported only for real motors
+    motor = Motor(FakePCA9685() if args.fake_motor else None)
+    if args.ramp:
+        motor = RampedMotor(motor, rate=args.ramp)
+    tracker = SignTracker()
+    ranger = make_ranger(args.ultrasonic)
+    detector = CircleDetector(PRESETS["robot"], red_mask=args.red_mask, pyramid=args.pyramid,
+                              roi=parse_roi(args.roi), pad=15)
     print("Robot loop started. Ctrl+C to stop.")
+    decided = False
+
+    def first_decision():
+        nonlocal decided
+        if not decided:
+            decided = True
+            t = time.perf_counter()
+            print(f"Time to first decision: {t - T_START:.2f} s (imports {T_IMPORTED - T_START:.2f} s, "
+                  f"model load {t_loaded - t_load:.2f} s, camera + first frame {t - t_loaded:.2f} s)")
 
     try:
-        while True:
-            # 1) Capture
-            capture_to(str(IMG_PATH))
-            img = cv2.imread(str(IMG_PATH))
-
-            # 2) Detect & crop
-            crop = detect_crop(img)
-            if crop is None:
-                print("No circle detected; stopping motors for safety.")
-                motor.setMotorModel(0, 0, 0, 0)
-                time.sleep(0.2)
-                continue
-
-            # 3) Classify
-            feat = np.array([image_array_to_rgb_list(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB))], dtype=float)
-            pred = clf.predict(feat)[0]
-            label = classes[pred]
-            print("Detected sign:", label)
-
-            # 4) Drive
-            d = duty_tuple(str(label), reverse=True)
-            motor.setMotorModel(*d)
-
-            # Small dwell so we don't hammer motors
-            time.sleep(0.2)
+        with open_camera(args.source) as cam, (ranger or nullcontext()):
+            while True:
+                # 1) Capture (in-memory frame from the open stream)
+                with timer.stage("capture"):
+                    img = cam.read()
+                if img is None:
+                    print("Frame source exhausted.")
+                    break
+
+                # Between frames: swap in a model updated by tsr.online, drop labels of the old one
+                new_bundle = watcher.poll()
+                if new_bundle is not None:
+                    bundle = new_bundle
+                    tracker = SignTracker()
+                    print(f"Reloaded {args.model} (version {bundle.get('version', 0)})")
+
+                # Obstacle braking preempts the signs; no or stale readings count as blocked
+                if ranger is not None:
+                    r = ranger.latest()
+                    if r is None or r.stale or r.distance_cm < args.brake_cm:
+                        print("Obstacle: " + ("no recent range reading" if r is None or r.stale
+                                              else f"{r.distance_cm:.0f} cm") + "; braking.")
+                        with timer.stage("motor"):
+                            motor.brake()
+                        first_decision()
+                        timer.frame_done(circles=0, label="brake")
+                        time.sleep(args.dwell)
+                        continue
+
+                # 2) Detect & crop
+                with timer.stage("detect"):
+                    circles, crops = detector(img)
+
+                # 3) Classify new/changed tracks; the largest circle is the nearest sign
+                tracks = tracker.update(circles, crops, classify)
+                track = max((t for t in tracks if t.label is not None), key=lambda t: t.r, default=None)
+                if track is None:
+                    print("No circle detected" if not tracks else "No confident classification",
+                          "; stopping motors for safety.", sep="")
+                    with timer.stage("motor"):
+                        motor.brake()
+                    first_decision()
+                    timer.frame_done(circles=len(circles))
+                    time.sleep(args.dwell)
+                    continue
+                label = track.label
+                print(f"Detected sign: {label} (track {track.id}, {track.confidence:.0%} of votes)")
+
+                # 4) Drive
+                with timer.stage("motor"):
+                    motor.setMotorModel(*duty_tuple(str(label), reverse=True))
+                first_decision()
+                timer.frame_done(circles=len(circles), label=str(label))
+
+                # Small dwell so we don't hammer motors
+                time.sleep(args.dwell)
 
     except KeyboardInterrupt:
         print("Stopping...")
     finally:
-        motor.setMotorModel(0, 0, 0, 0)
+        motor.close()
+        print("Tracking:", tracker.stats())
+        print("Motors:", motor.stats())
+        if ranger is not None:
+            print("Ranging:", ranger.stats())
+        if timer.enabled:
+            print(timer.log_line())
+            timer.close()
 
 if __name__ == "__main__":
-    import numpy as np
     main()
\ No newline at end of file
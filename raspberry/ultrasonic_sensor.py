@@ -7,6 +7,8 @@ Usage:
 Notes:
     - Requires running on a Raspberry Pi with RPi.GPIO installed.
     - Press Ctrl+C to exit cleanly.
+    - measure_distance() busy-waits and blocks for up to 2x the timeout; inside the robot
+      loop use raspberry.ranging.Ranger (background thread, edge-timed, filtered).
 """
 import argparse
 import time
@@ -1,91 +1,178 @@
 """Augment dataset images using transformations inspired by the original 'base de données.py' script.
 
+Every sample gets its own seed derived from (--seed, class, sample index), so a run is
+reproducible whatever the number of worker processes. With --all, every class folder
+of a dataset root is augmented at once on a process pool; --features skips the PNG
+round trip and writes the augmented samples as a feature matrix (X, labels) that
+tsr.knn_baseline --extra appends to its training split. The .npz also records each
+sample's source image (`sources`, relative to the dataset root as in the feature store
+index), so augmentations of test or held-out fold images can be dropped.
+
 Usage:
     python scripts/augment_dataset.py --src data/train/90 --dst data/train/90_aug --n 40
+    python scripts/augment_dataset.py --all data/train --dst data/train_aug --n 1000 --workers 4
+    python scripts/augment_dataset.py --all data/train --features models/aug_features.npz --n 1000
 """
-import argparse, random
+import argparse, os
+from multiprocessing import Pool
 from pathlib import Path
 import numpy as np
 import cv2
-from PIL import Image
 
-def bruit(image_orig):
-    h, w, c = image_orig.shape
-    n = np.random.randn(h, w, c) * random.randint(5, 30)
+from tsr.features import images_to_feature_matrix, feature_dim
+
+EXTENSIONS = {'.png','.jpg','.jpeg','.bmp'}
+
+def bruit(image_orig, rng=None):
+    rng = rng or np.random.default_rng()
+    n = rng.standard_normal(image_orig.shape, dtype=np.float32) * rng.integers(5, 31)
     return np.clip(image_orig + n, 0, 255).astype(np.uint8)
 
 def change_gamma(image, alpha=1.0, beta=0.0):
-    return np.clip(alpha * image + beta, 0, 255).astype(np.uint8)
+    return np.clip(np.float32(alpha) * image + np.float32(beta), 0, 255).astype(np.uint8)
+
+def vertical_gradient(h, w, c):
+    """HxWxC float32 ramp going from 0 on the top row to (h-1)/h on the bottom row."""
+    return np.ascontiguousarray(np.broadcast_to((np.arange(h, dtype=np.float32) / h)[:, None, None], (h, w, c)))
 
-def modif_img(img):
+def modif_img(img, rng=None):
+    rng = rng or np.random.default_rng()
     img = img.copy()
     h, w, c = img.shape
 
-    # replace a gray color by random color
-    r_color = [np.random.randint(255), np.random.randint(255), np.random.randint(255)]
-    img = np.where(img == [142, 142, 142], r_color, img).astype(np.uint8)
+    # replace a gray color by random color (channel by channel, as the original np.where did)
+    r_color = rng.integers(255, size=3).astype(np.uint8)
+    np.copyto(img, r_color, where=img == 142)
 
-    if np.random.randint(3):
+    if rng.integers(3):
         k_max = 3
-        kernel_blur = np.random.randint(k_max) * 2 + 1
+        kernel_blur = int(rng.integers(k_max)) * 2 + 1
         img = cv2.GaussianBlur(img, (kernel_blur, kernel_blur), 0)
 
-    M = cv2.getRotationMatrix2D((int(w/2), int(h/2)), random.randint(-10, 10), 1)
+    M = cv2.getRotationMatrix2D((int(w/2), int(h/2)), int(rng.integers(-10, 11)), 1)
     img = cv2.warpAffine(img, M, (w, h))
 
-    if np.random.randint(2):
+    if rng.integers(2):
         a = int(max(w, h)/5) + 1
         pts1 = np.float32([[0,0],[w,0],[0,h],[w,h]])
-        pts2 = np.float32([
-            [0+random.randint(-a,a), 0+random.randint(-a,a)],
-            [w-random.randint(-a,a), 0+random.randint(-a,a)],
-            [0+random.randint(-a,a), h-random.randint(-a,a)],
-            [w-random.randint(-a,a), h-random.randint(-a,a)]
-        ])
+        pts2 = np.float32(pts1 + rng.integers(-a, a + 1, size=(4, 2)))
         M = cv2.getPerspectiveTransform(pts1, pts2)
         img = cv2.warpPerspective(img, M, (w, h))
 
-    if not np.random.randint(4):
-        t = np.empty((h, w, c), dtype=np.float32)
-        for i in range(h):
-            for j in range(w):
-                for k in range(c):
-                    t[i][j][k] = (i / h)
-        M = cv2.getRotationMatrix2D((int(w/2), int(h/2)), np.random.randint(4)*90, 1)
-        t = cv2.warpAffine(t, M, (w, h))
-        img = (cv2.multiply((img/255).astype(np.float32), t) * 255).astype(np.uint8)
+    if not rng.integers(4):
+        M = cv2.getRotationMatrix2D((int(w/2), int(h/2)), int(rng.integers(4))*90, 1)
+        t = cv2.warpAffine(vertical_gradient(h, w, c), M, (w, h))
+        img = (img * t).astype(np.uint8)
 
-    img = change_gamma(img, random.uniform(0.6, 1.0), -np.random.randint(50))
+    img = change_gamma(img, rng.uniform(0.6, 1.0), -int(rng.integers(50)))
 
-    if not np.random.randint(4):
-        p = (15 + np.random.randint(10)) / 100
-        img = (img*p + 50*(1-p)).astype(np.uint8) + np.random.randint(100)
+    if not rng.integers(4):
+        p = (15 + int(rng.integers(10))) / 100
+        img = (img*np.float32(p) + np.float32(50*(1-p))).astype(np.uint8) + np.uint8(rng.integers(100))
 
-    img = bruit(img)
+    img = bruit(img, rng)
     return img
 
+def list_images(folder):
+    return sorted(p for p in Path(folder).iterdir() if p.suffix.lower() in EXTENSIONS)
+
+def sample_rng(seed, class_idx, i):
+    """Independent generator for sample i of a class; the same for any worker layout."""
+    return np.random.default_rng([seed, class_idx, i])
+
+_SOURCES = {}
+
+def augment_sample(task):
+    """(class_idx, i, out path or '') -> (augmented BGR image, source path), or None once written."""
+    class_idx, i, out = task
+    paths = _SOURCES["classes"][class_idx][1]
+    rng = sample_rng(_SOURCES["seed"], class_idx, i)
+    src = paths[rng.integers(len(paths))]
+    base = cv2.imread(str(src))
+    if base is None:
+        return None
+    img = modif_img(base, rng)
+    if out:
+        cv2.imwrite(out, img)
+        return None
+    return img, src
+
+def _init_worker(classes, seed):
+    cv2.setNumThreads(1)  # parallelism comes from the pool
+    _SOURCES.update(classes=classes, seed=seed)
+
+def make_tasks(classes, n, dst=None):
+    """One task per sample; `classes` is [(label, source paths)], `dst` a root for PNG output."""
+    tasks = []
+    for class_idx, (label, paths) in enumerate(classes):
+        if dst is not None:
+            (dst / label).mkdir(parents=True, exist_ok=True)
+        for i in range(n):
+            out = str(dst / label / f"aug_{i:04d}.png") if dst is not None else ""
+            tasks.append((class_idx, i, out))
+    return tasks
+
+def run_tasks(tasks, classes, seed, workers):
+    if workers == 1:
+        _init_worker(classes, seed)
+        yield from map(augment_sample, tasks)
+        return
+    with Pool(workers, _init_worker, (classes, seed)) as pool:
+        yield from pool.imap(augment_sample, tasks, chunksize=16)
+
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--src", required=True, help="source class folder with images")
-    ap.add_argument("--dst", required=True, help="destination folder for augmented images")
-    ap.add_argument("--n", type=int, default=40, help="number of augmented samples to generate")
+    ap.add_argument("--src", help="source class folder with images")
+    ap.add_argument("--all", help="dataset root: augment every class subfolder")
+    ap.add_argument("--dst", help="destination folder (with --all: root for one subfolder per class)")
+    ap.add_argument("--features", default="", help="with --all: write (X, labels) to this .npz instead of PNG files")
+    ap.add_argument("--n", type=int, default=40, help="number of augmented samples to generate (per class with --all)")
+    ap.add_argument("--seed", type=int, default=0, help="base seed; every sample is seeded from it")
+    ap.add_argument("--workers", type=int, default=0, help="worker processes (default: all cores)")
     args = ap.parse_args()
+    if bool(args.src) == bool(args.all):
+        ap.error("give exactly one of --src or --all")
+    if not (args.dst or args.features) or (args.features and not args.all):
+        ap.error("give --dst, or --all with --features")
+
+    if args.src:
+        classes = [(Path(args.src).name, list_images(args.src))]
+    else:
+        classes = [(d.name, list_images(d)) for d in sorted(Path(args.all).iterdir()) if d.is_dir()]
+    for label, paths in classes:
+        if not paths:
+            raise SystemExit(f"No images in class folder {label}")
+    workers = args.workers or os.cpu_count() or 1
+
+    if args.features:
+        tasks = make_tasks(classes, args.n)
+        X, labels, sources, row = None, [], [], 0
+        for (class_idx, *_), res in zip(tasks, run_tasks(tasks, classes, args.seed, workers)):
+            if res is None:
+                continue
+            img, src = res
+            if X is None:
+                X = np.empty((len(tasks), feature_dim(img.shape)), dtype=np.float32)
+            images_to_feature_matrix([cv2.cvtColor(img, cv2.COLOR_BGR2RGB)], out=X[row:row + 1])
+            labels.append(classes[class_idx][0])
+            sources.append(os.path.relpath(src, args.all))
+            row += 1
+        if X is None:
+            raise SystemExit("No sample could be generated")
+        np.savez(args.features, X=X[:row], labels=np.array(labels), sources=np.array(sources))
+        print(f"Saved {row} augmented feature rows to {args.features}")
+        return
 
-    src = Path(args.src)
     dst = Path(args.dst)
-    dst.mkdir(parents=True, exist_ok=True)
-
-    imgs = sorted([p for p in src.iterdir() if p.suffix.lower() in {'.png','.jpg','.jpeg','.bmp'}])
-    if not imgs:
-        raise SystemExit(f"No images in {src}")
-
-    for i in range(args.n):
-        base = cv2.imread(str(random.choice(imgs)))
-        if base is None:
-            continue
-        out = modif_img(base)
-        cv2.imwrite(str(dst / f"aug_{i:03d}.png"), out)
-    print(f"Saved {args.n} images to {dst}")
+    if args.src:
+        # single folder: files go straight into --dst, as before
+        tasks = [(0, i, str(dst / f"aug_{i:03d}.png")) for i in range(args.n)]
+        dst.mkdir(parents=True, exist_ok=True)
+    else:
+        tasks = make_tasks(classes, args.n, dst)
+    for _ in run_tasks(tasks, classes, args.seed, workers):
+        pass
+    print(f"Saved {len(tasks)} images to {dst}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,55 @@
+"""Recall@k and queries/second of the IVF index against exact search as the database grows.
+
+The database is synthetic: augmented-looking clusters around class prototypes, in the
+dimension of a compact feature pipeline (e.g. thumb=10,hist=8,pca=32 -> 32).
+
+Usage:
+    PYTHONPATH=src python scripts/bench_ann.py --sizes 1000 10000 100000 --dim 32 --nprobe 1 4 16
+"""
+import argparse, time
+
+import numpy as np
+
+from tsr.ann import IVFKNNClassifier
+from tsr.knn_fast import KNNIndex
+
+def synthetic(n: int, dim: int, n_protos: int, rng) -> tuple:
+    protos = rng.standard_normal((n_protos, dim)).astype(np.float32) * 4
+    y = rng.integers(0, n_protos, n)
+    X = protos[y] + rng.standard_normal((n, dim)).astype(np.float32)
+    return X, y
+
+def exact_neighbours(index: KNNIndex, Q: np.ndarray, k: int, batch: int = 256) -> np.ndarray:
+    return np.concatenate([index.kneighbors(Q[i:i + batch], k)[1] for i in range(0, len(Q), batch)])
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--dim", type=int, default=32)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16])
+    ap.add_argument("--protos", type=int, default=200, help="synthetic clusters (signs x variants)")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'n':>8}{'method':>14}{'recall@k':>10}{'q/s':>10}")
+    for n in args.sizes:
+        X, y = synthetic(n + args.queries, args.dim, args.protos, rng)
+        X, Q = X[:n], X[n:]
+
+        exact = KNNIndex(X, y[:n], k=args.k, dtype=np.float32)
+        t0 = time.perf_counter()
+        truth = exact_neighbours(exact, Q, args.k)
+        print(f"{n:>8}{'exact':>14}{1.0:>10.3f}{len(Q) / (time.perf_counter() - t0):>10.0f}")
+
+        ivf = IVFKNNClassifier(n_neighbors=args.k).fit(X, y[:n])
+        for nprobe in args.nprobe:
+            t0 = time.perf_counter()
+            _, idx = ivf.kneighbors(Q, nprobe=nprobe)
+            qps = len(Q) / (time.perf_counter() - t0)
+            recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(idx, truth)])
+            print(f"{n:>8}{f'ivf p={nprobe}':>14}{recall:>10.3f}{qps:>10.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare the NumPy CNN (float32 and int8 weights) with the kNN on the data/train test split.
+
+Both see the split of tsr.knn_baseline (random_state=0, test_size=0.25); the kNN is
+fitted on its train rows, the CNN is whatever --model was trained on (train it with
+tsr.cnn_train on the same split). Latency is per crop, one crop per call as in the
+robot loop, and per crop of a whole-split batch; "alloc" is the peak Python heap
+allocated by a warm single-crop call, which the reused activation buffers keep small.
+
+Usage:
+    PYTHONPATH=src python -m tsr.cnn_train --data data/train --out models/cnn.npz
+    PYTHONPATH=src python scripts/bench_cnn.py --data data/train --model models/cnn.npz
+"""
+import argparse, os, tempfile, time, tracemalloc
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from tsr.cnn import CNNClassifier
+from tsr.feature_store import load_features
+from tsr.knn_fast import KNNIndex
+
+def per_crop_ms(predict, X: np.ndarray, repeat: int = 3) -> tuple:
+    """(ms per crop one at a time, ms per crop in one batch), best of `repeat`."""
+    predict(X[:1]); predict(X)  # warm the buffers of both shapes
+    single, batch = [], []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for i in range(len(X)):
+            predict(X[i:i + 1])
+        t1 = time.perf_counter()
+        predict(X)
+        single.append(t1 - t0); batch.append(time.perf_counter() - t1)
+    return 1e3 * min(single) / len(X), 1e3 * min(batch) / len(X)
+
+def alloc_kb(predict, x: np.ndarray) -> float:
+    predict(x)
+    tracemalloc.start()
+    predict(x)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data", default="data/train", help="dataset root with class subfolders")
+    ap.add_argument("--store", default="", help="optional feature store directory")
+    ap.add_argument("--model", default="models/cnn.npz", help="tsr.cnn network (.npz)")
+    ap.add_argument("--k", type=int, default=5, help="k of the kNN baseline")
+    args = ap.parse_args()
+
+    X, labels = load_features(args.data, args.store)
+    classes = sorted(set(labels))
+    y = np.array([classes.index(lbl) for lbl in labels], dtype=int)
+    train, test = train_test_split(np.arange(len(y)), random_state=0, test_size=0.25)
+    X_test, y_test = np.asarray(X[test]), y[test]
+
+    cnn = CNNClassifier.from_npz(args.model)
+    if cnn.class_names != classes:
+        raise SystemExit(f"{args.model} classes {cnn.class_names} differ from the dataset's {classes}")
+    with tempfile.TemporaryDirectory() as tmp:
+        int8_path = os.path.join(tmp, "cnn_int8.npz")
+        cnn.save_npz(int8_path, int8=True)
+        cnn8 = CNNClassifier.from_npz(int8_path)
+        sizes = {"float32": os.path.getsize(args.model), "int8": os.path.getsize(int8_path)}
+    knn = KNNIndex(np.asarray(X[train]), y[train], k=args.k)
+
+    print(f"{len(train)} training crops, {len(test)} test crops, classes {classes}")
+    print(f"{'model':<12}{'accuracy':>9}{'ms/crop':>10}{'batched':>10}{'alloc KB':>10}{'size KB':>10}")
+    rows = [(f"kNN k={args.k}", knn.predict, knn.X.nbytes), ("CNN float32", cnn.predict, sizes["float32"]),
+            ("CNN int8", cnn8.predict, sizes["int8"])]
+    for name, predict, nbytes in rows:
+        acc = float(np.mean(predict(X_test) == y_test))
+        single, batch = per_crop_ms(predict, X_test)
+        print(f"{name:<12}{acc:>9.3f}{single:>10.3f}{batch:>10.3f}{alloc_kb(predict, X_test[:1]):>10.1f}{nbytes / 1024:>10.0f}")
+    same = np.mean(cnn.predict(X_test) == cnn8.predict(X_test))
+    print(f"int8 weights agree with float32 on {same:.1%} of test crops")
+
+if __name__ == "__main__":
+    main()
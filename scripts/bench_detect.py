@@ -0,0 +1,68 @@
+"""Per-frame timing of the circle detector modes against the previous inline detector.
+
+Frames are dashcam-sized (default 1280x720) backgrounds with signs from data/ pasted at
+random positions and scales, so detection recall can be checked too.
+
+Usage:
+    PYTHONPATH=src python scripts/bench_detect.py --data data/train --frames 30
+"""
+import argparse, time
+
+import cv2
+import numpy as np
+
+from tsr.bench import synthetic_frames
+from tsr.dataset import list_image_paths
+from tsr.detect import CircleDetector, PRESETS
+
+def legacy_detect(frame: np.ndarray) -> np.ndarray:
+    """detect_circles() as it was in scripts/realtime_extract_and_classify.py."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    gray = cv2.GaussianBlur(gray, (9, 9), 1.5)
+    circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, dp=1.2, minDist=25,
+                               param1=80, param2=35, minRadius=12, maxRadius=120)
+    return np.empty((0, 3), np.int32) if circles is None else np.around(circles[0]).astype(np.int32)
+
+def recall(found: np.ndarray, truth) -> float:
+    hit = 0
+    for tx, ty, tr in truth:
+        if len(found) and (np.hypot(found[:, 0] - tx, found[:, 1] - ty) < 0.5 * tr).any():
+            hit += 1
+    return hit / len(truth) if truth else 1.0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data", default="data/train", help="folder with sign images to paste")
+    ap.add_argument("--frames", type=int, default=30)
+    ap.add_argument("--size", default="1280x720")
+    args = ap.parse_args()
+
+    paths, _ = list_image_paths(args.data)
+    if not paths:
+        raise SystemExit(f"No images found in {args.data}")
+    size = tuple(int(v) for v in args.size.split("x"))
+    frames = list(synthetic_frames(paths, args.frames, size, np.random.default_rng(0)))
+
+    p = PRESETS["realtime"]
+    modes = {
+        "legacy inline": legacy_detect,
+        "detector": CircleDetector(p).detect,
+        "red mask": CircleDetector(p, red_mask=True).detect,
+        "pyramid 1": CircleDetector(p, pyramid=1).detect,
+        "red + pyramid": CircleDetector(p, red_mask=True, pyramid=1).detect,
+        "roi right half": CircleDetector(p, roi=(0.5, 0.0, 1.0, 1.0)).detect,
+    }
+    print(f"{len(frames)} frames {size[0]}x{size[1]}")
+    print(f"{'mode':<16}{'ms/frame':>10}{'circles':>9}{'recall':>8}")
+    for name, fn in modes.items():
+        times, counts, recalls = [], [], []
+        for frame, truth in frames:
+            t0 = time.perf_counter()
+            found = fn(frame)
+            times.append(time.perf_counter() - t0)
+            counts.append(len(found))
+            recalls.append(recall(found, truth))
+        print(f"{name:<16}{1e3 * np.median(times):>10.2f}{np.mean(counts):>9.1f}{np.mean(recalls):>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Check the vectorized feature extraction against the original per-pixel loop and time both.
+
+Usage:
+    PYTHONPATH=src python scripts/bench_features.py --data data/train --repeat 3
+"""
+import argparse, time
+
+import numpy as np
+
+from tsr.dataset import list_image_paths
+from tsr.features import read_image_to_array, images_to_feature_matrix
+
+def reference_rgb_list(img: np.ndarray) -> list:
+    """The original per-pixel implementation of image_array_to_rgb_list."""
+    h, w = img.shape[0:2]
+    out = []
+    for l in range(h):
+        for c in range(w):
+            r,g,b = img[l][c][:3]
+            out += [float(r), float(g), float(b)]
+    return out
+
+def best_of(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data", default="data/train", help="dataset root with class subfolders")
+    ap.add_argument("--repeat", type=int, default=3, help="timing repetitions (best is kept)")
+    args = ap.parse_args()
+
+    paths, _ = list_image_paths(args.data)
+    if not paths:
+        raise SystemExit(f"No images found in {args.data}")
+    imgs = [read_image_to_array(p) for p in paths]
+
+    ref = np.array([reference_rgb_list(im) for im in imgs], dtype=float)
+    new = images_to_feature_matrix(imgs, dtype=np.float64)
+    if ref.shape != new.shape or not np.array_equal(ref, new):
+        raise SystemExit("Mismatch between vectorized and reference features")
+    print(f"Equivalent on {len(imgs)} images, feature dim {new.shape[1]}")
+
+    out = np.empty(new.shape, dtype=np.float32)
+    t_ref = best_of(lambda: [reference_rgb_list(im) for im in imgs], args.repeat)
+    t_new = best_of(lambda: images_to_feature_matrix(imgs, out=out), args.repeat)
+    print(f"per-pixel loop : {t_ref*1e3/len(imgs):8.3f} ms/image")
+    print(f"vectorized     : {t_new*1e3/len(imgs):8.3f} ms/image  (x{t_ref/max(t_new, 1e-12):.0f})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Throughput of the robot loop's frame acquisition, on any Linux box.
+
+Compares the old still-capture path (write a JPEG, decode it again; the on-device
+Picamera2 warmup sleeps of ~2 s per frame are not even counted) against a persistent
+FrameSource streaming into a ring of reusable buffers, and optionally the full
+capture -> detect -> classify iteration of raspberry/robot_run.py.
+
+Usage:
+    PYTHONPATH=src:. python scripts/bench_frame_source.py --source data/frames --model models/knn.joblib
+"""
+import argparse, os, tempfile, time
+
+import cv2
+
+from tsr.sources import make_source
+
+def still_roundtrip(frames, path: str):
+    for frame in frames:
+        cv2.imwrite(path, frame)
+        yield cv2.imread(path)
+
+def rate(frames, n: int, step=None) -> float:
+    t0 = time.perf_counter()
+    done = 0
+    for frame in frames:
+        if step is not None:
+            step(frame)
+        done += 1
+        if done >= n:
+            break
+    return done / (time.perf_counter() - t0)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--source", required=True, help="video file or image folder to replay")
+    ap.add_argument("--frames", type=int, default=200, help="frames per measurement")
+    ap.add_argument("--model", default="", help="optional bundle to also time the full robot iteration")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with make_source(args.source, ring_size=0, loop=True) as src:
+            fps = rate(still_roundtrip(src, os.path.join(tmp, "image.jpg")), args.frames)
+        print(f"still capture to disk + imread : {fps:8.1f} frames/s")
+
+    with make_source(args.source, ring_size=0, loop=True) as src:
+        print(f"stream, new array per frame    : {rate(src, args.frames):8.1f} frames/s")
+    with make_source(args.source, ring_size=2, loop=True) as src:
+        print(f"stream, 2-slot ring buffer     : {rate(src, args.frames):8.1f} frames/s")
+
+    if args.model:
+        import joblib
+        from tsr.detect import CircleDetector, PRESETS
+        from tsr.features import crops_to_features
+        detector = CircleDetector(PRESETS["robot"], pad=15)
+        bundle = joblib.load(args.model)
+        clf, pipeline = bundle["model"], bundle.get("pipeline")
+
+        def iteration(frame):
+            _, crops = detector(frame)
+            if crops:
+                clf.predict(crops_to_features([cv2.cvtColor(crops[0], cv2.COLOR_BGR2RGB)], pipeline))
+
+        with make_source(args.source, ring_size=2, loop=True) as src:
+            print(f"full robot iteration (no dwell): {rate(src, args.frames, iteration):8.1f} Hz")
+
+if __name__ == "__main__":
+    main()
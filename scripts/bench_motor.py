@@ -0,0 +1,63 @@
+"""Benchmark the motor command layer against a fake PCA9685 that records bus traffic.
+
+Replays a robot-loop-like command sequence (the same speed label for many iterations,
+occasional speed changes and stops) through the original write-everything behaviour,
+the write-coalescing Motor, and the coalescing Motor behind the ramp, and reports I2C
+writes and time spent in the loop's motor calls.
+
+Usage:
+    python scripts/bench_motor.py --iters 500 --write-ms 0.5
+"""
+import argparse, time
+
+import numpy as np
+
+from raspberry.motor import Motor, RampedMotor, FakePCA9685
+from raspberry.speed_profiles import SPEED_TO_DUTY, duty_tuple
+
+def commands(n, seed=0):
+    """Label per loop iteration: runs of the same speed, with ~5% changes and some stops."""
+    rng = np.random.default_rng(seed)
+    labels, cur = [], "50"
+    for _ in range(n):
+        if rng.random() < 0.05:
+            cur = rng.choice(list(SPEED_TO_DUTY) + ["stop"])
+        labels.append(cur)
+    return labels
+
+def run(name, motor, labels, dwell):
+    t_loop = 0.0
+    for lbl in labels:
+        t0 = time.perf_counter()
+        if lbl == "stop":
+            motor.brake()
+        else:
+            motor.setMotorModel(*duty_tuple(lbl, reverse=True))
+        t_loop += time.perf_counter() - t0
+        if dwell:
+            time.sleep(dwell)
+    motor.close()
+    return name, t_loop
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--iters", type=int, default=500, help="loop iterations")
+    ap.add_argument("--write-ms", type=float, default=0.5, help="simulated time of one setMotorPwm I2C transaction")
+    ap.add_argument("--dwell", type=float, default=0.005, help="loop period for the ramped run (s)")
+    ap.add_argument("--ramp", type=float, default=4000.0, help="ramp rate in duty per second")
+    args = ap.parse_args()
+    labels = commands(args.iters)
+
+    print(f"{'variant':<14}{'I2C writes':>12}{'per iter':>10}{'loop ms':>10}{'ms/iter':>10}")
+    for name, make, dwell in [
+        ("original", lambda pwm: Motor(pwm, coalesce=False), 0.0),
+        ("coalesced", lambda pwm: Motor(pwm), 0.0),
+        ("ramped", lambda pwm: RampedMotor(Motor(pwm), rate=args.ramp), args.dwell),
+    ]:
+        pwm = FakePCA9685(write_s=args.write_ms / 1e3)
+        _, t_loop = run(name, make(pwm), labels, dwell)
+        print(f"{name:<14}{pwm.writes:>12}{pwm.writes / len(labels):>10.2f}"
+              f"{t_loop * 1e3:>10.1f}{t_loop * 1e3 / len(labels):>10.3f}")
+
+if __name__ == "__main__":
+    main()
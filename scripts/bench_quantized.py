@@ -0,0 +1,43 @@
+"""Check that the uint8 kNN ranks neighbours like the float path, and compare speed and memory.
+
+Usage:
+    PYTHONPATH=src python scripts/bench_quantized.py --data data/train --k 9
+"""
+import argparse, time
+
+import numpy as np
+
+from tsr.feature_store import load_features
+from tsr.knn_fast import KNNIndex
+from tsr.knn_quant import QuantizedKNNClassifier
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data", default="data/train", help="dataset root with class subfolders")
+    ap.add_argument("--store", default="", help="optional feature store directory")
+    ap.add_argument("--k", type=int, default=9)
+    args = ap.parse_args()
+
+    X, labels = load_features(args.data, args.store)
+    ref = KNNIndex(X, labels, k=args.k)
+    quant = QuantizedKNNClassifier(n_neighbors=args.k).fit(X, labels)
+
+    (d_ref, i_ref), t_ref = timed(lambda: ref.kneighbors(X))
+    (d_q, i_q), t_q = timed(lambda: quant.kneighbors(X))
+    same_dist = np.allclose(d_ref, d_q, rtol=0, atol=1e-6)
+    same_rank = np.mean(np.all(i_ref == i_q, axis=1))
+    same_pred = np.mean(ref.predict(X) == quant.predict(X))
+    print(f"{len(X)} queries x {len(X)} samples, k={args.k}")
+    print(f"identical distances: {same_dist}  identical rankings: {same_rank:.3f}  identical labels: {same_pred:.3f}")
+    print(f"float64 : {t_ref * 1e3 / len(X):7.3f} ms/query  db {ref.X.nbytes / 1024:8.0f} KB")
+    print(f"uint8   : {t_q * 1e3 / len(X):7.3f} ms/query  db {quant.X_.nbytes / 1024:8.0f} KB")
+    if not same_dist:
+        raise SystemExit("uint8 distances differ from the float path")
+
+if __name__ == "__main__":
+    main()
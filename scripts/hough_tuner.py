@@ -1,17 +1,15 @@
 import time, cv2, numpy as np
 
-param1 = 80
-param2 = 40
-dp = 1.2
-min_dist = 25
-min_radius = 10
-max_radius = 120
+from tsr.detect import CircleDetector, PRESETS
+
+detector = CircleDetector(PRESETS["tuner"])
+params = detector.params
 
 cap = cv2.VideoCapture(0)
 if not cap.isOpened():
     raise SystemExit("Could not open camera 0.")
 
-print("Press q to quit. Tunable keys: i/k (dp), o/l (param1), p/m (param2).")
+print("Press q to quit. Tunable keys: i/k (dp), o/l (param1), p/m (param2), r (red mask), y (pyramid).")
 
 while True:
     ret, frame = cap.read()
@@ -19,20 +17,15 @@ while True:
         time.sleep(0.02)
         continue
 
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    gray = cv2.GaussianBlur(gray, (9, 9), 1.5)
-    circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, dp, min_dist,
-                               param1=param1, param2=param2,
-                               minRadius=min_radius, maxRadius=max_radius)
-
-    if circles is not None:
-        circles = np.around(circles).astype(np.int32)
-        for (x, y, r) in circles[0, :]:
-            if r > 0:
-                cv2.circle(frame, (x, y), r, (0, 255, 0), 2)
-                cv2.circle(frame, (x, y), 2, (0, 0, 255), -1)
+    circles = detector.detect(frame)
+    for (x, y, r) in circles:
+        if r > 0:
+            cv2.circle(frame, (x, y), r, (0, 255, 0), 2)
+            cv2.circle(frame, (x, y), 2, (0, 0, 255), -1)
 
-    overlay = f"[i|k] dp: {dp:0.2f}   [o|l] param1: {param1:d}   [p|m] param2: {param2:d}   circles: {0 if circles is None else circles.shape[1]}"
+    overlay = (f"[i|k] dp: {params.dp:0.2f}   [o|l] param1: {params.param1:d}   [p|m] param2: {params.param2:d}   "
+               f"[r] mask: {'on' if detector.use_red_mask else 'off'}   [y] pyramid: {detector.pyramid}   "
+               f"circles: {len(circles)}")
     cv2.putText(frame, overlay, (10, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
     cv2.imshow("HoughCircles Tuner", frame)
 
@@ -40,17 +33,21 @@ while True:
     if key == ord('q'):
         break
     elif key == ord('i'):
-        dp = min(10.0, dp + 0.05)
+        params.dp = min(10.0, params.dp + 0.05)
     elif key == ord('k'):
-        dp = max(0.1, dp - 0.05)
+        params.dp = max(0.1, params.dp - 0.05)
     elif key == ord('o'):
-        param1 = min(255, param1 + 1)
+        params.param1 = min(255, params.param1 + 1)
     elif key == ord('l'):
-        param1 = max(1, param1 - 1)
+        params.param1 = max(1, params.param1 - 1)
     elif key == ord('p'):
-        param2 = min(255, param2 + 1)
+        params.param2 = min(255, params.param2 + 1)
     elif key == ord('m'):
-        param2 = max(1, param2 - 1)
+        params.param2 = max(1, params.param2 - 1)
+    elif key == ord('r'):
+        detector.use_red_mask = not detector.use_red_mask
+    elif key == ord('y'):
+        detector.pyramid = (detector.pyramid + 1) % 3
 
 cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+cv2.destroyAllWindows()
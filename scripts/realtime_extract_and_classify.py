@@ -1,13 +1,19 @@
 """Real-time circular sign detection + classification using pretrained kNN.
 
-- Detect circles with HoughCircles
+- Detect circles with tsr.detect (HoughCircles, optional red pre-mask / pyramid / ROI)
 - Crop + resize to 100x100
-- Flatten RGB to features and classify with models/knn.joblib
+- Flatten RGB to features (through the bundle's feature pipeline, if any) and classify with models/knn.joblib
 Keys:
     q : quit
     s : save crops to ./captures
+
+Usage:
+    python scripts/realtime_extract_and_classify.py                       # camera 0, serial loop
+    python scripts/realtime_extract_and_classify.py --pipelined           # threaded stages, stale frames dropped
+    python scripts/realtime_extract_and_classify.py --source drive.mp4 --pipelined --headless --keep-all
+    python scripts/realtime_extract_and_classify.py --red-mask --pyramid 1 --roi 0.5,0,1,0.7
 """
-import os, time
+import argparse, os, time
 from pathlib import Path
 from datetime import datetime
 
@@ -15,24 +21,16 @@ import cv2
 import numpy as np
 import joblib
 
-from tsr.features import image_array_to_rgb_list
+from tsr.cascade import predict_confidence
+from tsr.detect import CircleDetector, PRESETS, parse_roi
+from tsr.features import crops_to_features
+from tsr.instrument import make_timer
+from tsr.realtime import StagePipeline, run_serial, latency_summary
+from tsr.sources import open_frames, is_live
+from tsr.tracking import SignTracker
 
 CAPTURES = Path("captures"); CAPTURES.mkdir(exist_ok=True, parents=True)
 
-def detect_circles(frame: np.ndarray):
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    gray = cv2.GaussianBlur(gray, (9, 9), 1.5)
-    circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, dp=1.2, minDist=25,
-                               param1=80, param2=35, minRadius=12, maxRadius=120)
-    return None if circles is None else np.around(circles).astype(np.int32)
-
-def crop_circle(frame, x, y, r, pad=6):
-    h, w = frame.shape[:2]
-    x0, y0 = max(0, x - r - pad), max(0, y - r - pad)
-    x1, y1 = min(w, x + r + pad), min(h, y + r + pad)
-    crop = frame[y0:y1, x0:x1].copy()
-    return None if crop.size == 0 else cv2.resize(crop, (100, 100), interpolation=cv2.INTER_AREA)
-
 def save_crops(crops):
     ts = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
     paths = []
@@ -42,51 +40,92 @@ def save_crops(crops):
         paths.append(str(p))
     return paths
 
+def make_classify(bundle: dict, min_confidence: float = 0.0):
+    """Classify every crop of a frame in one predict call; crops below min_confidence get label None."""
+    clf = bundle["model"]; classes = bundle["classes"]; pipeline = bundle.get("pipeline")
+    def classify(crops):
+        feats = crops_to_features([cv2.cvtColor(c, cv2.COLOR_BGR2RGB) for c in crops], pipeline)
+        if not min_confidence:
+            return [classes[p] for p in clf.predict(feats)]
+        pred, conf = predict_confidence(clf, feats)
+        return [classes[p] if c >= min_confidence else None for p, c in zip(pred, conf)]
+    return classify
+
+def draw(frame, res, stats: str = ""):
+    for (x, y, r), label in zip(res.circles, res.labels):
+        cv2.circle(frame, (x, y), r, (0,255,0), 2)
+        cv2.circle(frame, (x, y), 2, (0,0,255), -1)
+        cv2.putText(frame, "?" if label is None else f"{label}", (x - r, max(0, y - r - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,255,0), 2)
+    info = f"Circles: {len(res.circles)}  latency: {res.latency * 1e3:.0f} ms  [s] save  [q] quit"
+    cv2.putText(frame, info, (10, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,255), 2)
+    if stats:
+        cv2.putText(frame, stats, (10, 48), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,0), 1)
+
 def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="models/knn.joblib", help="model bundle from tsr.knn_baseline")
+    ap.add_argument("--source", default="0", help="camera index, video file or image folder")
+    ap.add_argument("--pipelined", action="store_true", help="run capture/detect/classify as threaded stages")
+    ap.add_argument("--keep-all", action="store_true", help="queue every frame instead of dropping stale ones")
+    ap.add_argument("--headless", action="store_true", help="no window; print one line per frame")
+    ap.add_argument("--no-track", action="store_true", help="classify every crop of every frame (no tracking)")
+    ap.add_argument("--red-mask", action="store_true", help="only search around red blobs")
+    ap.add_argument("--pyramid", type=int, default=0, help="detect on a frame downscaled this many times by 2")
+    ap.add_argument("--roi", default="", help="search region as frame fractions x0,y0,x1,y1")
+    ap.add_argument("--stats", type=float, default=5.0, help="seconds between stage timing log lines (0: off)")
+    ap.add_argument("--trace", default="", help="optional per-frame timing trace (.csv or .jsonl)")
+    ap.add_argument("--min-confidence", type=float, default=0.0,
+                    help="show low-confidence crops as '?' (kNN vote share or cascade confidence, 0..1)")
+    args = ap.parse_args()
+    timer = make_timer(args.stats, args.trace, stages=("capture", "detect", "classify", "display"))
+
     # Load model
-    bundle = joblib.load("models/knn.joblib")
-    clf = bundle["model"]; classes = bundle["classes"]
-
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        raise SystemExit("Could not open camera 0")
-
-    last_crops = []
-    while True:
-        ok, frame = cap.read()
-        if not ok:
-            time.sleep(0.02); continue
-
-        circles = detect_circles(frame)
-        last_crops = []
-
-        if circles is not None:
-            for (x,y,r) in circles[0, :]:
-                if r <= 0: continue
-                cv2.circle(frame, (x, y), r, (0,255,0), 2)
-                cv2.circle(frame, (x, y), 2, (0,0,255), -1)
-                crop = crop_circle(frame, x, y, r)
-                if crop is None: continue
-                last_crops.append(crop)
-                # classify
-                feat = np.array([image_array_to_rgb_list(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB))], dtype=float)
-                pred = clf.predict(feat)[0]
-                label = classes[pred]
-                cv2.putText(frame, f"{label}", (x - r, max(0, y - r - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,255,0), 2)
-
-        info = f"Circles: {0 if circles is None else circles.shape[1]}  [s] save  [q] quit"
-        cv2.putText(frame, info, (10, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,255), 2)
-        cv2.imshow("Real-time TSR", frame)
-
-        key = cv2.waitKey(1) & 0xFF
+    bundle = joblib.load(args.model)
+    classify = timer.timed("classify")(make_classify(bundle, args.min_confidence))
+    find_crops = timer.timed("detect")(CircleDetector(PRESETS["realtime"], red_mask=args.red_mask,
+                                                      pyramid=args.pyramid, roi=parse_roi(args.roi)))
+
+    # serial mode reuses two frame buffers; threaded stages hold several frames at once
+    frames = timer.timed_iter("capture", open_frames(args.source, ring_size=0 if args.pipelined else 2))
+    tracker = None if args.no_track else SignTracker()
+    if args.pipelined:
+        drop_stale = is_live(args.source) and not args.keep_all
+        runner = StagePipeline(frames, find_crops, classify, drop_stale=drop_stale, tracker=tracker)
+    else:
+        runner = run_serial(frames, find_crops, classify, tracker=tracker)
+
+    latencies = []
+    for res in runner:
+        latencies.append(res.latency)
+        if args.headless:
+            print(f"frame {res.index}: {len(res.circles)} circles {res.labels}  latency {res.latency * 1e3:.1f} ms")
+            timer.frame_done(latency_ms=round(res.latency * 1e3, 3), circles=len(res.circles))
+            continue
+
+        with timer.stage("display"):
+            frame = res.frame
+            draw(frame, res, timer.overlay_text() if timer.enabled else "")
+            cv2.imshow("Real-time TSR", frame)
+            key = cv2.waitKey(1) & 0xFF
+        timer.frame_done(latency_ms=round(res.latency * 1e3, 3), circles=len(res.circles))
+
         if key == ord('q'):
             break
         elif key == ord('s'):
-            paths = save_crops(last_crops)
+            paths = save_crops(res.crops)
             print("Saved:", *paths, sep="\n - ") if paths else print("No crops to save.")
 
-    cap.release()
-    cv2.destroyAllWindows()
+    print(latency_summary(latencies))
+    if timer.enabled:
+        print(timer.log_line())
+        timer.close()
+    if tracker is not None:
+        print("Tracking:", tracker.stats())
+    if args.pipelined:
+        runner.stop()
+        print("Dropped stale frames:", runner.dropped)
+    if not args.headless:
+        cv2.destroyAllWindows()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,123 @@
+"""Approximate nearest-neighbour kNN with an inverted-file (IVF) index, NumPy only.
+
+The reference matrix is partitioned into `nlist` k-means cells. A query only scans the
+samples of its `nprobe` closest cells: nprobe=nlist is exact search, smaller values
+trade recall for speed.
+"""
+import numpy as np
+
+from .knn_fast import vote_counts
+
+def sq_dist(Q: np.ndarray, X: np.ndarray, x_sq: np.ndarray) -> np.ndarray:
+    """(len(Q), len(X)) squared euclidean distances given precomputed ||x||^2."""
+    d2 = Q @ X.T
+    d2 *= -2
+    d2 += np.einsum("ij,ij->i", Q, Q)[:, None]
+    d2 += x_sq[None, :]
+    return np.maximum(d2, 0, out=d2)
+
+def kmeans(X: np.ndarray, n_clusters: int, n_iter: int = 20, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means; returns (n_clusters, D) centroids."""
+    rng = np.random.default_rng(seed)
+    C = X[rng.choice(len(X), n_clusters, replace=False)].astype(np.float32)
+    for _ in range(n_iter):
+        assign = sq_dist(X, C, np.einsum("ij,ij->i", C, C)).argmin(axis=1)
+        order = np.argsort(assign, kind="stable")
+        cells, starts, counts = np.unique(assign[order], return_index=True, return_counts=True)
+        new = C.copy()
+        new[cells] = np.add.reduceat(X[order], starts, axis=0) / counts[:, None]
+        empty = np.setdiff1d(np.arange(n_clusters), cells)
+        new[empty] = X[rng.choice(len(X), len(empty), replace=False)]
+        if np.allclose(new, C):
+            break
+        C = new
+    return C
+
+class IVFKNNClassifier:
+    """kNN classifier over an IVF index, with the fit/predict interface of KNeighborsClassifier."""
+
+    def __init__(self, n_neighbors: int = 5, nlist: int = 0, nprobe: int = 4, seed: int = 0):
+        self.n_neighbors, self.nlist, self.nprobe, self.seed = n_neighbors, nlist, nprobe, seed
+
+    def fit(self, X: np.ndarray, y: np.ndarray, train_size: int = 256) -> "IVFKNNClassifier":
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        nlist = self.nlist or max(1, int(np.sqrt(len(X))))
+        nlist = min(nlist, len(X))
+        rng = np.random.default_rng(self.seed)
+        sample = X if len(X) <= nlist * train_size else X[rng.choice(len(X), nlist * train_size, replace=False)]
+        C = kmeans(sample, nlist, seed=self.seed)
+        self._set_index(X, np.asarray(y), C)
+        return self
+
+    def _set_index(self, X, y, C):
+        self.classes_, y_idx = np.unique(y, return_inverse=True)
+        c_sq = np.einsum("ij,ij->i", C, C)
+        assign = np.concatenate([sq_dist(X[i:i + 8192], C, c_sq).argmin(axis=1)
+                                 for i in range(0, len(X), 8192)])
+        order = np.argsort(assign, kind="stable")
+        offsets = np.searchsorted(assign[order], np.arange(len(C) + 1))
+        self.centroids_ = C
+        self.order_ = order  # position in the cell-sorted matrix -> original sample index
+        self.offsets_ = offsets
+        self.X_ = X[order]
+        self.y_idx_ = y_idx[order]
+        self.sq_norms_ = np.einsum("ij,ij->i", self.X_, self.X_)
+
+    def partial_fit(self, X: np.ndarray, y: np.ndarray) -> "IVFKNNClassifier":
+        """Append samples to the fitted index without re-running k-means.
+
+        New rows join the cell of their nearest centroid; only their distances and norms
+        are computed, the existing rows are merged by cell in one stable sort.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32).reshape(len(X), -1)
+        n_old = len(self.order_)
+        old_cells = np.repeat(np.arange(len(self.centroids_)), np.diff(self.offsets_))
+        new_cells = sq_dist(X, self.centroids_, np.einsum("ij,ij->i", self.centroids_, self.centroids_)).argmin(axis=1)
+        classes = np.union1d(self.classes_, np.asarray(y))
+        y_idx = np.concatenate([np.searchsorted(classes, self.classes_)[self.y_idx_], np.searchsorted(classes, y)])
+        cells = np.concatenate([old_cells, new_cells])
+        perm = np.argsort(cells, kind="stable")
+        self.classes_ = classes
+        self.offsets_ = np.searchsorted(cells[perm], np.arange(len(self.centroids_) + 1))
+        self.order_ = np.concatenate([self.order_, n_old + np.arange(len(X))])[perm]
+        self.X_ = np.concatenate([self.X_, X])[perm]
+        self.y_idx_ = y_idx[perm]
+        self.sq_norms_ = np.concatenate([self.sq_norms_, np.einsum("ij,ij->i", X, X)])[perm]
+        return self
+
+    def _search(self, Q: np.ndarray, k: int, nprobe: int):
+        """(distances, positions in the cell-sorted matrix); -1 pads missing neighbours."""
+        nprobe = min(nprobe, len(self.centroids_))
+        Q = np.ascontiguousarray(np.asarray(Q, dtype=np.float32).reshape(len(Q), -1))
+        cd = sq_dist(Q, self.centroids_, np.einsum("ij,ij->i", self.centroids_, self.centroids_))
+        probes = np.argpartition(cd, nprobe - 1, axis=1)[:, :nprobe] if nprobe < cd.shape[1] \
+            else np.broadcast_to(np.arange(cd.shape[1]), cd.shape)
+        dist = np.full((len(Q), k), np.inf, dtype=np.float32)
+        pos = np.full((len(Q), k), -1, dtype=np.intp)
+        for i, cells in enumerate(probes):
+            cand = np.concatenate([np.arange(self.offsets_[c], self.offsets_[c + 1]) for c in cells])
+            if not len(cand):
+                continue
+            d2 = sq_dist(Q[i:i + 1], self.X_[cand], self.sq_norms_[cand])[0]
+            kk = min(k, len(cand))
+            top = np.argpartition(d2, kk - 1)[:kk] if kk < len(cand) else np.arange(len(cand))
+            top = top[np.argsort(d2[top], kind="stable")]
+            dist[i, :kk] = np.sqrt(d2[top])
+            pos[i, :kk] = cand[top]
+        return dist, pos
+
+    def kneighbors(self, Q: np.ndarray, k: int = None, nprobe: int = None):
+        """Return (distances, indices) of the approximate k nearest samples, closest first.
+
+        Indices refer to the rows given to fit(); -1 pads results when the probed cells
+        hold fewer than k samples.
+        """
+        dist, pos = self._search(Q, k or self.n_neighbors, nprobe or self.nprobe)
+        return dist, np.where(pos >= 0, self.order_[pos], -1)
+
+    def predict(self, Q: np.ndarray, nprobe: int = None) -> np.ndarray:
+        _, pos = self._search(Q, self.n_neighbors, nprobe or self.nprobe)
+        n_classes = len(self.classes_)
+        nb = np.where(pos >= 0, self.y_idx_[pos], n_classes)
+        votes = vote_counts(nb, n_classes + 1)[:, :n_classes]
+        return self.classes_[votes.argmax(axis=1)]
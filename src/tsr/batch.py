@@ -0,0 +1,193 @@
+"""Offline batch detection + classification of recorded drives on all cores.
+
+A video file or a folder of frames is split into chunks of consecutive frames; a process
+pool works through the chunks, each worker loading the model bundle once and streaming
+its chunk frame by frame (decode -> CircleDetector -> one batched predict per frame), so
+only `workers` chunks' worth of detections - never the frames - are held in memory.
+
+Output is one row per detected circle, in frame order, as columns:
+    frame, x, y, r, label, confidence (neighbour vote share), distance (to the nearest sample)
+written as .npz (one array per column), .csv or .jsonl depending on the --out suffix.
+
+Usage:
+    python -m tsr.batch drive.mp4 --model models/knn.joblib --out drive_detections.npz
+    python -m tsr.batch drive.mp4 --model models/knn.npz --out drive_detections.csv   # NumPy-only model
+    python -m tsr.batch data/frames --workers 4 --chunk 200 --red-mask --out frames.csv
+"""
+import argparse
+import csv
+import json
+import multiprocessing as mp
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .detect import CircleDetector, PRESETS, parse_roi
+from .features import crops_to_features
+from .knn_fast import vote_counts
+from .npz_model import load_bundle
+from .sources import IMAGE_EXTENSIONS
+
+COLUMNS = ("frame", "x", "y", "r", "label", "confidence", "distance")
+
+_WORKER: dict = {}
+
+def frame_count(source: str) -> Tuple[int, List[str]]:
+    """(number of frames, sorted image paths) of a folder, or (frame count, []) of a video."""
+    if Path(source).is_dir():
+        paths = sorted(str(p) for p in Path(source).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+        return len(paths), paths
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise SystemExit(f"Could not open video {source}")
+    n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return n, []
+
+def iter_chunk(source: str, start: int, stop: int, paths: Optional[List[str]] = None) -> Iterator[Tuple[int, np.ndarray]]:
+    """(frame index, BGR frame) for frames start..stop-1, decoded one at a time.
+
+    For folders, `paths` holds just this chunk's image paths.
+    """
+    if paths:
+        for i, p in enumerate(paths, start):
+            frame = cv2.imread(p)
+            if frame is not None:
+                yield i, frame
+        return
+    cap = cv2.VideoCapture(source)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    frame = None
+    try:
+        for i in range(start, stop):
+            ok, frame = cap.read(frame)
+            if not ok:
+                break
+            yield i, frame
+    finally:
+        cap.release()
+
+def score(clf, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(class index, vote share, nearest distance) per row from one kneighbors call.
+
+    Works for sklearn's KNeighborsClassifier and the tsr kNN models; other models fall
+    back to predict() with NaN confidence and distance.
+    """
+    if hasattr(clf, "predict_confidence"):  # CascadeClassifier: vote share or calibrated first-stage accuracy
+        pred, conf = clf.predict_confidence(X)
+        return pred, conf, np.full(len(pred), np.nan)
+    y_idx = getattr(clf, "y_idx_", getattr(clf, "_y", None))
+    if not hasattr(clf, "kneighbors") or y_idx is None or np.ndim(y_idx) != 1:
+        pred = np.asarray(clf.predict(X))
+        nan = np.full(len(pred), np.nan)
+        return pred, nan, nan
+    k = clf.n_neighbors
+    dist, idx = clf.kneighbors(X, k)
+    n_classes = len(clf.classes_)
+    nb = np.where(idx >= 0, y_idx[idx], n_classes)  # -1 pads (IVF) vote for a dummy class
+    votes = vote_counts(nb, n_classes + 1)[:, :n_classes]
+    best = votes.argmax(axis=1)
+    return np.asarray(clf.classes_)[best], votes[np.arange(len(best)), best] / k, dist[:, 0]
+
+def _init_worker(model_path: str, detector_kw: dict) -> None:
+    cv2.setNumThreads(1)  # parallelism comes from the pool
+    bundle = load_bundle(model_path)
+    _WORKER.update(bundle=bundle, detector=CircleDetector(PRESETS["realtime"], **detector_kw))
+
+def process_chunk(task) -> Dict[str, np.ndarray]:
+    """Columns for every circle found in frames start..stop-1 of the source."""
+    source, start, stop, paths = task
+    bundle, detector = _WORKER["bundle"], _WORKER["detector"]
+    clf, classes, pipeline = bundle["model"], bundle["classes"], bundle.get("pipeline")
+    rows = {c: [] for c in COLUMNS}
+    for i, frame in iter_chunk(source, start, stop, paths):
+        kept, crops = detector(frame)
+        if not crops:
+            continue
+        pred, conf, dist = score(clf, crops_to_features([cv2.cvtColor(c, cv2.COLOR_BGR2RGB) for c in crops], pipeline))
+        for (x, y, r), p, c, d in zip(kept, pred, conf, dist):
+            for col, v in zip(COLUMNS, (i, x, y, r, str(classes[p]), c, d)):
+                rows[col].append(v)
+    return {"n_frames": stop - start, **rows}
+
+def chunk_tasks(source: str, n_frames: int, paths: List[str], chunk: int) -> List[tuple]:
+    bounds = [(s, min(s + chunk, n_frames)) for s in range(0, n_frames, chunk)]
+    return [(source, s, e, paths[s:e] or None) for s, e in bounds]
+
+def to_columns(parts: List[dict]) -> Dict[str, np.ndarray]:
+    cols = {c: [v for p in parts for v in p[c]] for c in COLUMNS}
+    return {"frame": np.array(cols["frame"], np.int64),
+            **{c: np.array(cols[c], np.int32) for c in ("x", "y", "r")},
+            "label": np.array(cols["label"], dtype=str),
+            **{c: np.array(cols[c], np.float32) for c in ("confidence", "distance")}}
+
+def write_columns(path: str, cols: Dict[str, np.ndarray]) -> None:
+    if path.endswith(".npz"):
+        np.savez(path, **cols)
+        return
+    rows = zip(*(cols[c].astype(np.float64).round(4).tolist() if cols[c].dtype.kind == "f" else cols[c].tolist()
+                 for c in COLUMNS))
+    with open(path, "w", newline="") as f:
+        if path.endswith(".jsonl"):
+            f.writelines(json.dumps(dict(zip(COLUMNS, r))) + "\n" for r in rows)
+        else:
+            w = csv.writer(f)
+            w.writerow(COLUMNS)
+            w.writerows(rows)
+
+def run(source: str, model: str, out: str, workers: int = 0, chunk: int = 256, **detector_kw) -> Dict[str, np.ndarray]:
+    n_frames, paths = frame_count(source)
+    if n_frames <= 0:
+        raise SystemExit(f"No frames in {source}")
+    tasks = chunk_tasks(source, n_frames, paths, chunk)
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    t0 = time.perf_counter()
+    parts, done = [], 0
+    if workers == 1:
+        _init_worker(model, detector_kw)
+        results = map(process_chunk, tasks)
+        pool = None
+    else:
+        # spawn: fresh interpreters, no forked OpenCV/BLAS thread state; one BLAS thread each
+        for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ.setdefault(var, "1")
+        pool = mp.get_context("spawn").Pool(workers, _init_worker, (model, detector_kw))
+        results = pool.imap(process_chunk, tasks)
+    try:
+        for part in results:
+            parts.append(part)
+            done += part["n_frames"]
+            dt = time.perf_counter() - t0
+            print(f"\r{done}/{n_frames} frames  {done / dt:.1f} fps", end="", flush=True)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    print()
+    cols = to_columns(parts)
+    if out:
+        write_columns(out, cols)
+        print(f"Saved {len(cols['frame'])} detections to {out}")
+    return cols
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("source", help="video file or folder of frames")
+    ap.add_argument("--model", default="models/knn.joblib", help="model bundle from tsr.knn_baseline (.joblib) or its .npz export")
+    ap.add_argument("--out", default="detections.npz", help="output table (.npz, .csv or .jsonl)")
+    ap.add_argument("--workers", type=int, default=0, help="worker processes (default: all cores)")
+    ap.add_argument("--chunk", type=int, default=256, help="consecutive frames per task")
+    ap.add_argument("--red-mask", action="store_true", help="only search around red blobs")
+    ap.add_argument("--pyramid", type=int, default=0, help="detect on a frame downscaled this many times by 2")
+    ap.add_argument("--roi", default="", help="search region as frame fractions x0,y0,x1,y1")
+    args = ap.parse_args()
+    run(args.source, args.model, args.out, args.workers, args.chunk,
+        red_mask=args.red_mask, pyramid=args.pyramid, roi=parse_roi(args.roi))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Stage benchmark suite for the recognition pipeline.
+
+Times each stage (image decode, Hough detection, crop/resize, feature extraction, kNN
+predict, model load) and the full frame -> label path, on the images in data/train and
+on synthetic dashcam-sized frames with those signs pasted in. Reports p50/p95/p99
+latency, throughput and peak traced memory per stage, and can write the results as JSON
+and diff them against a saved baseline.
+
+Usage:
+    python -m tsr.bench --data data/train --out bench.json
+    python -m tsr.bench --compare bench.json --tolerance 0.25     # non-zero exit on regression
+"""
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List, Sequence
+
+import cv2
+import numpy as np
+
+from .dataset import list_image_paths
+from .detect import CircleDetector, PRESETS, crop_circles
+from .features import read_image_to_array, image_array_to_rgb_list, crops_to_features
+from .npz_model import load_bundle
+
+def synthetic_frames(sign_paths: Sequence[str], n: int, size, rng, signs_per_frame: int = 2):
+    """(frame, [(x, y, r), ...]) pairs with signs pasted on a smooth, noisy, low-saturation background."""
+    w, h = size
+    signs = [cv2.imread(p) for p in sign_paths]
+    signs = [s for s in signs if s is not None]
+    for _ in range(n):
+        grey = rng.integers(40, 200, (9, 16, 1))
+        tint = rng.integers(-25, 25, (9, 16, 3))  # mostly desaturated, like road scenes
+        coarse = np.clip(grey + tint, 0, 255).astype(np.uint8)
+        base = cv2.resize(coarse, (w, h), interpolation=cv2.INTER_CUBIC)
+        frame = np.clip(base + rng.normal(0, 6, base.shape), 0, 255).astype(np.uint8)
+        truth = []
+        for _ in range(signs_per_frame):
+            side = int(rng.integers(60, 220))
+            s = cv2.resize(signs[rng.integers(len(signs))], (side, side), interpolation=cv2.INTER_AREA)
+            x, y = int(rng.integers(0, w - side)), int(rng.integers(0, h - side))
+            frame[y:y + side, x:x + side] = s
+            truth.append((x + side // 2, y + side // 2, side // 2))
+        yield frame, truth
+
+def measure(fn: Callable, inputs: Sequence, repeat: int = 1) -> dict:
+    """Latency percentiles and throughput over every input, then peak memory of one more pass."""
+    fn(inputs[0])  # warm-up
+    times = []
+    for _ in range(repeat):
+        for x in inputs:
+            t0 = time.perf_counter()
+            fn(x)
+            times.append(time.perf_counter() - t0)
+    ms = np.array(times) * 1e3
+    tracemalloc.start()
+    for x in inputs[:min(len(inputs), 10)]:
+        fn(x)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"n": len(ms), "p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99)), "mean_ms": float(ms.mean()),
+            "per_s": float(1e3 / ms.mean()) if ms.mean() else float("inf"), "peak_kb": peak / 1024}
+
+def fit_default_model(data: str, k: int = 5) -> dict:
+    from sklearn.neighbors import KNeighborsClassifier
+    from .feature_store import load_features
+    X, labels = load_features(data)
+    classes = sorted(set(labels))
+    y = np.array([classes.index(lbl) for lbl in labels], dtype=int)
+    return {"model": KNeighborsClassifier(n_neighbors=k).fit(np.asarray(X, dtype=np.float64), y), "classes": classes}
+
+def run_suite(args) -> dict:
+    paths, _ = list_image_paths(args.data)
+    if not paths:
+        raise SystemExit(f"No images found in {args.data}")
+    size = tuple(int(v) for v in args.size.split("x"))
+    frames = [f for f, _ in synthetic_frames(paths, args.frames, size, np.random.default_rng(0))]
+
+    if args.model:
+        model_path, tmp = args.model, None
+    else:
+        import joblib
+        tmp = tempfile.TemporaryDirectory()
+        model_path = os.path.join(tmp.name, "knn.joblib")
+        joblib.dump(fit_default_model(args.data), model_path)
+    bundle = load_bundle(model_path)
+    clf, classes, pipeline = bundle["model"], bundle["classes"], bundle.get("pipeline")
+
+    detector = CircleDetector(PRESETS["realtime"])
+    circles = [detector.detect(f) for f in frames]
+    frame_circles = list(zip(frames, circles))
+    crops_bgr = [c for f, cs in frame_circles for c in crop_circles(f, cs)[1]] or [cv2.imread(paths[0])]
+    crops_rgb = [cv2.cvtColor(c, cv2.COLOR_BGR2RGB) for c in crops_bgr]
+    feats = [crops_to_features([c], pipeline) for c in crops_rgb]
+
+    def full_path(frame):
+        kept, crops = detector(frame)
+        if crops:
+            return [classes[p] for p in clf.predict(crops_to_features(
+                [cv2.cvtColor(c, cv2.COLOR_BGR2RGB) for c in crops], pipeline))]
+        return []
+
+    stages = [
+        ("decode_plt_imread", read_image_to_array, paths),
+        ("decode_cv2_imread", cv2.imread, paths),
+        ("hough_detect", detector.detect, frames),
+        ("crop_resize", lambda fc: crop_circles(*fc), frame_circles),
+        ("features_rgb_list", image_array_to_rgb_list, crops_rgb),
+        ("features_vectorized", lambda c: crops_to_features([c], pipeline), crops_rgb),
+        ("predict_one_crop", clf.predict, feats),
+        ("predict_frame_batch", lambda c: clf.predict(crops_to_features(c, pipeline)), [crops_rgb[:8]] * 10),
+        ("model_load", load_bundle, [model_path] * 5),
+        ("frame_to_label", full_path, frames),
+    ]
+    results = {}
+    for name, fn, inputs in stages:
+        if args.only and name not in args.only:
+            continue
+        results[name] = measure(fn, inputs, args.repeat)
+        r = results[name]
+        print(f"{name:<22}{r['p50_ms']:>9.3f}{r['p95_ms']:>9.3f}{r['p99_ms']:>9.3f}{r['per_s']:>10.1f}{r['peak_kb']:>10.0f}")
+    if tmp is not None:
+        tmp.cleanup()
+    return {"meta": {"python": platform.python_version(), "numpy": np.__version__, "opencv": cv2.__version__,
+                     "machine": platform.machine(), "frames": args.frames, "size": args.size},
+            "stages": results}
+
+def compare(current: dict, baseline: dict, tolerance: float, key: str = "p50_ms") -> List[str]:
+    """Print per-stage change against a baseline; return the stages slower than 1 + tolerance."""
+    regressions = []
+    print(f"\n{'stage':<22}{'base':>9}{'now':>9}{'change':>9}")
+    for name, now in current["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if base is None:
+            print(f"{name:<22}{'-':>9}{now[key]:>9.3f}{'new':>9}")
+            continue
+        ratio = now[key] / base[key] if base[key] else 1.0
+        flag = " REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{name:<22}{base[key]:>9.3f}{now[key]:>9.3f}{100 * (ratio - 1):>8.0f}%{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data", default="data/train", help="dataset root with class subfolders")
+    ap.add_argument("--model", default="", help="model bundle, .joblib or .npz (default: fit a kNN on --data)")
+    ap.add_argument("--frames", type=int, default=20, help="synthetic dashcam frames")
+    ap.add_argument("--size", default="1280x720", help="synthetic frame size WxH")
+    ap.add_argument("--repeat", type=int, default=3, help="passes over the inputs of each stage")
+    ap.add_argument("--only", nargs="*", default=[], help="run only these stages")
+    ap.add_argument("--out", default="", help="write results as JSON")
+    ap.add_argument("--compare", default="", help="baseline JSON to diff against")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown before flagging")
+    args = ap.parse_args()
+
+    print(f"{'stage':<22}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'per s':>10}{'peak KB':>10}")
+    results = run_suite(args)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print("Saved results to", args.out)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            raise SystemExit(f"Regressions: {', '.join(regressions)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Two-stage classifier cascade: a cheap first stage on thumbnails, then the full kNN.
+
+The first stage area-averages each feature row back to a `thumb` x `thumb` RGB
+thumbnail (raw-pixel models; other pipelines use their features as they are), which
+for 100x100 crops and thumb=8 is 192 values instead of 30,000. It is either
+
+    centroid  distance to one mean per class; score = margin 1 - d1/d2 between the
+              nearest and second-nearest centroid
+    knn       k nearest training thumbnails; score = share of the k votes for the winner
+
+Rows whose score is at or above `threshold` are answered there; the rest fall through
+to the full kNN.
+
+Every prediction comes with a confidence: the kNN vote share for rows that reached
+the kNN, and for first-stage answers the accuracy the first stage had, on held-out
+calibration rows, among those scoring at least as high. tsr.knn_baseline --cascade fits
+the first stage, picks the threshold for a target first-stage accuracy and reports how
+many queries were short-circuited.
+"""
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from .ann import sq_dist
+from .features import thumbnail
+from .knn_fast import vote_counts
+
+FIRST_STAGES = ("centroid", "knn")
+
+def neighbour_classes(clf, idx: np.ndarray) -> np.ndarray:
+    """Class values of kneighbors() indices for any of the kNN engines (-1 padding stays -1)."""
+    if hasattr(clf, "_y"):  # sklearn KNeighborsClassifier
+        y = clf.classes_[clf._y]
+    elif hasattr(clf, "y_idx_"):  # IVFKNNClassifier / QuantizedKNNClassifier
+        y = clf.classes_[clf.y_idx_]
+    else:  # NpzKNNClassifier
+        y = clf.y_
+    return np.where(idx >= 0, y[idx], -1)
+
+def vote_share(nb: np.ndarray, classes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(winning class, its share of the votes) from neighbour class values (-1: no vote)."""
+    pos = np.where(nb >= 0, np.searchsorted(classes, nb), len(classes))  # padding votes for a dummy class
+    votes = vote_counts(pos, len(classes) + 1)[:, :len(classes)]
+    best = votes.argmax(axis=1)
+    return classes[best], votes[np.arange(len(best)), best] / nb.shape[1]
+
+def knn_confidence(clf, X: np.ndarray, classes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(predicted class, share of the k neighbours voting for it) from one kneighbors call."""
+    _, idx = clf.kneighbors(X, clf.n_neighbors)
+    return vote_share(neighbour_classes(clf, idx), classes)
+
+def calibrate_threshold(scores: np.ndarray, correct: np.ndarray, target: float) -> Tuple[float, np.ndarray, np.ndarray]:
+    """Lowest score whose answers (rows scoring at least that) are at least `target` accurate.
+
+    Also returns the curve (score, accuracy of the rows scoring at least that), ascending
+    in score, used to turn a first-stage score into a confidence. Returns inf when no
+    score reaches the target.
+    """
+    order = np.argsort(-scores, kind="stable")
+    s, ok = scores[order], correct[order].astype(np.float64)
+    acc = np.cumsum(ok) / np.arange(1, len(ok) + 1)
+    last = np.r_[s[1:] != s[:-1], True]  # only cut between distinct scores
+    reached = np.flatnonzero((acc >= target) & last)
+    threshold = float(s[reached[-1]]) if len(reached) else float("inf")
+    return threshold, s[last][::-1].copy(), acc[last][::-1].copy()
+
+class CascadeClassifier:
+    """Cheap first stage in front of a kNN engine, with predict/fit like the engines."""
+
+    def __init__(self, full, thumb: int = 8, first: str = "knn", first_k: int = 5,
+                 image_shape: Optional[Sequence[int]] = None, threshold: float = float("inf")):
+        if first not in FIRST_STAGES:
+            raise ValueError(f"Unknown first stage: {first!r}")
+        self.full, self.thumb, self.first, self.first_k, self.threshold = full, thumb, first, first_k, threshold
+        self.image_shape = tuple(image_shape) if image_shape is not None else None
+        self.curve_scores_ = np.zeros(0)
+        self.curve_accuracy_ = np.zeros(0)
+        self.n_queries = self.n_short = 0
+
+    @property
+    def n_neighbors(self) -> int:
+        return self.full.n_neighbors
+
+    def cheap_features(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32).reshape(len(X), -1)
+        if self.image_shape is None or not self.thumb or X.shape[1] != np.prod(self.image_shape):
+            return X
+        return thumbnail(X.reshape(len(X), *self.image_shape), self.thumb).reshape(len(X), -1).astype(np.float32)
+
+    def fit_first(self, X: np.ndarray, y: np.ndarray) -> "CascadeClassifier":
+        """Fit the first stage only: thumbnails of every row, and their class means."""
+        self.classes_ = np.zeros(0, np.asarray(y).dtype)
+        self.thumbs_, self.thumb_y_ = np.zeros((0, 0), np.float32), np.zeros(0, np.asarray(y).dtype)
+        self.counts_ = np.zeros(len(self.classes_), np.int64)
+        self.centroids_ = None
+        return self.add_samples(X, y)
+
+    def add_samples(self, X: np.ndarray, y: np.ndarray) -> "CascadeClassifier":
+        """Add rows to the first stage (new classes included); the threshold is kept."""
+        F, y = self.cheap_features(X), np.asarray(y)
+        classes = np.union1d(self.classes_, y)
+        old = np.searchsorted(classes, self.classes_)
+        counts = np.zeros(len(classes), np.int64)
+        sums = np.zeros((len(classes), F.shape[1]), np.float64)
+        if self.centroids_ is not None:
+            counts[old], sums[old] = self.counts_, self.centroids_ * self.counts_[:, None]
+        np.add.at(counts, np.searchsorted(classes, y), 1)
+        np.add.at(sums, np.searchsorted(classes, y), F)
+        self.classes_, self.counts_ = classes, counts
+        self.centroids_ = (sums / np.maximum(counts, 1)[:, None]).astype(np.float32)
+        self.thumbs_ = np.concatenate([self.thumbs_.reshape(-1, F.shape[1]), F])
+        self.thumb_y_ = np.concatenate([self.thumb_y_, y])
+        self.thumb_sq_ = np.einsum("ij,ij->i", self.thumbs_, self.thumbs_)
+        return self
+
+    def fit(self, X: np.ndarray, y: np.ndarray) -> "CascadeClassifier":
+        """Both stages on the same rows; the threshold is set by calibrate()."""
+        self.fit_first(X, y)
+        self.full.fit(X, y)
+        return self
+
+    def first_stage(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(first-stage class, score in [0, 1]) per row."""
+        F = self.cheap_features(X)
+        if self.first == "knn":
+            d2 = sq_dist(F, self.thumbs_, self.thumb_sq_)
+            k = min(self.first_k, d2.shape[1])
+            idx = np.argpartition(d2, k - 1, axis=1)[:, :k] if k < d2.shape[1] else np.argsort(d2, axis=1)
+            return vote_share(self.thumb_y_[idx], self.classes_)
+        C = self.centroids_
+        d = np.sqrt(sq_dist(F, C, np.einsum("ij,ij->i", C, C)))
+        if d.shape[1] < 2:
+            return self.classes_[np.zeros(len(d), int)], np.ones(len(d))
+        two = np.partition(d, 1, axis=1)[:, :2]
+        return self.classes_[d.argmin(axis=1)], 1 - two[:, 0] / np.maximum(two[:, 1], 1e-12)
+
+    def calibrate(self, X: np.ndarray, y: np.ndarray, target: float = 0.99) -> float:
+        """Set the threshold from rows the first stage was not fitted on; returns it."""
+        pred, score = self.first_stage(X)
+        self.threshold, self.curve_scores_, self.curve_accuracy_ = calibrate_threshold(score, pred == np.asarray(y), target)
+        return self.threshold
+
+    def predict_confidence(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(predicted class, confidence in [0, 1]) per row."""
+        X = np.asarray(X).reshape(len(X), -1)
+        pred, score = self.first_stage(X)
+        conf = np.interp(score, self.curve_scores_, self.curve_accuracy_) if len(self.curve_scores_) \
+            else np.zeros(len(X))
+        rest = np.flatnonzero(score < self.threshold)
+        if len(rest):
+            pred[rest], conf[rest] = knn_confidence(self.full, X[rest], self.classes_)
+        self.n_queries += len(X)
+        self.n_short += len(X) - len(rest)
+        return pred, conf
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.predict_confidence(X)[0]
+
+    def stats(self) -> str:
+        share = self.n_short / self.n_queries if self.n_queries else 0.0
+        return f"{self.n_short}/{self.n_queries} queries answered by the first stage ({share:.0%})"
+
+def predict_confidence(clf, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(predicted class, confidence) for a cascade or any kNN engine (vote share)."""
+    if hasattr(clf, "predict_confidence"):
+        return clf.predict_confidence(X)
+    return knn_confidence(clf, X, np.asarray(clf.classes_))
@@ -0,0 +1,217 @@
+"""Small-CNN inference in NumPy: conv / ReLU / max-pool / dense, weights from a plain .npz.
+
+Crops come in as the usual feature rows (raw RGB flatten, 0..255), are area-averaged
+to `input_size` x `input_size`, normalized per channel and run NHWC through the layers.
+A convolution is one GEMM per batch: im2col gathers every receptive field of every
+image of the batch into a (N * Ho * Wo, kh * kw * C) matrix, which is multiplied by the
+(kh * kw * C, F) filter matrix. The padded input, im2col matrix and every activation
+live in buffers allocated on the first call for a batch shape and reused afterwards,
+so steady-state inference allocates almost nothing (one model per thread: the buffers
+are shared).
+
+predict() returns class indices into bundle["classes"], so a CNN bundle drops into
+robot_run.py / robot_async.py / the realtime script like a kNN one; predict_confidence()
+adds the softmax probability of the winner.
+
+.npz format (see save_npz):
+    cnn          JSON: {"layers": [...], "input_size": 32, "image_shape": [100, 100, 3]}
+    classes      class labels
+    mean, std    per-channel input normalization (pixels scaled to 0..1)
+    w<i>, b<i>   weights of layer i: conv (kh, kw, C, F), dense (D, U); float32, or
+                 int8 with a per-output-channel scale w<i>_scale (NumPy has no int8
+                 GEMM, so int8 weights are widened once at load: a 4x smaller file and
+                 the accuracy of the quantized weights, not faster arithmetic)
+
+Usage:
+    python -m tsr.cnn_train --data data/train --out models/cnn.npz      # train (NumPy)
+    python -m raspberry.robot_run --model models/cnn.npz
+    python scripts/bench_cnn.py --model models/cnn.npz                  # vs the kNN
+"""
+import json
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .features import thumbnail
+
+def im2col(xp: np.ndarray, kh: int, kw: int, stride: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """(N * Ho * Wo, kh * kw * C) receptive fields of an already padded NHWC batch, in (kh, kw, C) order."""
+    n, h, w, c = xp.shape
+    ho, wo = (h - kh) // stride + 1, (w - kw) // stride + 1
+    win = np.lib.stride_tricks.sliding_window_view(xp, (kh, kw), axis=(1, 2))  # (N, H', W', C, kh, kw)
+    win = win[:, ::stride, ::stride][:, :ho, :wo].transpose(0, 1, 2, 4, 5, 3)
+    if out is None:
+        out = np.empty((n * ho * wo, kh * kw * c), dtype=xp.dtype)
+    np.copyto(out.reshape(n, ho, wo, kh, kw, c), win)
+    return out
+
+def quantize_int8(w: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-output-channel (last axis) int8 weights and their float32 scales."""
+    flat = w.reshape(-1, w.shape[-1])
+    scale = np.maximum(np.abs(flat).max(axis=0), 1e-12) / 127.0
+    return np.clip(np.rint(w / scale), -127, 127).astype(np.int8), scale.astype(np.float32)
+
+class _Layer:
+    max_shapes = 4  # batch shapes whose buffers are kept
+
+    def __init__(self):
+        self.bufs: "OrderedDict[tuple, Dict[str, np.ndarray]]" = OrderedDict()
+
+    def buffers(self, shape: tuple, make) -> Dict[str, np.ndarray]:
+        """Buffers for an input shape, created by make() on first use (least recently used dropped)."""
+        if shape in self.bufs:
+            self.bufs.move_to_end(shape)
+        else:
+            self.bufs[shape] = make()
+            if len(self.bufs) > self.max_shapes:
+                self.bufs.popitem(last=False)
+        return self.bufs[shape]
+
+class Conv2D(_Layer):
+    def __init__(self, w: np.ndarray, b: np.ndarray, stride: int = 1, pad: int = 0):
+        super().__init__()
+        self.kh, self.kw, self.c, self.f = w.shape
+        self.w = np.ascontiguousarray(w.reshape(-1, self.f), dtype=np.float32)
+        self.b = np.asarray(b, dtype=np.float32)
+        self.stride, self.pad = stride, pad
+
+    def out_shape(self, shape: tuple) -> tuple:
+        n, h, w, _ = shape
+        return (n, (h + 2 * self.pad - self.kh) // self.stride + 1, (w + 2 * self.pad - self.kw) // self.stride + 1, self.f)
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        n, h, w, c = x.shape
+        _, ho, wo, f = self.out_shape(x.shape)
+        p = self.pad
+        bufs = self.buffers(x.shape, lambda: {
+            "padded": np.zeros((n, h + 2 * p, w + 2 * p, c), np.float32),  # borders stay zero
+            "cols": np.empty((n * ho * wo, self.kh * self.kw * c), np.float32),
+            "out": np.empty((n * ho * wo, f), np.float32)})
+        xp = bufs["padded"]
+        if p:
+            xp[:, p:p + h, p:p + w] = x
+        else:
+            xp = x
+        cols = im2col(xp, self.kh, self.kw, self.stride, bufs["cols"])
+        out = np.matmul(cols, self.w, out=bufs["out"])
+        out += self.b
+        return out.reshape(n, ho, wo, f)
+
+class ReLU(_Layer):
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        return np.maximum(x, 0, out=x)  # in place on the previous layer's buffer
+
+class MaxPool2D(_Layer):
+    def __init__(self, size: int = 2):
+        super().__init__()
+        self.size = size
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        n, h, w, c = x.shape
+        s = self.size
+        ho, wo = h // s, w // s
+        out = self.buffers(x.shape, lambda: {"out": np.empty((n, ho, wo, c), np.float32)})["out"]
+        np.max(x[:, :ho * s, :wo * s].reshape(n, ho, s, wo, s, c), axis=(2, 4), out=out)
+        return out
+
+class Flatten(_Layer):
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        return x.reshape(len(x), -1)
+
+class Dense(_Layer):
+    def __init__(self, w: np.ndarray, b: np.ndarray):
+        super().__init__()
+        self.w = np.ascontiguousarray(w, dtype=np.float32)
+        self.b = np.asarray(b, dtype=np.float32)
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        out = self.buffers(x.shape, lambda: {"out": np.empty((len(x), self.w.shape[1]), np.float32)})["out"]
+        np.matmul(x, self.w, out=out)
+        out += self.b
+        return out
+
+def build_layers(specs: Sequence[dict], params: Dict[str, np.ndarray]) -> List[_Layer]:
+    """Layer objects from their JSON specs and a name -> array mapping (w<i>, b<i>)."""
+    layers = []
+    for i, spec in enumerate(specs):
+        kind = spec["type"]
+        if kind == "conv":
+            layers.append(Conv2D(params[f"w{i}"], params[f"b{i}"], spec.get("stride", 1), spec.get("pad", 0)))
+        elif kind == "dense":
+            layers.append(Dense(params[f"w{i}"], params[f"b{i}"]))
+        elif kind == "relu":
+            layers.append(ReLU())
+        elif kind == "maxpool":
+            layers.append(MaxPool2D(spec.get("size", 2)))
+        elif kind == "flatten":
+            layers.append(Flatten())
+        else:
+            raise ValueError(f"Unknown layer type: {kind!r}")
+    return layers
+
+class CNNClassifier:
+    """Forward-only CNN over crop feature rows, with predict()/predict_confidence() like the kNN engines."""
+
+    def __init__(self, specs: Sequence[dict], params: Dict[str, np.ndarray], classes: Sequence,
+                 mean: np.ndarray, std: np.ndarray, input_size: int = 32, image_shape: Sequence[int] = (100, 100, 3)):
+        self.specs, self.params = list(specs), params
+        self.layers = build_layers(self.specs, params)
+        self.class_names = list(classes)
+        self.classes_ = np.arange(len(self.class_names))
+        self.mean, self.std = np.asarray(mean, np.float32), np.asarray(std, np.float32)
+        self.input_size, self.image_shape = input_size, tuple(image_shape)
+
+    @classmethod
+    def from_npz(cls, path: str) -> "CNNClassifier":
+        with np.load(path) as z:
+            meta = json.loads(str(z["cnn"]))
+            params = {}
+            for name in z.files:
+                if name[0] in "wb" and name[1:].isdigit():
+                    a = z[name]
+                    if a.dtype == np.int8:
+                        a = a.astype(np.float32) * z[name + "_scale"]
+                    params[name] = a
+            return cls(meta["layers"], params, z["classes"].tolist(), z["mean"], z["std"],
+                       meta["input_size"], meta["image_shape"])
+
+    def save_npz(self, path: str, int8: bool = False) -> None:
+        arrays = {"cnn": np.array(json.dumps({"layers": self.specs, "input_size": self.input_size,
+                                              "image_shape": list(self.image_shape)})),
+                  "classes": np.array([str(c) for c in self.class_names]), "mean": self.mean, "std": self.std}
+        for name, a in self.params.items():
+            if int8 and name[0] == "w":
+                arrays[name], arrays[name + "_scale"] = quantize_int8(a)
+            else:
+                arrays[name] = np.asarray(a, np.float32)
+        np.savez(path, **arrays)
+
+    def preprocess(self, X: np.ndarray) -> np.ndarray:
+        """Feature rows (or an NHWC batch) in 0..255 to normalized (N, input_size, input_size, 3) float32."""
+        imgs = np.asarray(X).reshape(len(X), *self.image_shape)
+        if imgs.shape[1:3] != (self.input_size, self.input_size):
+            imgs = thumbnail(imgs.astype(np.float32, copy=False), self.input_size)
+        x = np.asarray(imgs, dtype=np.float32) / np.float32(255.0)
+        x -= self.mean
+        x /= self.std
+        return x
+
+    def logits(self, X: np.ndarray) -> np.ndarray:
+        """(N, n_classes) scores; a view of a reused buffer, valid until the next call."""
+        x = self.preprocess(X)
+        for layer in self.layers:
+            x = layer(x)
+        return x
+
+    def predict_confidence(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        z = self.logits(X)
+        best = z.argmax(axis=1)
+        p = np.exp(z - z.max(axis=1, keepdims=True))
+        return best, (p.max(axis=1) / p.sum(axis=1)).astype(np.float64)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.logits(X).argmax(axis=1)
+
+def is_cnn_npz(z) -> bool:
+    return "cnn" in z.files
@@ -0,0 +1,209 @@
+"""Train the small tsr.cnn network with plain NumPy backprop and save it as .npz.
+
+The project installs no deep-learning framework (the robot runs NumPy only), so the
+network is trained here: the same im2col convolution as the inference engine, its
+transpose (col2im) for the backward pass, softmax cross-entropy and Adam. Crops are
+area-averaged to `--size` pixels first, so an epoch over data/train takes well under a
+second. Training uses the train split of tsr.knn_baseline (random_state=0,
+test_size=0.25, plus the --extra augmentations of its images) and reports accuracy on
+its test split, so the numbers compare directly with the kNN's.
+
+Usage:
+    python -m tsr.cnn_train --data data/train --out models/cnn.npz
+    python -m tsr.cnn_train --data data/train --extra models/aug.npz --out models/cnn.npz --int8
+"""
+import argparse
+import time
+from typing import List
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from .cnn import CNNClassifier, im2col
+from .dataset import list_image_paths
+from .feature_store import load_features
+from .features import read_image_to_array, thumbnail
+from .knn_baseline import dataset_keys, load_extra, without_sources
+
+def default_specs(filters=(8, 16), hidden: int = 32, pools: int = 2) -> List[dict]:
+    """conv3x3 + ReLU (+ 2x2 max-pool for the first `pools`) per filter count, then dense layers."""
+    specs = []
+    for i, f in enumerate(filters):
+        specs += [{"type": "conv", "filters": f, "kernel": 3, "pad": 1}, {"type": "relu"}]
+        if i < pools:
+            specs.append({"type": "maxpool", "size": 2})
+    specs.append({"type": "flatten"})
+    if hidden:
+        specs += [{"type": "dense", "units": hidden}, {"type": "relu"}]
+    return specs
+
+def init_params(specs: List[dict], input_shape: tuple, n_classes: int, rng) -> dict:
+    """He-initialized weights; also completes the specs with the output layer."""
+    specs.append({"type": "dense", "units": n_classes})
+    params, shape = {}, input_shape  # (H, W, C)
+    for i, spec in enumerate(specs):
+        if spec["type"] == "conv":
+            k, f, p = spec["kernel"], spec["filters"], spec.get("pad", 0)
+            params[f"w{i}"] = (rng.standard_normal((k, k, shape[2], f)) * np.sqrt(2 / (k * k * shape[2]))).astype(np.float32)
+            params[f"b{i}"] = np.zeros(f, np.float32)
+            shape = (shape[0] + 2 * p - k + 1, shape[1] + 2 * p - k + 1, f)
+        elif spec["type"] == "maxpool":
+            shape = (shape[0] // spec["size"], shape[1] // spec["size"], shape[2])
+        elif spec["type"] == "flatten":
+            shape = (int(np.prod(shape)),)
+        elif spec["type"] == "dense":
+            params[f"w{i}"] = (rng.standard_normal((shape[0], spec["units"])) * np.sqrt(2 / shape[0])).astype(np.float32)
+            params[f"b{i}"] = np.zeros(spec["units"], np.float32)
+            shape = (spec["units"],)
+    return params
+
+def forward(specs, params, x):
+    """Logits and the per-layer caches the backward pass needs."""
+    caches = []
+    for i, spec in enumerate(specs):
+        kind = spec["type"]
+        if kind == "conv":
+            w, p = params[f"w{i}"], spec.get("pad", 0)
+            xp = np.pad(x, ((0, 0), (p, p), (p, p), (0, 0)))
+            cols = im2col(xp, w.shape[0], w.shape[1], 1)
+            n, ho, wo = len(x), xp.shape[1] - w.shape[0] + 1, xp.shape[2] - w.shape[1] + 1
+            caches.append((xp.shape, cols))
+            x = (cols @ w.reshape(-1, w.shape[3]) + params[f"b{i}"]).reshape(n, ho, wo, w.shape[3])
+        elif kind == "relu":
+            caches.append(x > 0)
+            x = x * caches[-1]
+        elif kind == "maxpool":
+            s = spec["size"]
+            n, h, w_, c = x.shape
+            win = x[:, :h // s * s, :w_ // s * s].reshape(n, h // s, s, w_ // s, s, c)
+            out = win.max(axis=(2, 4))
+            caches.append((x.shape, win == out[:, :, None, :, None]))
+            x = out
+        elif kind == "flatten":
+            caches.append(x.shape)
+            x = x.reshape(len(x), -1)
+        elif kind == "dense":
+            caches.append(x)
+            x = x @ params[f"w{i}"] + params[f"b{i}"]
+    return x, caches
+
+def backward(specs, params, caches, dz) -> dict:
+    grads = {}
+    for i in reversed(range(len(specs))):
+        kind, cache = specs[i]["type"], caches[i]
+        if kind == "dense":
+            grads[f"w{i}"], grads[f"b{i}"] = cache.T @ dz, dz.sum(axis=0)
+            dz = dz @ params[f"w{i}"].T
+        elif kind == "flatten":
+            dz = dz.reshape(cache)
+        elif kind == "relu":
+            dz = dz * cache
+        elif kind == "maxpool":
+            shape, mask = cache
+            s = specs[i]["size"]
+            n, h, w_, c = shape
+            full = np.zeros(shape, dz.dtype)
+            full[:, :h // s * s, :w_ // s * s] = (mask * dz[:, :, None, :, None]).reshape(n, h // s * s, w_ // s * s, c)
+            dz = full
+        elif kind == "conv":
+            (n, hp, wp, c), cols = cache
+            w, p = params[f"w{i}"], specs[i].get("pad", 0)
+            kh, kw, _, f = w.shape
+            d2 = dz.reshape(-1, f)
+            grads[f"w{i}"], grads[f"b{i}"] = (cols.T @ d2).reshape(w.shape), d2.sum(axis=0)
+            if i == 0:
+                break  # no gradient needed for the input
+            dcols = (d2 @ w.reshape(-1, f).T).reshape(n, dz.shape[1], dz.shape[2], kh, kw, c)
+            dxp = np.zeros((n, hp, wp, c), dz.dtype)
+            for a in range(kh):  # col2im: scatter each kernel tap back onto the input
+                for b in range(kw):
+                    dxp[:, a:a + dz.shape[1], b:b + dz.shape[2]] += dcols[:, :, :, a, b]
+            dz = dxp[:, p:hp - p, p:wp - p]
+    return grads
+
+def jitter(x: np.ndarray, rng, shift: int = 2) -> np.ndarray:
+    """Random translation by up to `shift` pixels (edge padded) and brightness/contrast jitter."""
+    n, h, w, _ = x.shape
+    xp = np.pad(x, ((0, 0), (shift, shift), (shift, shift), (0, 0)), mode="edge")
+    dy, dx = rng.integers(0, 2 * shift + 1, size=(2, n))
+    out = np.stack([xp[i, dy[i]:dy[i] + h, dx[i]:dx[i] + w] for i in range(n)])
+    return out * rng.uniform(0.8, 1.2, (n, 1, 1, 1)).astype(np.float32) + rng.uniform(-0.1, 0.1, (n, 1, 1, 1)).astype(np.float32)
+
+def train(x: np.ndarray, y: np.ndarray, specs, params, epochs: int = 60, batch: int = 16, lr: float = 3e-3,
+          weight_decay: float = 1e-4, seed: int = 0, log=print) -> dict:
+    """Adam on softmax cross-entropy over normalized (N, H, W, 3) inputs; updates params in place."""
+    rng = np.random.default_rng(seed)
+    m = {k: np.zeros_like(v) for k, v in params.items()}
+    v = {k: np.zeros_like(a) for k, a in params.items()}
+    t = 0
+    for epoch in range(epochs):
+        order, loss, correct = rng.permutation(len(x)), 0.0, 0
+        for s in range(0, len(x), batch):
+            idx = order[s:s + batch]
+            z, caches = forward(specs, params, jitter(x[idx], rng))
+            p = np.exp(z - z.max(axis=1, keepdims=True))
+            p /= p.sum(axis=1, keepdims=True)
+            loss -= np.log(p[np.arange(len(idx)), y[idx]] + 1e-12).sum()
+            correct += int((z.argmax(axis=1) == y[idx]).sum())
+            p[np.arange(len(idx)), y[idx]] -= 1
+            grads = backward(specs, params, caches, p / len(idx))
+            t += 1
+            for k, g in grads.items():
+                if k[0] == "w":
+                    g = g + weight_decay * params[k]
+                m[k] = 0.9 * m[k] + 0.1 * g
+                v[k] = 0.999 * v[k] + 0.001 * g * g
+                params[k] -= (lr * (m[k] / (1 - 0.9 ** t)) / (np.sqrt(v[k] / (1 - 0.999 ** t)) + 1e-8)).astype(np.float32)
+        if log and (epoch + 1) % 10 == 0:
+            log(f"epoch {epoch + 1:4d}  loss {loss / len(x):.4f}  train acc {correct / len(x):.3f}")
+    return params
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data", default="data/train", help="dataset root with class subfolders")
+    ap.add_argument("--store", default="", help="optional feature store directory")
+    ap.add_argument("--extra", action="append", default=[],
+                    help="augmented feature matrix (.npz with X, labels) appended to the training split")
+    ap.add_argument("--out", default="models/cnn.npz", help="output .npz for tsr.cnn")
+    ap.add_argument("--size", type=int, default=32, help="network input size (crops are area-averaged to it)")
+    ap.add_argument("--filters", default="8,16", help="comma-separated conv filter counts")
+    ap.add_argument("--hidden", type=int, default=32, help="hidden dense units (0: none)")
+    ap.add_argument("--epochs", type=int, default=60)
+    ap.add_argument("--batch", type=int, default=16)
+    ap.add_argument("--lr", type=float, default=3e-3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--int8", action="store_true", help="store int8 weights with per-channel scales")
+    args = ap.parse_args()
+
+    X, labels = load_features(args.data, args.store)
+    classes = sorted(set(labels))
+    y = np.array([classes.index(lbl) for lbl in labels], dtype=int)
+    paths, _ = list_image_paths(args.data)
+    h, w = read_image_to_array(paths[0]).shape[:2]
+    imgs = np.asarray(X, np.float32).reshape(len(X), h, w, 3)
+    train_idx, test_idx = train_test_split(np.arange(len(y)), random_state=0, test_size=0.25)
+    extra_imgs, extra_y, _ = without_sources(load_extra(args.extra, classes, h, w, np.float32),
+                                          dataset_keys(paths, args.data)[test_idx])
+    small = lambda a: thumbnail(a, args.size).astype(np.float32) / np.float32(255.0) if len(a) else \
+        np.zeros((0, args.size, args.size, 3), np.float32)
+    x_train = np.concatenate([small(imgs[train_idx]), small(extra_imgs)])
+    y_train = np.concatenate([y[train_idx], extra_y])
+    mean = x_train.mean(axis=(0, 1, 2))
+    std = x_train.std(axis=(0, 1, 2)) + 1e-6
+
+    rng = np.random.default_rng(args.seed)
+    specs = default_specs(tuple(int(f) for f in args.filters.split(",")), args.hidden)
+    params = init_params(specs, (args.size, args.size, 3), len(classes), rng)
+    t0 = time.perf_counter()
+    train((x_train - mean) / std, y_train, specs, params, args.epochs, args.batch, args.lr, seed=args.seed)
+    print(f"Trained on {len(y_train)} samples in {time.perf_counter() - t0:.1f} s")
+
+    model = CNNClassifier(specs, params, classes, mean, std, args.size, imgs.shape[1:])
+    model.save_npz(args.out, int8=args.int8)
+    model = CNNClassifier.from_npz(args.out)
+    acc = float(np.mean(model.predict(X[test_idx]) == y[test_idx]))
+    print(f"Test accuracy ({len(test_idx)} crops): {acc:.3f}")
+    print("Saved", args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Training-set condensation: a much smaller kNN reference set with the same decision boundaries.
+
+Every augmentation run grows the set KNeighborsClassifier stores and scans per query.
+After fitting, the training rows can be reduced by a chain of steps ("enn+cnn",
+"enn+kmeans", ...):
+
+    enn     Wilson's edited nearest neighbour: drop rows outvoted by their k nearest
+            other rows (label noise, class overlap), which smooths the boundaries
+    cnn     Hart's condensed nearest neighbour: keep only the rows 1-NN needs to classify
+            every other row correctly; interior rows of a class go, boundary rows stay
+    kmeans  per-class k-means prototypes (tsr.ann.kmeans), `size` centroids in total,
+            shared between classes in proportion to their rows (at least one each)
+
+The k-means count is the size knob: set it directly, or let choose_size() find the
+smallest count whose accuracy on held-out rows stays within a loss budget of the full
+set's. Condensing can cost a lot of accuracy on small, noisy sets, so fit_condensed()
+cross-validates the condensed set against the full kNN and keeps the full set, with a
+warning, when it loses more than the budget (DEFAULT_LOSS unless given; inf skips the
+check). tsr.knn_baseline --condense refits the kNN that way, saves it in the bundle
+(with a "condensed" record) and reports compression, accuracy and latency before and
+after.
+
+Usage:
+    python -m tsr.knn_baseline --extra models/aug_features.npz --condense enn+cnn --save models/knn.joblib
+    python -m tsr.knn_baseline --extra models/aug_features.npz --condense enn+kmeans --condense-loss 0.05 --export models/knn.npz
+"""
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .ann import kmeans, sq_dist
+from .knn_fast import vote_counts
+
+METHODS = ("enn", "cnn", "kmeans")
+DEFAULT_LOSS = 0.02  # accuracy the condensed set may lose against the full one
+
+def parse_methods(spec: str) -> List[str]:
+    steps = [s.strip() for s in spec.split("+") if s.strip()]
+    unknown = [s for s in steps if s not in METHODS]
+    if unknown or not steps:
+        raise ValueError(f"Unknown condensation step(s) in {spec!r}; expected {'+'.join(METHODS)} joined by '+'")
+    return steps
+
+def nearest(Q: np.ndarray, X: np.ndarray, k: int, exclude_self: bool = False, block: int = 1024) -> np.ndarray:
+    """(len(Q), k) indices of the k nearest rows of X, in query blocks; Q is X itself when exclude_self."""
+    X = np.asarray(X, dtype=np.float32)
+    x_sq = np.einsum("ij,ij->i", X, X)
+    k = min(k, len(X) - exclude_self)
+    out = np.empty((len(Q), k), np.int64)
+    for s in range(0, len(Q), block):
+        d2 = sq_dist(np.asarray(Q[s:s + block], dtype=np.float32), X, x_sq)
+        if exclude_self:
+            d2[np.arange(len(d2)), np.arange(s, s + len(d2))] = np.inf
+        out[s:s + block] = np.argpartition(d2, k - 1, axis=1)[:, :k] if k < d2.shape[1] else np.argsort(d2, axis=1)
+    return out
+
+def edited_nn(X: np.ndarray, y: np.ndarray, k: int = 3) -> np.ndarray:
+    """Indices kept by Wilson's ENN: rows whose k nearest other rows vote for their own class.
+
+    A class that would lose every row keeps all of them.
+    """
+    classes, y_idx = np.unique(y, return_inverse=True)
+    if len(X) < 2:
+        return np.arange(len(X))
+    votes = vote_counts(y_idx[nearest(X, X, k, exclude_self=True)], len(classes))
+    keep = votes.argmax(axis=1) == y_idx
+    for c in range(len(classes)):
+        if not keep[y_idx == c].any():
+            keep[y_idx == c] = True
+    return np.flatnonzero(keep)
+
+def condensed_nn(X: np.ndarray, y: np.ndarray, seed: int = 0, block: int = 256) -> np.ndarray:
+    """Indices of a Hart CNN subset: 1-NN over it classifies every row of X correctly.
+
+    Rows are visited in a seeded random order, a block at a time; the misclassified rows
+    of a block join the subset, and passes repeat until one adds nothing.
+    """
+    y = np.asarray(y)
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(X))
+    _, first = np.unique(y[order], return_index=True)
+    store = list(order[first])  # one random row per class
+    in_store = np.zeros(len(X), bool)
+    in_store[store] = True
+    added = True
+    while added:
+        added = False
+        for s in range(0, len(order), block):
+            rows = order[s:s + block]
+            rows = rows[~in_store[rows]]
+            if not len(rows):
+                continue
+            S = np.asarray(store)
+            wrong = rows[y[S[nearest(X[rows], X[S], 1)[:, 0]]] != y[rows]]
+            if len(wrong):
+                store.extend(wrong.tolist())
+                in_store[wrong] = True
+                added = True
+    return np.sort(np.asarray(store))
+
+def kmeans_prototypes(X: np.ndarray, y: np.ndarray, size: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """About `size` per-class k-means centroids and their labels (a class keeps its rows if it has fewer)."""
+    y = np.asarray(y)
+    classes, counts = np.unique(y, return_counts=True)
+    per_class = np.minimum(np.maximum(1, np.rint(size * counts / len(y)).astype(int)), counts)
+    P, py = [], []
+    for c, n_c in zip(classes, per_class):
+        Xc = np.asarray(X[y == c], dtype=np.float32)
+        P.append(Xc if n_c == len(Xc) else kmeans(Xc, n_c, seed=seed))
+        py.append(np.full(len(P[-1]), c, dtype=y.dtype))
+    return np.concatenate(P), np.concatenate(py)
+
+def condense(X: np.ndarray, y: np.ndarray, methods: Sequence[str], size: int = 0, k_edit: int = 3,
+             seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Apply the steps in order; `size` is the k-means prototype count (0: a tenth of the rows reaching it)."""
+    X, y = np.asarray(X), np.asarray(y)
+    for step in methods:
+        if step == "enn":
+            keep = edited_nn(X, y, k_edit)
+        elif step == "cnn":
+            keep = condensed_nn(X, y, seed)
+        else:
+            X, y = kmeans_prototypes(X, y, size or max(1, len(X) // 10), seed)
+            continue
+        X, y = X[keep], y[keep]
+    return X, y
+
+def choose_size(X_fit: np.ndarray, y_fit: np.ndarray, X_cal: np.ndarray, y_cal: np.ndarray,
+                methods: Sequence[str], make_clf: Callable, max_loss: float, k_edit: int = 3,
+                seed: int = 0, make_full: Optional[Callable] = None) -> Tuple[float, dict]:
+    """Smallest prototype share of the rows whose held-out accuracy is within `max_loss` of the full set's.
+
+    make_clf(n_rows) / make_full(n_rows) build the kNN for condensed / all rows (default:
+    the same). Prototype counts double from one per class; returns (count / len(X_fit),
+    {count: accuracy}).
+    """
+    acc = lambda make, Xr, yr: float(np.mean(make(len(Xr)).fit(Xr, yr).predict(X_cal) == y_cal))
+    base = acc(make_full or make_clf, X_fit, y_fit)
+    tried, size = {}, len(np.unique(y_fit))
+    while size < len(X_fit):
+        tried[size] = acc(make_clf, *condense(X_fit, y_fit, methods, size, k_edit, seed))
+        if tried[size] >= base - max_loss:
+            return size / len(X_fit), tried
+        size *= 2
+    return 1.0, tried
+
+def holdout(rows: np.ndarray, y: np.ndarray, share: float, seed: int = 0) -> np.ndarray:
+    """A random `share` of `rows` drawn class by class (a class with one row keeps it)."""
+    rng = np.random.default_rng(seed)
+    picked = [np.empty(0, np.int64)]
+    for c in np.unique(y[rows]):
+        r = rows[y[rows] == c]
+        picked.append(rng.choice(r, int(round(share * len(r))) if len(r) > 1 else 0, replace=False))
+    return np.sort(np.concatenate(picked))
+
+def fit_knn(make: Callable, X: np.ndarray, y: np.ndarray):
+    clf = make(len(X))
+    clf.fit(X, y)
+    return clf
+
+def cross_validate(F: np.ndarray, y: np.ndarray, methods: Sequence[str], make_full: Callable,
+                   make_condensed: Callable, real: np.ndarray, sources: np.ndarray, size: int = 0,
+                   k_edit: int = 3, folds: int = 5, seed: int = 0) -> Tuple[float, float]:
+    """(full, condensed) kNN accuracy over `folds` folds of the rows in `real`.
+
+    Both are fitted on the other rows minus those sharing a held-out row's `sources` key
+    (augmentations of a held-out image); `size` is scaled to the rows of each fold.
+    """
+    correct = np.zeros(2)
+    for held in np.array_split(np.random.default_rng(seed).permutation(real), min(folds, len(real))):
+        fit = np.flatnonzero(~np.isin(sources, sources[held]))
+        F_c, y_c = condense(F[fit], y[fit], methods, max(1, size * len(fit) // len(F)) if size else 0, k_edit, seed)
+        for i, (make, X, yx) in enumerate([(make_full, F[fit], y[fit]), (make_condensed, F_c.astype(F.dtype, copy=False), y_c)]):
+            correct[i] += np.sum(fit_knn(make, X, yx).predict(F[held]) == y[held])
+    return correct[0] / len(real), correct[1] / len(real)
+
+def fit_condensed(F: np.ndarray, y: np.ndarray, methods: Sequence[str], make_full: Callable, make_condensed: Callable,
+                  size: int = 0, max_loss: float = DEFAULT_LOSS, k_edit: int = 3, real: Optional[np.ndarray] = None,
+                  sources: Optional[np.ndarray] = None, seed: int = 0, log=print) -> Tuple[object, dict]:
+    """kNN fitted on a condensed copy of (F, y), or on all of it when condensing loses over `max_loss`; and a report.
+
+    make_full(n_rows) / make_condensed(n_rows) build the two kNNs. Only the rows in `real`
+    (default: all) are held out, and `sources` names the image each row comes from (an
+    augmentation shares its original's key). Without a `size`, a kmeans step gets the
+    fewest prototypes within the budget on a held-out quarter of `real`. The final
+    condensed set is then cross-validated against the full kNN; the report records
+    both accuracies.
+    """
+    real = np.arange(len(F)) if real is None else np.asarray(real)
+    sources = np.arange(len(F)).astype(str) if sources is None else np.asarray(sources)
+    spec = "+".join(methods)
+    check = bool(np.isfinite(max_loss))
+    if "kmeans" in methods and not size and check:  # prototype count, scaled to all of F
+        cal = holdout(real, y, 0.25, seed)
+        fit = np.flatnonzero(~np.isin(sources, sources[cal]))
+        share, _ = choose_size(F[fit], y[fit], F[cal], y[cal], methods, make_condensed, max_loss, k_edit, seed,
+                               make_full)
+        size = max(1, int(round(share * len(F))))
+    info = {"method": spec, "rows_before": len(F), "max_loss": max_loss}
+    if check:
+        info["cv_accuracy_full"], info["cv_accuracy"] = cross_validate(F, y, methods, make_full, make_condensed,
+                                                                       real, sources, size, k_edit, seed=seed)
+        if info["cv_accuracy"] < info["cv_accuracy_full"] - max_loss:
+            if log:
+                log(f"Warning: {spec} loses {info['cv_accuracy_full'] - info['cv_accuracy']:.3f} accuracy in "
+                    f"cross-validation, over the {max_loss} budget; keeping the full training set")
+            clf = fit_knn(make_full, F, y)
+            info.update(method=f"none ({spec} over budget)", k=clf.n_neighbors, rows_after=len(F))
+            return clf, info
+    F_c, y_c = condense(F, y, methods, size, k_edit, seed)
+    clf = fit_knn(make_condensed, F_c.astype(F.dtype, copy=False), y_c)
+    info.update(k=clf.n_neighbors, rows_after=len(F_c))
+    return clf, info
@@ -1,6 +1,18 @@
+"""Dataset listing and streaming: one subfolder per class under the dataset root.
+
+Usage:
+    for X, y in iter_batches("data/train", batch_size=256, size=(100, 100)):
+        ...                                  # X: (<=256, 30000) float32, y: labels
+"""
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .features import read_image_to_array, images_to_feature_matrix, feature_dim
 
 def list_image_paths(dataset_dir: str, extensions={'.png','.jpg','.jpeg','.bmp'}) -> Tuple[list, list]:
     """Return (paths, labels) for images under dataset_dir, where each subfolder is a class label."""
@@ -16,4 +28,55 @@ def list_image_paths(dataset_dir: str, extensions={'.png','.jpg','.jpeg','.bmp'}
 
 def ensure_dirs(*dirs: str) -> None:
     for d in dirs:
-        Path(d).mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+        Path(d).mkdir(parents=True, exist_ok=True)
+
+def read_rgb(path: str, size: Optional[Tuple[int, int]] = None) -> np.ndarray:
+    """Decode an image to RGB with the default reader, optionally resized to size=(w, h)."""
+    img = read_image_to_array(path)
+    if size is not None and img.shape[1::-1] != tuple(size):
+        import cv2
+        img = cv2.resize(img, tuple(size), interpolation=cv2.INTER_AREA)
+    return img
+
+def iter_images(paths: Sequence[str], workers: int = 0, prefetch: int = 64,
+                size: Optional[Tuple[int, int]] = None, reader: Callable = read_rgb) -> Iterator[np.ndarray]:
+    """Decode images on a thread pool and yield them in order.
+
+    Image decoders release the GIL, so threads keep several cores busy; at most
+    `prefetch` decoded images wait in memory at any time.
+    """
+    workers = workers or min(8, os.cpu_count() or 1)
+    if workers == 1:
+        for p in paths:
+            yield reader(p, size)
+        return
+    with ThreadPoolExecutor(workers) as pool:
+        pending = deque()
+        for p in paths:
+            if len(pending) >= prefetch:
+                yield pending.popleft().result()
+            pending.append(pool.submit(reader, p, size))
+        while pending:
+            yield pending.popleft().result()
+
+def iter_batches(source: Union[str, Tuple[Sequence[str], Sequence[str]]], batch_size: int = 256,
+                 workers: int = 0, prefetch: int = 2, size: Optional[Tuple[int, int]] = None,
+                 dtype=np.float32, reader: Callable = read_rgb) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Stream a dataset as (X_batch, y_batch) chunks of flattened RGB features.
+
+    `source` is a dataset root (one subfolder per class) or a (paths, labels) pair.
+    Images are decoded by iter_images with up to `prefetch` batches in flight and,
+    given size=(w, h), resized on the fly; every image must otherwise share the first
+    one's shape. Only the current batch and the prefetched images are held in memory.
+    """
+    paths, labels = list_image_paths(source) if isinstance(source, (str, Path)) else source
+    images = iter_images(paths, workers, prefetch * batch_size, size, reader)
+    for start in range(0, len(paths), batch_size):
+        n = min(batch_size, len(paths) - start)
+        X = None
+        for i in range(n):
+            img = next(images)
+            if X is None:
+                X = np.empty((n, feature_dim(img.shape)), dtype=dtype)
+            images_to_feature_matrix([img], out=X[i:i + 1])
+        yield X, np.asarray(labels[start:start + n])
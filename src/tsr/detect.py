@@ -0,0 +1,164 @@
+"""Shared circle detector for speed-limit signs (HoughCircles + cropping).
+
+One configurable detector replaces the copies in scripts/hough_tuner.py,
+scripts/realtime_extract_and_classify.py and raspberry/robot_run.py. On top of the
+plain full-frame Hough it can:
+
+- red_mask: threshold the red ring in HSV and only search around red blobs;
+- pyramid:  detect on a frame downscaled `pyramid` times by 2, then refine every circle
+            with a small full-resolution Hough around it;
+- roi:      restrict the search to a rectangle given as frame fractions (x0, y0, x1, y1),
+            e.g. (0.5, 0.0, 1.0, 0.7) for the right-hand side of the road.
+
+Usage:
+    det = CircleDetector(PRESETS["realtime"], red_mask=True)
+    circles, crops = det(frame_bgr)          # [(x, y, r), ...], [100x100 BGR crop, ...]
+"""
+from dataclasses import dataclass, replace
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+@dataclass
+class HoughParams:
+    dp: float = 1.2
+    min_dist: float = 25
+    param1: float = 80
+    param2: float = 35
+    min_radius: int = 12
+    max_radius: int = 120
+    blur: str = "gaussian"  # or "median"
+    blur_ksize: int = 9
+
+PRESETS = {
+    "tuner": HoughParams(param2=40, min_radius=10),
+    "realtime": HoughParams(),
+    "robot": HoughParams(dp=1, min_dist=20, param1=150, param2=40, min_radius=80, max_radius=150,
+                         blur="median", blur_ksize=5),
+}
+
+def preprocess(bgr: np.ndarray, params: HoughParams) -> np.ndarray:
+    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+    if params.blur == "median":
+        return cv2.medianBlur(gray, params.blur_ksize)
+    return cv2.GaussianBlur(gray, (params.blur_ksize, params.blur_ksize), 1.5)
+
+def hough(gray: np.ndarray, params: HoughParams) -> np.ndarray:
+    """(n, 3) float array of x, y, r."""
+    circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, params.dp, params.min_dist,
+                               param1=params.param1, param2=params.param2,
+                               minRadius=max(int(params.min_radius), 1), maxRadius=max(int(params.max_radius), 1))
+    return np.empty((0, 3), np.float32) if circles is None else circles[0]
+
+def red_mask(bgr: np.ndarray, min_sat: int = 90, min_val: int = 70) -> np.ndarray:
+    """Binary mask of red pixels (hue wraps around 0 in OpenCV's 0..180 scale), speckle removed."""
+    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+    low = cv2.inRange(hsv, (0, min_sat, min_val), (10, 255, 255))
+    high = cv2.inRange(hsv, (170, min_sat, min_val), (180, 255, 255))
+    mask = cv2.morphologyEx(low | high, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+    return cv2.dilate(mask, np.ones((7, 7), np.uint8))
+
+def crop_circles(frame: np.ndarray, circles, size: int = 100, pad: int = 6) -> Tuple[list, list]:
+    """Square crops around circles, resized to size x size; circles whose crop is empty are dropped."""
+    h, w = frame.shape[:2]
+    kept, crops = [], []
+    for x, y, r in circles:
+        x, y, r = int(x), int(y), int(r)
+        if r <= 0:
+            continue
+        x0, y0 = max(0, x - r - pad), max(0, y - r - pad)
+        x1, y1 = min(w, x + r + pad), min(h, y + r + pad)
+        crop = frame[y0:y1, x0:x1]
+        if crop.size == 0:
+            continue
+        kept.append((x, y, r))
+        crops.append(cv2.resize(crop, (size, size), interpolation=cv2.INTER_AREA))
+    return kept, crops
+
+class CircleDetector:
+    def __init__(self, params: Optional[HoughParams] = None, red_mask: bool = False, pyramid: int = 0,
+                 roi: Optional[Tuple[float, float, float, float]] = None, pad: int = 6, crop_size: int = 100):
+        self.params = replace(params) if params else HoughParams()  # own copy: tuners mutate it
+        self.use_red_mask, self.pyramid, self.roi = red_mask, pyramid, roi
+        self.pad, self.crop_size = pad, crop_size
+
+    def _roi_box(self, shape) -> Tuple[int, int, int, int]:
+        h, w = shape[:2]
+        if self.roi is None:
+            return 0, 0, w, h
+        fx0, fy0, fx1, fy1 = self.roi
+        return int(fx0 * w), int(fy0 * h), int(fx1 * w), int(fy1 * h)
+
+    def _search_boxes(self, bgr: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """Regions to run Hough on: the whole image, or padded boxes around red blobs."""
+        h, w = bgr.shape[:2]
+        if not self.use_red_mask:
+            return [(0, 0, w, h)]
+        p = self.params
+        n, _, stats, _ = cv2.connectedComponentsWithStats(red_mask(bgr))
+        boxes, area = [], 0
+        for x, y, bw, bh, px in stats[1:n]:
+            if max(bw, bh) < p.min_radius or max(bw, bh) > 2.2 * p.max_radius:
+                continue
+            if not 0.6 <= bw / bh <= 1.6 or px > 0.85 * bw * bh:
+                continue  # a sign ring is roughly square and hollow
+            m = max(bw, bh) // 4 + 2
+            box = (max(0, x - m), max(0, y - m), min(w, x + bw + m), min(h, y + bh + m))
+            boxes.append(box)
+            area += (box[2] - box[0]) * (box[3] - box[1])
+        # many scattered red regions: one full-frame pass is cheaper than many small ones
+        return [(0, 0, w, h)] if area > 0.5 * w * h else boxes
+
+    def _detect_full(self, bgr: np.ndarray, params: HoughParams) -> np.ndarray:
+        found = []
+        for x0, y0, x1, y1 in self._search_boxes(bgr):
+            c = hough(preprocess(bgr[y0:y1, x0:x1], params), params)
+            if len(c):
+                found.append(c + np.array([x0, y0, 0], np.float32))
+        return np.concatenate(found) if found else np.empty((0, 3), np.float32)
+
+    def _refine(self, bgr: np.ndarray, x: float, y: float, r: float) -> Tuple[float, float, float]:
+        """Full-resolution Hough in a small window around a circle found at low resolution."""
+        h, w = bgr.shape[:2]
+        m = int(r * 1.4) + 4
+        x0, y0, x1, y1 = max(0, int(x) - m), max(0, int(y) - m), min(w, int(x) + m), min(h, int(y) + m)
+        p = replace(self.params, min_radius=int(r * 0.8), max_radius=int(r * 1.2) + 1, min_dist=r)
+        c = hough(preprocess(bgr[y0:y1, x0:x1], p), p)
+        if not len(c):
+            return x, y, r
+        cx, cy, cr = c[0]
+        return cx + x0, cy + y0, cr
+
+    def detect(self, frame: np.ndarray) -> np.ndarray:
+        """(n, 3) int32 array of x, y, r in frame coordinates."""
+        x0, y0, x1, y1 = self._roi_box(frame.shape)
+        view = frame[y0:y1, x0:x1]
+        if self.pyramid:
+            small = view
+            for _ in range(self.pyramid):
+                small = cv2.pyrDown(small)
+            s = view.shape[1] / small.shape[1]
+            p = self.params
+            p_small = replace(p, min_dist=p.min_dist / s, min_radius=int(p.min_radius / s),
+                              max_radius=int(np.ceil(p.max_radius / s)),
+                              blur_ksize=max(3, (p.blur_ksize // int(s)) | 1))
+            circles = np.array([self._refine(view, cx * s, cy * s, cr * s)
+                                for cx, cy, cr in self._detect_full(small, p_small)], np.float32).reshape(-1, 3)
+        else:
+            circles = self._detect_full(view, self.params)
+        circles = circles + np.array([x0, y0, 0], np.float32)
+        return np.around(circles).astype(np.int32)
+
+    def __call__(self, frame: np.ndarray) -> Tuple[list, list]:
+        """([(x, y, r), ...], [crop, ...]) for every detected circle."""
+        return crop_circles(frame, self.detect(frame), self.crop_size, self.pad)
+
+def parse_roi(text: str) -> Optional[Tuple[float, float, float, float]]:
+    """'x0,y0,x1,y1' as frame fractions, or None for an empty string."""
+    if not text:
+        return None
+    vals = tuple(float(v) for v in text.split(","))
+    if len(vals) != 4:
+        raise ValueError(f"ROI needs 4 comma-separated fractions, got {text!r}")
+    return vals
@@ -0,0 +1,144 @@
+"""Persistent, memory-mapped feature store for a dataset folder.
+
+The store keeps the flattened RGB matrix in `features.npy`, the class labels in
+`labels.npy` and, in `index.json`, the path/size/mtime fingerprint of every source
+image. Syncing only decodes files that were added or changed since the last run,
+streamed in batches by tsr.dataset.iter_batches; unchanged rows are copied over.
+
+Usage:
+    python -m tsr.feature_store --data data/train --store models/features
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from .dataset import list_image_paths, ensure_dirs, iter_batches
+from .features import read_image_to_array, images_to_feature_matrix, feature_dim, image_paths_to_feature_matrix
+
+INDEX_FILE = "index.json"
+FEATURES_FILE = "features.npy"
+LABELS_FILE = "labels.npy"
+SYNC_BATCH = 256  # rows decoded or copied per step of sync()
+
+def fingerprint(path: str) -> list:
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+class FeatureStore:
+    """Feature matrix + labels of a dataset, stored as .npy files under `root`."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    @property
+    def features_path(self) -> Path:
+        return self.root / FEATURES_FILE
+
+    @property
+    def labels_path(self) -> Path:
+        return self.root / LABELS_FILE
+
+    def exists(self) -> bool:
+        return (self.root / INDEX_FILE).exists() and self.features_path.exists()
+
+    def read_index(self) -> dict:
+        with open(self.root / INDEX_FILE) as f:
+            return json.load(f)
+
+    def open(self, mmap_mode: str = "r") -> Tuple[np.ndarray, np.ndarray]:
+        """Return (X, labels) without reading the matrix into memory."""
+        if not self.exists():
+            raise FileNotFoundError(f"No feature store in {self.root}; run sync() first")
+        X = np.load(self.features_path, mmap_mode=mmap_mode)
+        labels = np.load(self.labels_path)
+        return X, labels
+
+    def sync(self, dataset_dir: str, dtype=np.float32) -> dict:
+        """Bring the store up to date with `dataset_dir`; return counts of what changed."""
+        paths, labels = list_image_paths(dataset_dir)
+        if not paths:
+            raise FileNotFoundError(f"No images found in {dataset_dir}")
+        keys = [os.path.relpath(p, dataset_dir) for p in paths]
+        prints = [fingerprint(p) for p in paths]
+        dtype = np.dtype(dtype)
+
+        old_rows, old_X = {}, None
+        if self.exists():
+            index = self.read_index()
+            if index.get("dtype") == dtype.name:
+                old_X = np.load(self.features_path, mmap_mode="r")
+                old_rows = {k: (i, fp) for i, (k, fp) in enumerate(zip(index["paths"], index["fingerprints"]))}
+
+        reuse = [old_rows[k][0] if k in old_rows and old_rows[k][1] == fp else None
+                 for k, fp in zip(keys, prints)]
+        stats = {"total": len(paths),
+                 "reused": sum(r is not None for r in reuse),
+                 "removed": len(set(old_rows) - set(keys))}
+        stats["decoded"] = stats["total"] - stats["reused"]
+        if old_X is not None and stats["decoded"] == 0 and stats["removed"] == 0 \
+                and reuse == list(range(len(keys))):
+            return stats
+
+        shape = None
+        if old_X is not None:
+            shape = index["shape"]
+        first_new = next((i for i, r in enumerate(reuse) if r is None), None)
+        first_img = read_image_to_array(paths[first_new]) if first_new is not None else None
+        if first_img is not None:
+            if shape is not None and list(first_img.shape[:2]) != list(shape):
+                old_X, reuse = None, [None] * len(keys)
+                stats["reused"], stats["decoded"] = 0, len(keys)
+            shape = list(first_img.shape[:2])
+
+        ensure_dirs(str(self.root))
+        tmp = self.root / (FEATURES_FILE + ".tmp")
+        X = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype,
+                                      shape=(len(paths), feature_dim(shape)))
+        kept = [(i, r) for i, r in enumerate(reuse) if r is not None]
+        for s in range(0, len(kept), SYNC_BATCH):  # reused rows, copied a block at a time
+            dst, src = zip(*kept[s:s + SYNC_BATCH])
+            X[list(dst)] = old_X[list(src)]
+        if first_new is not None:
+            images_to_feature_matrix([first_img], out=X[first_new:first_new + 1])
+        # the other changed files stream in as batches decoded on a thread pool
+        new = [i for i, r in enumerate(reuse) if r is None and i != first_new]
+        done = 0
+        for Xb, _ in iter_batches(([paths[i] for i in new], [labels[i] for i in new]), SYNC_BATCH, dtype=dtype):
+            X[new[done:done + len(Xb)]] = Xb
+            done += len(Xb)
+        X.flush()
+        del X, old_X
+        os.replace(tmp, self.features_path)
+        np.save(self.labels_path, np.array(labels))
+        with open(self.root / INDEX_FILE, "w") as f:
+            json.dump({"dataset": str(dataset_dir), "dtype": dtype.name, "shape": shape,
+                       "paths": keys, "fingerprints": prints}, f)
+        return stats
+
+def load_features(dataset_dir: str, store: str = "", dtype=np.float32) -> Tuple[np.ndarray, List[str]]:
+    """(X, labels) for a dataset, through the feature store when `store` is given."""
+    if store:
+        fs = FeatureStore(store)
+        fs.sync(dataset_dir, dtype=dtype)
+        X, labels = fs.open()
+        return X, labels.tolist()
+    paths, labels = list_image_paths(dataset_dir)
+    return image_paths_to_feature_matrix(paths, dtype=dtype), labels
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data", default="data/train", help="dataset root with class subfolders")
+    ap.add_argument("--store", default="models/features", help="feature store directory")
+    ap.add_argument("--dtype", default="float32", choices=["float32", "float64", "uint8"])
+    args = ap.parse_args()
+
+    stats = FeatureStore(args.store).sync(args.data, dtype=args.dtype)
+    print(f"Synced {args.store}: {stats['total']} samples "
+          f"({stats['decoded']} decoded, {stats['reused']} reused, {stats['removed']} removed)")
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,208 @@
-from typing import List
+from typing import List, Optional, Sequence, Union
 import numpy as np
-import matplotlib.pyplot as plt
 
 def read_image_to_array(path: str) -> np.ndarray:
     """Read an image with matplotlib (keeps compatibility with the original code)."""
+    import matplotlib.pyplot as plt  # imported on first use: the robot loop never reads files
     return plt.imread(path)
 
+def feature_dim(shape: Sequence[int]) -> int:
+    """Length of the flattened RGB feature vector for an image of the given shape."""
+    return int(shape[0]) * int(shape[1]) * 3
+
+def images_to_feature_matrix(imgs: Union[np.ndarray, Sequence[np.ndarray]],
+                             out: Optional[np.ndarray] = None,
+                             dtype=np.float32) -> np.ndarray:
+    """Flatten N HxWx3 images into one contiguous (N, H*W*3) matrix.
+
+    Row order is [R,G,B, R,G,B, ...] scanned row by row, exactly as image_array_to_rgb_list,
+    so models trained on the old features keep working. Extra channels (alpha) are dropped.
+    `imgs` is either an (N,H,W,C) array or a sequence of equally sized HxWxC arrays.
+    Pass `out` to reuse a preallocated buffer; its dtype takes precedence over `dtype`.
+    """
+    n = len(imgs)
+    if n == 0:
+        return np.empty((0, 0), dtype=dtype if out is None else out.dtype)
+    h, w = imgs[0].shape[:2]
+    d = feature_dim((h, w))
+    if out is None:
+        out = np.empty((n, d), dtype=dtype)
+    elif out.shape != (n, d) or not out.flags.c_contiguous:
+        raise ValueError(f"out must be a C-contiguous array of shape {(n, d)}, got {out.shape}")
+
+    view = out.reshape(n, h, w, 3)
+    if isinstance(imgs, np.ndarray) and imgs.ndim == 4:
+        view[...] = imgs[..., :3]
+        return out
+    for i, img in enumerate(imgs):
+        if img.shape[:2] != (h, w):
+            raise ValueError(f"image {i} has shape {img.shape[:2]}, expected {(h, w)}")
+        view[i] = img[..., :3]
+    return out
+
+def image_array_to_features(img: np.ndarray, dtype=np.float32) -> np.ndarray:
+    """Flatten one HxWx3 image into a (1, H*W*3) feature row."""
+    return images_to_feature_matrix([img], dtype=dtype)
+
 def image_array_to_rgb_list(img: np.ndarray) -> list:
     """Flatten HxWx3 into [R,G,B,...] list as in original scripts."""
-    h, w = img.shape[0:2]
-    out = []
-    for l in range(h):
-        for c in range(w):
-            r,g,b = img[l][c][:3]
-            out += [float(r), float(g), float(b)]
+    return image_array_to_features(img, dtype=np.float64)[0].tolist()
+
+def image_paths_to_feature_matrix(paths: List[str], dtype=np.float32, workers: int = 0) -> np.ndarray:
+    """Read and flatten every image into one preallocated (N, D) matrix, decoding on a thread pool."""
+    from .dataset import iter_images  # dataset imports this module
+    if not paths:
+        return np.empty((0, 0), dtype=dtype)
+    images = iter_images(paths, workers)
+    first = next(images)
+    out = np.empty((len(paths), feature_dim(first.shape)), dtype=dtype)
+    images_to_feature_matrix([first], out=out[0:1])
+    for i, img in enumerate(images, start=1):
+        images_to_feature_matrix([img], out=out[i:i+1])
     return out
 
-def image_paths_to_feature_matrix(paths: List[str]) -> list:
-    return [image_array_to_rgb_list(read_image_to_array(p)) for p in paths]
\ No newline at end of file
+def as_image_batch(imgs: Union[np.ndarray, Sequence[np.ndarray]], dtype=np.float32) -> np.ndarray:
+    """(N,H,W,3) array from a batch of images, dropping extra channels."""
+    if isinstance(imgs, np.ndarray) and imgs.ndim == 4:
+        return imgs[..., :3].astype(dtype, copy=False)
+    if len(imgs) == 0:
+        return np.empty((0, 0, 0, 3), dtype=dtype)
+    h, w = imgs[0].shape[:2]
+    return images_to_feature_matrix(imgs, dtype=dtype).reshape(len(imgs), h, w, 3)
+
+def thumbnail(imgs: np.ndarray, size: int) -> np.ndarray:
+    """Area-average (N,H,W,3) images down to (N,size,size,3)."""
+    n, h, w, c = imgs.shape
+    rows = (np.arange(size) * h) // size
+    cols = (np.arange(size) * w) // size
+    s = np.add.reduceat(np.add.reduceat(imgs, rows, axis=1), cols, axis=2)
+    counts = np.diff(np.append(rows, h))[:, None] * np.diff(np.append(cols, w))[None, :]
+    return s / counts[None, :, :, None]
+
+def rgb_to_hsv(imgs: np.ndarray) -> np.ndarray:
+    """RGB in [0,1] to HSV in [0,1], for any (..., 3) array."""
+    r, g, b = imgs[..., 0], imgs[..., 1], imgs[..., 2]
+    v = imgs.max(axis=-1)
+    delta = v - imgs.min(axis=-1)
+    s = np.divide(delta, v, out=np.zeros_like(v), where=v > 0)
+    safe = np.where(delta > 0, delta, 1)
+    h = np.where(v == r, (g - b) / safe % 6,
+        np.where(v == g, (b - r) / safe + 2, (r - g) / safe + 4)) / 6
+    h = np.where(delta > 0, h, 0)
+    return np.stack([h, s, v], axis=-1)
+
+def hsv_histograms(imgs: np.ndarray, bins: int, pixel_scale: float = 255.0) -> np.ndarray:
+    """Per-channel HSV histograms of (N,H,W,3) RGB images, each normalized to sum 1."""
+    n = imgs.shape[0]
+    hsv = rgb_to_hsv(imgs.reshape(n, -1, 3) / pixel_scale)
+    q = np.minimum((hsv * bins).astype(np.intp), bins - 1)
+    q += np.arange(3) * bins
+    q += (np.arange(n) * 3 * bins)[:, None, None]
+    counts = np.bincount(q.ravel(), minlength=n * 3 * bins).reshape(n, 3 * bins)
+    return counts / float(hsv.shape[1])
+
+class FeaturePipeline:
+    """Pluggable reduction from RGB crops to feature rows.
+
+    Stages, in order: optional thumbnail downsampling of the pixels, optional HSV
+    histograms appended to them, then an optional 'pca' or 'random' projection fitted on
+    the training images. The default pipeline reproduces the raw RGB flatten exactly.
+    Pixel values are expected in [0, pixel_scale] (BMP files and cv2 crops: 0..255).
+    """
+
+    def __init__(self, thumb: int = 0, hist_bins: int = 0, pixels: bool = True,
+                 projection: str = "", n_components: int = 32, hist_weight: float = 255.0,
+                 pixel_scale: float = 255.0, seed: int = 0):
+        if projection not in ("", "pca", "random"):
+            raise ValueError(f"Unknown projection: {projection!r}")
+        if not pixels and not hist_bins:
+            raise ValueError("Pipeline needs pixels or histograms")
+        self.thumb, self.hist_bins, self.pixels = thumb, hist_bins, pixels
+        self.projection, self.n_components = projection, n_components
+        self.hist_weight, self.pixel_scale, self.seed = hist_weight, pixel_scale, seed
+        self.mean_ = None
+        self.components_ = None
+
+    @classmethod
+    def from_spec(cls, spec: str) -> "FeaturePipeline":
+        """Parse 'raw' or comma-separated options, e.g. 'thumb=20,hist=8,pca=32' or 'nopix,hist=16'."""
+        kw = {}
+        for part in filter(None, (p.strip() for p in spec.split(","))):
+            key, _, val = part.partition("=")
+            if key == "raw":
+                continue
+            elif key == "thumb":
+                kw["thumb"] = int(val)
+            elif key == "hist":
+                kw["hist_bins"] = int(val)
+            elif key == "nopix":
+                kw["pixels"] = False
+            elif key in ("pca", "random"):
+                kw["projection"], kw["n_components"] = key, int(val)
+            else:
+                raise ValueError(f"Unknown pipeline option: {part!r}")
+        return cls(**kw)
+
+    def describe(self) -> str:
+        parts = []
+        if self.thumb and self.pixels:
+            parts.append(f"thumb={self.thumb}")
+        if not self.pixels:
+            parts.append("nopix")
+        if self.hist_bins:
+            parts.append(f"hist={self.hist_bins}")
+        if self.projection:
+            parts.append(f"{self.projection}={self.n_components}")
+        return ",".join(parts) or "raw"
+
+    @property
+    def is_raw(self) -> bool:
+        return self.pixels and not (self.thumb or self.hist_bins or self.projection)
+
+    def _base_features(self, imgs) -> np.ndarray:
+        if self.is_raw:
+            return images_to_feature_matrix(imgs)
+        batch = as_image_batch(imgs)
+        n = batch.shape[0]
+        cols = []
+        if self.pixels:
+            pix = thumbnail(batch, self.thumb) if self.thumb else batch
+            cols.append(pix.reshape(n, -1))
+        if self.hist_bins:
+            cols.append(hsv_histograms(batch, self.hist_bins, self.pixel_scale) * self.hist_weight)
+        return np.ascontiguousarray(np.concatenate(cols, axis=1), dtype=np.float32)
+
+    def fit(self, imgs) -> "FeaturePipeline":
+        if not self.projection:
+            return self
+        F = self._base_features(imgs).astype(np.float64)
+        self.mean_ = F.mean(axis=0)
+        k = min(self.n_components, F.shape[1])
+        if self.projection == "pca":
+            _, _, vt = np.linalg.svd(F - self.mean_, full_matrices=False)
+            self.components_ = vt[:k].astype(np.float32)
+        else:
+            rng = np.random.default_rng(self.seed)
+            self.components_ = (rng.standard_normal((k, F.shape[1])) / np.sqrt(k)).astype(np.float32)
+        return self
+
+    def transform(self, imgs) -> np.ndarray:
+        """(N, D) float32 features for a batch of RGB images."""
+        F = self._base_features(imgs)
+        if self.projection:
+            if self.components_ is None:
+                raise RuntimeError("Projection pipeline must be fitted before transform")
+            F = (F - self.mean_.astype(np.float32)) @ self.components_.T
+        return F
+
+    def fit_transform(self, imgs) -> np.ndarray:
+        return self.fit(imgs).transform(imgs)
+
+def crops_to_features(crops_rgb: Sequence[np.ndarray], pipeline: Optional[FeaturePipeline] = None) -> np.ndarray:
+    """float64 feature rows for RGB crops, through the model bundle's pipeline when there is one.
+
+    float64 like the matrix sklearn's kNN is fitted on: mixed float32 queries cost it ~1.5x.
+    """
+    if pipeline is None:
+        return images_to_feature_matrix(crops_rgb, dtype=np.float64)
+    return pipeline.transform(crops_rgb).astype(np.float64)
@@ -0,0 +1,154 @@
+"""Lightweight per-stage timing for the realtime and robot loops.
+
+    timer = StageTimer(log_every=5.0, trace_path="trace.jsonl")
+    with timer.stage("detect"):
+        ...
+    classify = timer.timed("classify")(classify)
+    timer.frame_done()          # closes the frame: trace row, periodic log line
+
+Each stage keeps a rolling window of its latest durations, summarized as mean/p50/p95
+in the periodic log line and in overlay_text(). The optional trace file gets one row
+per frame (.csv with the declared stages as columns, or .jsonl). A disabled StageTimer
+hands out a shared no-op context and returns functions undecorated, so leaving the
+calls in costs next to nothing.
+"""
+import csv
+import json
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from functools import wraps
+from typing import Callable, Dict, Iterable, Iterator, Sequence
+
+import numpy as np
+
+_NULL = nullcontext()
+
+class _Stage:
+    __slots__ = ("timer", "name", "t0")
+
+    def __init__(self, timer: "StageTimer", name: str):
+        self.timer, self.name = timer, name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(self.name, time.perf_counter() - self.t0)
+        return False
+
+class StageTimer:
+    def __init__(self, enabled: bool = True, window: int = 200, log_every: float = 5.0,
+                 trace_path: str = "", stages: Sequence[str] = (), log: Callable[[str], None] = print):
+        self.enabled, self.window, self.log_every, self.log = enabled, window, log_every, log
+        self.stages = list(stages)
+        self.samples: Dict[str, deque] = {}
+        self.pending: Dict[str, float] = {}
+        self.frames = 0
+        self.frame_times = deque(maxlen=window)
+        self.t_last_log = time.perf_counter()
+        self.lock = threading.Lock()
+        self.trace_path = trace_path if enabled else ""
+        self.trace_file = None
+        self.trace_writer = None
+
+    def stage(self, name: str):
+        """Context manager timing one stage (a shared no-op when disabled)."""
+        return _Stage(self, name) if self.enabled else _NULL
+
+    def timed(self, name: str) -> Callable:
+        """Decorator timing every call of a function as stage `name`."""
+        def deco(fn):
+            if not self.enabled:
+                return fn
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with _Stage(self, name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return deco
+
+    def timed_iter(self, name: str, items: Iterable) -> Iterator:
+        """Yield from `items`, timing each next() (e.g. frame capture) as stage `name`."""
+        if not self.enabled:
+            yield from items
+            return
+        it = iter(items)
+        while True:
+            t0 = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            self.record(name, time.perf_counter() - t0)
+            yield item
+
+    def record(self, name: str, seconds: float) -> None:
+        with self.lock:
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.window)
+            self.samples[name].append(seconds)
+            self.pending[name] = self.pending.get(name, 0.0) + seconds
+
+    def frame_done(self, **extra) -> None:
+        """End of one loop iteration: update FPS, write the trace row, log if it is time."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        with self.lock:
+            self.frames += 1
+            self.frame_times.append(now)
+            row, self.pending = self.pending, {}
+        if self.trace_path:
+            self._trace({"frame": self.frames, "t": round(time.time(), 4),
+                         **{f"{k}_ms": round(v * 1e3, 3) for k, v in row.items()}, **extra})
+        if self.log_every and now - self.t_last_log >= self.log_every:
+            self.t_last_log = now
+            self.log(self.log_line())
+
+    def fps(self) -> float:
+        if len(self.frame_times) < 2:
+            return 0.0
+        return (len(self.frame_times) - 1) / (self.frame_times[-1] - self.frame_times[0])
+
+    def summary(self) -> Dict[str, dict]:
+        """Per stage: count, mean/p50/p95/max over the rolling window, in ms."""
+        with self.lock:
+            snap = {k: np.array(v) * 1e3 for k, v in self.samples.items() if v}
+        return {k: {"n": len(v), "mean": float(v.mean()), "p50": float(np.percentile(v, 50)),
+                    "p95": float(np.percentile(v, 95)), "max": float(v.max())} for k, v in snap.items()}
+
+    def log_line(self) -> str:
+        parts = [f"{k} {s['mean']:.1f}/{s['p95']:.1f}ms" for k, s in self.summary().items()]
+        return f"[stats] {self.fps():.1f} fps | " + " | ".join(parts) + " (mean/p95)"
+
+    def overlay_text(self) -> str:
+        parts = [f"{k} {s['mean']:.0f}ms" for k, s in self.summary().items()]
+        return f"{self.fps():.1f} fps  " + "  ".join(parts)
+
+    def _trace(self, row: dict) -> None:
+        if self.trace_file is None:
+            self.trace_file = open(self.trace_path, "w", newline="")
+        if not self.trace_path.endswith(".csv"):
+            self.trace_file.write(json.dumps(row) + "\n")
+            return
+        if self.trace_writer is None:
+            # CSV columns are fixed by the declared stages plus the first row
+            fields = ["frame", "t"] + [f"{s}_ms" for s in self.stages]
+            fields += [k for k in row if k not in fields]
+            self.trace_writer = csv.DictWriter(self.trace_file, fields, restval="", extrasaction="ignore")
+            self.trace_writer.writeheader()
+        self.trace_writer.writerow(row)
+
+    def close(self) -> None:
+        if self.trace_file is not None:
+            self.trace_file.close()
+            self.trace_file = None
+
+def make_timer(stats_every: float, trace_path: str = "", stages: Sequence[str] = (),
+               log: Callable[[str], None] = print) -> StageTimer:
+    """Timer from the loops' --stats/--trace options; disabled when both are off."""
+    return StageTimer(enabled=bool(stats_every or trace_path), log_every=stats_every,
+                      trace_path=trace_path, stages=stages, log=log)
@@ -2,16 +2,35 @@
 
 Usage:
     python -m tsr.knn_baseline --data data/train --k 5 --save models/knn.joblib
+    python -m tsr.knn_baseline --pipeline raw --pipeline thumb=20 --pipeline thumb=10,hist=8,pca=32
+    python -m tsr.knn_baseline --index ivf --nlist 16 --nprobe 4 --save models/knn.joblib
+    python -m tsr.knn_baseline --index uint8 --metric ssd --save models/knn.joblib
+    python -m tsr.knn_baseline --extra models/aug_features.npz    # add scripts/augment_dataset.py --features output
+    python -m tsr.knn_baseline --save models/knn.joblib --export models/knn.npz   # NumPy-only copy for the robot
+    python -m tsr.knn_baseline --sweep-k 1,3,5,7,9 --folds 5 --jobs 4
+    python -m tsr.knn_baseline --cascade 0.99 --save models/knn.joblib   # thumbnail first stage, calibrated to 99%
+    python -m tsr.knn_baseline --store models/features --index chunked --memory-mb 256   # larger than RAM
+    python -m tsr.knn_baseline --extra models/aug_features.npz --condense enn+cnn --save models/knn.joblib
+    python -m tsr.knn_baseline --extra models/aug_features.npz --condense enn+kmeans --condense-loss 0.05
 """
 import argparse
+import os
+import time
 import numpy as np
 from sklearn.neighbors import KNeighborsClassifier, NearestNeighbors
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import train_test_split, StratifiedKFold
 from sklearn.metrics import confusion_matrix
 import joblib
 
 from .dataset import list_image_paths
-from .features import image_paths_to_feature_matrix
+from .feature_store import load_features
+from .features import read_image_to_array, FeaturePipeline
+from .ann import IVFKNNClassifier
+from .cascade import CascadeClassifier
+from .condense import DEFAULT_LOSS, fit_condensed, parse_methods
+from .knn_ooc import ChunkedKNNClassifier
+from .knn_quant import QuantizedKNNClassifier
+from .npz_model import export_npz
 
 def exactitude(cm: np.ndarray) -> float:
     return np.trace(cm) / cm.sum() if cm.sum() else 0.0
@@ -20,37 +39,314 @@ def precision_per_class(cm: np.ndarray) -> list:
     denom = cm.sum(axis=0)
     return [ (cm[i,i] / denom[i]) if denom[i] else None for i in range(cm.shape[0]) ]
 
+def sklearn_rows(clf, F: np.ndarray) -> np.ndarray:
+    """F as float64 for sklearn's brute kNN, which predicts ~20x slower on float32 rows of raw-pixel width."""
+    return np.asarray(F, dtype=np.float64) if isinstance(getattr(clf, "full", clf), KNeighborsClassifier) else F
+
+def db_bytes(clf, F: np.ndarray) -> int:
+    """Bytes of the reference matrix the fitted engine holds (sklearn keeps its own copy in _fit_X)."""
+    inner = getattr(clf, "full", clf)
+    return getattr(inner, "X_", getattr(inner, "_fit_X", F)).nbytes
+
+def make_classifier(args):
+    """Brute-force sklearn kNN, or the IVF / uint8 engines behind the same fit/predict interface."""
+    if args.index == "ivf":
+        clf = IVFKNNClassifier(n_neighbors=args.k, nlist=args.nlist, nprobe=args.nprobe)
+    elif args.index == "uint8":
+        clf = QuantizedKNNClassifier(n_neighbors=args.k, metric=args.metric)
+    elif args.index == "chunked":
+        clf = ChunkedKNNClassifier(n_neighbors=args.k, memory_mb=args.memory_mb)
+    else:
+        clf = KNeighborsClassifier(n_neighbors=args.k)
+    if getattr(args, "cascade", 0):
+        return CascadeClassifier(clf, thumb=args.cascade_thumb, first=args.cascade_first)
+    return clf
+
+def fit_cascade(clf: CascadeClassifier, F: np.ndarray, y: np.ndarray, target: float, calib_size: float = 0.25) -> None:
+    """Calibrate the threshold on rows held out from the centroids, then fit both stages on every row."""
+    F_fit, F_cal, y_fit, y_cal = train_test_split(F, y, test_size=calib_size, random_state=0, stratify=y)
+    clf.fit_first(F_fit, y_fit).calibrate(F_cal, y_cal, target)
+    clf.fit(sklearn_rows(clf, F), y)
+
+def cascade_report(clf: CascadeClassifier, F_test: np.ndarray, y_test: np.ndarray) -> dict:
+    """Share of test queries the first stage answers, accuracy per stage, and the full kNN's latency alone."""
+    _, score = clf.first_stage(F_test)
+    short = score >= clf.threshold
+    y_pred = clf.predict(F_test)
+    t0 = time.perf_counter()
+    clf.full.predict(F_test)
+    full_s = time.perf_counter() - t0
+    acc = lambda m: float(np.mean(y_pred[m] == y_test[m])) if m.any() else float("nan")
+    return {"threshold": clf.threshold, "short": float(short.mean()) if len(short) else 0.0,
+            "acc_short": acc(short), "acc_full": acc(~short),
+            "full_ms_per_query": 1e3 * full_s / max(len(y_test), 1)}
+
+def condense_model(args, F: np.ndarray, y: np.ndarray, n_real: int, sources: np.ndarray):
+    """tsr.condense.fit_condensed driven by the --condense options; the first n_real rows are the dataset's own."""
+    with_k = lambda k: lambda n: make_classifier(argparse.Namespace(**{**vars(args), "k": min(k, n)}))
+    make_full = with_k(args.k)
+    F = sklearn_rows(make_full(1), F)  # once, not per trial fit
+    clf, info = fit_condensed(F, y, parse_methods(args.condense), make_full, with_k(args.condense_k),
+                              args.condense_size, args.condense_loss, args.condense_edit_k, np.arange(n_real), sources)
+    info["db_bytes"] = db_bytes(clf, F)
+    return clf, info
+
+def timed_predict(clf, F_test, y_test, n_classes: int):
+    """(confusion matrix, ms per query) of one batched predict, after a one-row warm-up call."""
+    clf.predict(F_test[:1])
+    t0 = time.perf_counter()
+    y_pred = clf.predict(F_test)
+    elapsed = time.perf_counter() - t0
+    return confusion_matrix(y_test, y_pred, labels=list(range(n_classes))), 1e3 * elapsed / max(len(y_test), 1)
+
+def evaluate(pipeline: FeaturePipeline, clf, imgs_train, y_train, imgs_test, y_test, n_classes: int,
+             cascade_target: float = 0.99, condense=None) -> dict:
+    """Fit pipeline + kNN on the train split; measure accuracy, per-query latency and memory."""
+    F_train = pipeline.fit_transform(imgs_train)
+    if isinstance(clf, CascadeClassifier):
+        clf.image_shape = imgs_train.shape[1:] if pipeline.is_raw else None  # thumbnails of raw pixel rows
+        fit_cascade(clf, F_train, y_train, cascade_target)
+    else:
+        clf.fit(sklearn_rows(clf, F_train), y_train)
+
+    F_test = sklearn_rows(clf, pipeline.transform(imgs_test))
+    cm, ms = timed_predict(clf, F_test, y_test, n_classes)
+    res = {"pipeline": pipeline, "model": clf, "cm": cm, "accuracy": exactitude(cm), "ms_per_query": ms,
+           "dim": F_train.shape[1], "db_bytes": db_bytes(clf, F_train)}
+    if isinstance(clf, CascadeClassifier):
+        res["cascade"] = cascade_report(clf, F_test, np.asarray(y_test))
+    if condense is not None:  # the condensed kNN replaces the full one; the full one's figures are kept
+        clf, info = condense(F_train, y_train)
+        cm, ms = timed_predict(clf, F_test, y_test, n_classes)
+        info.update(accuracy_before=res["accuracy"], ms_before=res["ms_per_query"], db_bytes_before=res["db_bytes"])
+        res.update(model=clf, cm=cm, accuracy=exactitude(cm), ms_per_query=ms, db_bytes=info["db_bytes"], condensed=info)
+    return res
+
+def evaluate_chunked(clf: ChunkedKNNClassifier, X, y: np.ndarray, n_classes: int) -> dict:
+    """Raw-pixel evaluation that never copies X: the train split is indexed, the test split streamed.
+
+    Same split as evaluate(); the confusion matrix is accumulated one query batch at a time.
+    """
+    train, test = train_test_split(np.arange(len(y)), random_state=0, test_size=0.25)
+    clf.fit(X, y, rows=train)
+    test = np.sort(test)  # sequential reads
+    qb, _ = clf.sizes(len(test), int(np.prod(X.shape[1:])))
+    cm = np.zeros((n_classes, n_classes), dtype=np.int64)
+    elapsed = 0.0
+    for s in range(0, len(test), qb):
+        rows = test[s:s + qb]
+        Q = X[rows]
+        t0 = time.perf_counter()
+        y_pred = clf.predict(Q)
+        elapsed += time.perf_counter() - t0
+        cm += confusion_matrix(y[rows], y_pred, labels=list(range(n_classes)))
+    return {"pipeline": FeaturePipeline(), "model": clf, "cm": cm, "accuracy": exactitude(cm),
+            "ms_per_query": 1e3 * elapsed / max(len(test), 1),
+            "dim": int(np.prod(X.shape[1:])), "db_bytes": len(train) * X[:1].nbytes}
+
+def votes_for_all_k(nb: np.ndarray, n_classes: int) -> np.ndarray:
+    """(n_queries, k_max, n_classes) votes of the first 1..k_max neighbours (nb: neighbour classes, closest first).
+
+    Cell [:, k - 1] holds the votes a k-NN would count, so one neighbour search at k_max
+    serves every smaller k. Class -1 (padding from the IVF index) casts no vote.
+    """
+    onehot = (nb[:, :, None] == np.arange(n_classes)).astype(np.int32)
+    return np.cumsum(onehot, axis=1, out=onehot)
+
+def sweep_fold(pipeline: FeaturePipeline, clf, imgs_train, y_train, imgs_test, y_test, ks, n_classes: int) -> dict:
+    """Confusion matrix and timing of every k on one fold, from a single search at max(ks)."""
+    clf.n_neighbors = max(ks)
+    clf.fit(sklearn_rows(clf, pipeline.fit_transform(imgs_train)), y_train)
+    t0 = time.perf_counter()
+    _, idx = clf.kneighbors(sklearn_rows(clf, pipeline.transform(imgs_test)), max(ks))
+    t_search = time.perf_counter() - t0
+    nb = np.where(idx >= 0, np.asarray(y_train)[idx], -1)
+    cum = votes_for_all_k(nb, n_classes)
+    out = {}
+    for k in ks:
+        t0 = time.perf_counter()
+        y_pred = cum[:, k - 1].argmax(axis=1)  # ties go to the smallest class, as in sklearn
+        t_vote = time.perf_counter() - t0
+        out[k] = {"cm": confusion_matrix(y_test, y_pred, labels=list(range(n_classes))),
+                  "seconds": t_search + t_vote}
+    return out
+
+def sweep_k(args, pipeline_spec: str, imgs, y, keys, extra, ks, n_classes: int) -> None:
+    """K-fold cross-validation of every k in `ks`, folds in parallel; prints one row per k."""
+    folds = list(StratifiedKFold(n_splits=args.folds, shuffle=True, random_state=0).split(imgs, y))
+    fold_extra = [without_sources(extra, keys[test]) for _, test in folds]
+    per_fold = joblib.Parallel(n_jobs=args.jobs)(
+        joblib.delayed(sweep_fold)(FeaturePipeline.from_spec(pipeline_spec), make_classifier(args),
+                                   np.concatenate([imgs[train], imgs_extra]), np.concatenate([y[train], y_extra]),
+                                   imgs[test], y[test], ks, n_classes)
+        for (train, test), (imgs_extra, y_extra, _) in zip(folds, fold_extra))
+
+    print(f"{args.folds}-fold sweep, pipeline {pipeline_spec}, index {args.index}")
+    print(f"{'k':>4}{'accuracy':>10}{'std':>8}{'ms/query':>10}  precision per class")
+    for k in ks:
+        accs = [exactitude(f[k]["cm"]) for f in per_fold]
+        cm = sum(f[k]["cm"] for f in per_fold)
+        ms = 1e3 * sum(f[k]["seconds"] for f in per_fold) / len(y)
+        prec = " ".join("  -  " if p is None else f"{p:.3f}" for p in precision_per_class(cm))
+        print(f"{k:>4}{np.mean(accs):>10.3f}{np.std(accs):>8.3f}{ms:>10.3f}  {prec}")
+
+def dataset_keys(paths, root: str) -> np.ndarray:
+    """Image paths relative to the dataset root, as in the feature store index and augmentation `sources`."""
+    return np.array([os.path.relpath(p, root) for p in paths])
+
+def load_extra(paths, classes, h: int, w: int, dtype):
+    """Stack augmented (X, labels, sources) .npz files as images, class indices and source image keys."""
+    imgs, y, sources = [np.empty((0, h, w, 3), dtype)], [np.empty(0, int)], [np.empty(0, str)]
+    for path in paths:
+        z = np.load(path)
+        unknown = set(z["labels"].tolist()) - set(classes)
+        if unknown:
+            raise SystemExit(f"{path} has labels not in the dataset: {sorted(unknown)}")
+        if "sources" not in z.files:
+            raise SystemExit(f"{path} does not record the source image of each sample, so augmentations of "
+                             "test images cannot be left out; regenerate it with scripts/augment_dataset.py --features")
+        imgs.append(z["X"].astype(dtype).reshape(-1, h, w, 3))
+        y.append(np.array([classes.index(lbl) for lbl in z["labels"].tolist()], dtype=int))
+        sources.append(z["sources"])
+        print(f"Loaded {len(z['X'])} augmented samples from {path}")
+    return np.concatenate(imgs), np.concatenate(y), np.concatenate(sources)
+
+def without_sources(extra, held_out: np.ndarray):
+    """(images, class indices, sources) of the augmented samples whose source image is not held out."""
+    imgs, y, sources = extra
+    keep = ~np.isin(sources, held_out)
+    return imgs[keep], y[keep], sources[keep]
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--data", default="data/train", help="dataset root with class subfolders")
     ap.add_argument("--k", type=int, default=5, help="k for kNN")
     ap.add_argument("--save", default="", help="optional path to save fitted model (joblib)")
+    ap.add_argument("--store", default="", help="optional feature store directory (built/updated incrementally)")
+    ap.add_argument("--pipeline", action="append", default=[],
+                    help="feature pipeline spec, e.g. raw, thumb=20, hist=8, pca=32 (repeat to compare; first one is saved)")
+    ap.add_argument("--index", default="brute", choices=["brute", "ivf", "uint8", "chunked"],
+                    help="exact sklearn kNN, approximate IVF index, exact kNN on a uint8 database, "
+                         "or exact kNN streaming the database in blocks (tsr.knn_ooc)")
+    ap.add_argument("--memory-mb", type=float, default=256.0, help="working-set budget of --index chunked")
+    ap.add_argument("--nlist", type=int, default=0, help="IVF cells (0: sqrt of the training size)")
+    ap.add_argument("--nprobe", type=int, default=4, help="IVF cells scanned per query (recall/speed knob)")
+    ap.add_argument("--metric", default="ssd", choices=["ssd", "sad"], help="uint8 index distance")
+    ap.add_argument("--extra", action="append", default=[],
+                    help="augmented feature matrix (.npz with X, labels) appended to the training split")
+    ap.add_argument("--export", default="", help="also write the fitted model as a plain .npz (tsr.npz_model)")
+    ap.add_argument("--sweep-k", default="", help="comma-separated k values to cross-validate instead of one fit")
+    ap.add_argument("--folds", type=int, default=5, help="cross-validation folds for --sweep-k")
+    ap.add_argument("--jobs", type=int, default=-1, help="folds evaluated in parallel (-1: all cores)")
+    ap.add_argument("--cascade", type=float, default=0.0,
+                    help="put a cheap first stage in front of the kNN, calibrated to this accuracy (e.g. 0.99)")
+    ap.add_argument("--cascade-first", default="knn", choices=["knn", "centroid"],
+                    help="first stage: kNN vote agreement or nearest-centroid margin, on thumbnails")
+    ap.add_argument("--cascade-thumb", type=int, default=8, help="thumbnail size of the first stage (raw pixels)")
+    ap.add_argument("--condense", default="",
+                    help="shrink the training rows after fitting: enn, cnn, kmeans or a chain like enn+cnn (tsr.condense)")
+    ap.add_argument("--condense-size", type=int, default=0, help="k-means prototypes in total (0: a tenth of the rows)")
+    ap.add_argument("--condense-loss", type=float, default=DEFAULT_LOSS,
+                    help="accuracy the condensed set may lose in cross-validation before the full set is kept; "
+                         "also sizes a kmeans step (inf: no check)")
+    ap.add_argument("--condense-k", type=int, default=1, help="neighbours of the kNN over the condensed rows")
+    ap.add_argument("--condense-edit-k", type=int, default=3, help="neighbours voting in the enn step")
     args = ap.parse_args()
+    if args.cascade and args.sweep_k:
+        ap.error("--cascade and --sweep-k cannot be combined")
+    if args.export and args.index == "uint8" and args.metric == "sad":
+        ap.error("--export writes euclidean models only (tsr.npz_model); drop --metric sad or --export")
+    if args.condense:
+        if args.cascade or args.sweep_k or args.index == "chunked":
+            ap.error("--condense cannot be combined with --cascade, --sweep-k or --index chunked")
+        try:
+            methods = parse_methods(args.condense)
+        except ValueError as e:
+            ap.error(str(e))
+        if args.condense_size and "kmeans" not in methods:
+            ap.error("--condense-size sets the prototype count of a kmeans step")
 
-    paths, labels = list_image_paths(args.data)
+    paths, _ = list_image_paths(args.data)
     if not paths:
         raise SystemExit(f"No images found in {args.data}. Expected structure: data/train/<class>/*.png")
 
     # Build features as in original code: raw RGB flatten
-    X = np.array(image_paths_to_feature_matrix(paths), dtype=float)
+    X, labels = load_features(args.data, args.store)
     classes = sorted(sorted(set(labels)))
     y = np.array([classes.index(lbl) for lbl in labels], dtype=int)
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, random_state=0, test_size=0.25)
+    out_of_core = args.index == "chunked" and not (args.extra or args.cascade or args.sweep_k) \
+        and all(FeaturePipeline.from_spec(spec).is_raw for spec in args.pipeline)
+    h, w = read_image_to_array(paths[0]).shape[:2]
+    if out_of_core:  # with --store, X is a memmap: nothing below reads it whole
+        results = [evaluate_chunked(make_classifier(args), X, y, len(classes))]
+    imgs = X.reshape(len(X), h, w, 3)
+    keys = dataset_keys(paths, args.data)
+    extra = load_extra(args.extra, classes, h, w, imgs.dtype)
+    if args.sweep_k:
+        ks = sorted({int(k) for k in args.sweep_k.split(",")})
+        sweep_k(args, (args.pipeline or ["raw"])[0], imgs, y, keys, extra, ks, len(classes))
+        return
 
-    clf = KNeighborsClassifier(n_neighbors=args.k)
-    clf.fit(X_train, y_train)
+    if not out_of_core:
+        train, test = train_test_split(np.arange(len(y)), random_state=0, test_size=0.25)
+        imgs_train, imgs_test, y_train, y_test = imgs[train], imgs[test], y[train], y[test]
+        n_real = len(imgs_train)
+        imgs_extra, y_extra, src_extra = without_sources(extra, keys[test])  # augmentations of test images would leak
+        if args.extra:
+            print(f"Added {len(y_extra)} augmented training samples ({len(extra[1]) - len(y_extra)} of test images left out)")
+        imgs_train, y_train = np.concatenate([imgs_train, imgs_extra]), np.concatenate([y_train, y_extra])
 
-    y_pred = clf.predict(X_test)
-    cm = confusion_matrix(y_test, y_pred, labels=list(range(len(classes))))
+        sources = np.concatenate([keys[train], src_extra])
+        condense = (lambda F, y_fit: condense_model(args, F, y_fit, n_real, sources)) if args.condense else None
+        results = [evaluate(FeaturePipeline.from_spec(spec), make_classifier(args), imgs_train, y_train, imgs_test, y_test,
+                            len(classes), args.cascade, condense)
+                   for spec in (args.pipeline or ["raw"])]
+
+    best = results[0]
     print("Classes:", classes)
-    print("Confusion matrix:\n", cm)
-    print("Accuracy (Exactitude):", exactitude(cm))
-    print("Precision per class:", precision_per_class(cm))
+    print("Confusion matrix:\n", best["cm"])
+    print("Accuracy (Exactitude):", best["accuracy"])
+    print("Precision per class:", precision_per_class(best["cm"]))
+    if "cascade" in best:
+        c = best["cascade"]
+        print(f"Cascade: threshold {c['threshold']:.3f} ({args.cascade_first} score), {c['short']:.0%} of queries short-circuited; "
+              f"accuracy {c['acc_short']:.3f} on those, {c['acc_full']:.3f} on the rest; "
+              f"{best['ms_per_query']:.3f} ms/query vs {c['full_ms_per_query']:.3f} for the kNN alone")
+    if "condensed" in best:
+        c = best["condensed"]
+        print(f"Condensed ({c['method']}, k={c['k']}): {c['rows_before']} -> {c['rows_after']} rows "
+              f"({c['rows_before'] / max(c['rows_after'], 1):.1f}x smaller, db {c['db_bytes_before'] / 1024:.0f} -> "
+              f"{c['db_bytes'] / 1024:.0f} KB); accuracy {c['accuracy_before']:.3f} -> {best['accuracy']:.3f}; "
+              f"{c['ms_before']:.3f} -> {best['ms_per_query']:.3f} ms/query")
+        if "cv_accuracy" in c:
+            print(f"Cross-validated on the training crops: full {c['cv_accuracy_full']:.3f}, condensed {c['cv_accuracy']:.3f} "
+                  f"(budget {c['max_loss']})")
+        if best["accuracy"] < c["accuracy_before"] - min(c["max_loss"], DEFAULT_LOSS):
+            print(f"Warning: condensing costs {c['accuracy_before'] - best['accuracy']:.3f} test accuracy")
+
+    if len(results) > 1:
+        print(f"\n{'pipeline':<28}{'dim':>7}{'accuracy':>10}{'ms/query':>10}{'db KB':>10}")
+        for r in results:
+            print(f"{r['pipeline'].describe():<28}{r['dim']:>7}{r['accuracy']:>10.3f}"
+                  f"{r['ms_per_query']:>10.3f}{r['db_bytes'] / 1024:>10.0f}")
 
     if args.save:
-        joblib.dump({"model": clf, "classes": classes}, args.save)
+        bundle = {"model": best["model"], "classes": classes}
+        if not best["pipeline"].is_raw:
+            bundle["pipeline"] = best["pipeline"]
+        if "condensed" in best:
+            bundle["condensed"] = best["condensed"]
+        joblib.dump(bundle, args.save)
         print("Saved model to", args.save)
+    if args.export:
+        bundle = {"model": best["model"], "classes": classes}
+        if not best["pipeline"].is_raw:
+            bundle["pipeline"] = best["pipeline"]
+        if "condensed" in best:
+            bundle["condensed"] = best["condensed"]
+        export_npz(bundle, args.export)
+        print("Exported model to", args.export)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
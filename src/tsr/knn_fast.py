@@ -1,30 +1,17 @@
 """
 Fast, pure-numpy kNN using flattened RGB lists (keeps your original approach).
-Exposes a simple classify(image_path, db_root, k) function.
+Exposes a simple classify(image_path, db_root, k) function backed by a cached KNNIndex.
 """
 import numpy as np
-import matplotlib.pyplot as plt
 from pathlib import Path
 
 def read_img(path: str) -> np.ndarray:
+    import matplotlib.pyplot as plt
     return plt.imread(path)
 
 def to_rgb_list(img: np.ndarray) -> np.ndarray:
     return img.reshape(-1, 3).astype(float)
 
-def euclid(u: np.ndarray, v: np.ndarray) -> float:
-    return np.sqrt(np.sum((u - v) ** 2))
-
-def distances(u: np.ndarray, list_v: list) -> np.ndarray:
-    arr = np.zeros((len(list_v), 2))
-    for i, v in enumerate(list_v):
-        arr[i] = [euclid(u, v), i]
-    return arr
-
-def k_nearest(u: np.ndarray, list_v: list, k: int) -> np.ndarray:
-    d = distances(u, list_v)
-    return d[np.argsort(d[:,0])][:k]
-
 def load_db(db_root: str, folders=(0,1,2), per_folder=40):
     paths, labels = [], []
     db_root = Path(db_root)
@@ -41,8 +28,110 @@ def majority(arr) -> int:
     return int(uniq[np.argmax(counts)])
 
 def classify(image_path: str, db_root="/home/pi/TIPE/BDD", k=9, folders=(0,1,2), per_folder=40):
-    u = to_rgb_list(read_img(image_path))
-    imgs, labels, _ = load_db(db_root, folders, per_folder)
-    idx = k_nearest(u, imgs, k)[:,1].astype(int)
-    voted = majority(labels[idx])
-    return voted
\ No newline at end of file
+    u = to_rgb_list(read_img(image_path)).reshape(1, -1)
+    index = get_index(db_root, folders, per_folder)
+    return int(index.predict(u, k)[0])
+
+def vote_counts(nb: np.ndarray, n_classes: int) -> np.ndarray:
+    """(n_queries, n_classes) neighbour counts from a matrix of neighbour class indices."""
+    votes = np.zeros((nb.shape[0], n_classes), dtype=int)
+    np.add.at(votes, (np.arange(nb.shape[0])[:, None], nb), 1)
+    return votes
+
+class KNNIndex:
+    """Reference database loaded once, queried in batches.
+
+    Distances use ||q||^2 + ||x||^2 - 2 q.x with the database norms precomputed, so a
+    batch of queries costs one matrix product per block of database rows; the k nearest
+    come from argpartition. With dtype=None the database is kept as given (a memmapped
+    feature store stays on disk, in its own dtype): float rows are used in place, integer
+    rows are widened to float64 one block at a time.
+    """
+
+    def __init__(self, X: np.ndarray, labels, k: int = 9, dtype=np.float64, block_bytes: int = 1 << 26):
+        if dtype is None:
+            self.X = X if isinstance(X, np.ndarray) else np.asarray(X)
+        else:
+            self.X = np.ascontiguousarray(X, dtype=dtype)
+        self.dtype = self.X.dtype if np.issubdtype(self.X.dtype, np.floating) else np.dtype(np.float64)
+        self.block_rows = max(64, block_bytes // (self.dtype.itemsize * max(self.X.shape[1], 1)))
+        self.labels = np.asarray(labels)
+        self.classes, self.label_idx = np.unique(self.labels, return_inverse=True)
+        self.sq_norms = np.concatenate([np.einsum("ij,ij->i", B, B) for _, B in self._blocks()] or
+                                       [np.zeros(0, self.dtype)])
+        self.k = k
+
+    @classmethod
+    def from_db(cls, db_root: str, folders=(0,1,2), per_folder=40, k: int = 9) -> "KNNIndex":
+        imgs, labels, _ = load_db(db_root, folders, per_folder)
+        return cls(np.stack([im.reshape(-1) for im in imgs]), labels, k=k)
+
+    @classmethod
+    def from_store(cls, store: str, dataset_dir: str = "", k: int = 9) -> "KNNIndex":
+        """Build from a tsr.feature_store directory, syncing it first when dataset_dir is given.
+
+        The memmapped store is queried in place, not copied into memory.
+        """
+        from .feature_store import FeatureStore
+        fs = FeatureStore(store)
+        if dataset_dir:
+            fs.sync(dataset_dir)
+        X, labels = fs.open()
+        return cls(X, labels, k=k, dtype=None)
+
+    def __len__(self) -> int:
+        return self.X.shape[0]
+
+    def _blocks(self):
+        """(start, rows) blocks of the database in the compute dtype."""
+        for s in range(0, len(self), self.block_rows):
+            yield s, np.asarray(self.X[s:s + self.block_rows], dtype=self.dtype)
+
+    def _as_queries(self, Q: np.ndarray) -> np.ndarray:
+        Q = np.asarray(Q, dtype=self.dtype)
+        return Q.reshape(1, -1) if Q.ndim == 1 else Q.reshape(Q.shape[0], -1)
+
+    def sq_distances(self, Q: np.ndarray) -> np.ndarray:
+        """(n_queries, n_db) squared euclidean distances."""
+        Q = self._as_queries(Q)
+        d2 = np.empty((len(Q), len(self)), dtype=self.dtype)
+        for s, B in self._blocks():
+            np.matmul(Q, B.T, out=d2[:, s:s + len(B)])
+        d2 *= -2
+        d2 += np.einsum("ij,ij->i", Q, Q)[:, None]
+        d2 += self.sq_norms[None, :]
+        return np.maximum(d2, 0, out=d2)
+
+    def kneighbors(self, Q: np.ndarray, k: int = None):
+        """Return (distances, indices) of the k nearest samples, closest first."""
+        k = min(k or self.k, len(self))
+        d2 = self.sq_distances(Q)
+        if k < d2.shape[1]:
+            idx = np.argpartition(d2, k - 1, axis=1)[:, :k]
+        else:
+            idx = np.broadcast_to(np.arange(d2.shape[1]), d2.shape).copy()
+        part = np.take_along_axis(d2, idx, axis=1)
+        order = np.argsort(part, axis=1, kind="stable")
+        return np.sqrt(np.take_along_axis(part, order, axis=1)), np.take_along_axis(idx, order, axis=1)
+
+    def query(self, Q: np.ndarray, k: int = None):
+        """Return (labels, votes, distances) for a batch of queries.
+
+        votes[i, c] counts the neighbours of query i in class self.classes[c]; ties go to
+        the smallest label, as majority() does.
+        """
+        dist, idx = self.kneighbors(Q, k)
+        votes = vote_counts(self.label_idx[idx], len(self.classes))
+        return self.classes[votes.argmax(axis=1)], votes, dist
+
+    def predict(self, Q: np.ndarray, k: int = None) -> np.ndarray:
+        return self.query(Q, k)[0]
+
+_INDEX_CACHE = {}
+
+def get_index(db_root: str, folders=(0,1,2), per_folder=40) -> KNNIndex:
+    """KNNIndex for a database, loaded on first use and reused afterwards."""
+    key = (str(db_root), tuple(folders), per_folder)
+    if key not in _INDEX_CACHE:
+        _INDEX_CACHE[key] = KNNIndex.from_db(db_root, folders, per_folder)
+    return _INDEX_CACHE[key]
@@ -0,0 +1,157 @@
+"""Out-of-core exact kNN: the reference matrix is streamed in blocks, never loaded whole.
+
+The reference rows stay where they are (a feature store's features.npy opened as a
+memmap, or any array) and are read one block of rows at a time. Each block is widened to
+float64, its distances to a batch of queries come from one GEMM
+(||q||^2 + ||x||^2 - 2 q.x), and every query keeps a running top-k: the k best so far
+are merged with the block's candidates by argpartition, the vectorized form of a
+bounded heap. Query batch and block sizes are derived from `memory_mb`, so the working
+set stays under that budget whatever the database size; only the per-row squared norms
+(8 bytes per row) and labels are held in memory.
+
+fit(X, y, rows=...) can index a subset of X's rows (a train split) without copying it,
+which is how tsr.knn_baseline --index chunked evaluates datasets larger than RAM: the
+test split is streamed in query batches and the confusion matrix accumulated as it goes.
+A saved model stores a memmapped database as its file name, size and mtime, not its rows,
+and refuses to load once the file has been rewritten (a later feature store sync).
+partial_fit() appends rows (tsr.online): the database is copied once into growable
+in-memory buffers, after which each append costs only its own rows.
+
+Usage:
+    python -m tsr.feature_store --data data/big --store models/big_features
+    python -m tsr.knn_baseline --data data/big --store models/big_features --index chunked --memory-mb 256
+"""
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .knn_fast import vote_counts
+
+def merge_topk(best_d: np.ndarray, best_i: np.ndarray, d: np.ndarray, idx: np.ndarray, k: int):
+    """Keep the k smallest of the running (best_d, best_i) and a block's (d, idx), per row (unordered)."""
+    cand_d = np.concatenate([best_d, d], axis=1)
+    cand_i = np.concatenate([best_i, np.broadcast_to(idx, d.shape)], axis=1)
+    if cand_d.shape[1] <= k:
+        return cand_d, cand_i
+    sel = np.argpartition(cand_d, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(cand_d, sel, axis=1), np.take_along_axis(cand_i, sel, axis=1)
+
+class ChunkedKNNClassifier:
+    """Exact euclidean kNN over a reference matrix read block by block, with the fit/predict interface."""
+
+    def __init__(self, n_neighbors: int = 5, memory_mb: float = 256.0):
+        self.n_neighbors, self.memory_mb = n_neighbors, memory_mb
+
+    def fit(self, X, y: np.ndarray, rows: Optional[np.ndarray] = None) -> "ChunkedKNNClassifier":
+        """Keep a reference to X (no copy); `rows` restricts the database to those row indices."""
+        self.X_, self.bufs_ = X, None
+        self.rows_ = None if rows is None else np.sort(np.asarray(rows))
+        y = np.asarray(y) if self.rows_ is None else np.asarray(y)[self.rows_]
+        self.classes_, self.y_idx_ = np.unique(y, return_inverse=True)
+        n, d = len(self), int(np.prod(X.shape[1:]))
+        self.sq_norms_ = np.empty(n)
+        for s, e in self._blocks(1, d):
+            B = (self.X_[s:e] if self.rows_ is None else self.X_[self.rows_[s:e]]).reshape(e - s, -1)
+            self.sq_norms_[s:e] = np.einsum("ij,ij->i", B, B, dtype=np.float64)  # widened in einsum's small buffers
+        return self
+
+    def partial_fit(self, X: np.ndarray, y: np.ndarray) -> "ChunkedKNNClassifier":
+        """Append rows at a cost proportional to them (amortized).
+
+        The first call copies the database into in-memory buffers with spare capacity
+        (doubled whenever full), so later calls only write the new rows.
+        """
+        X = np.asarray(X).reshape(len(X), -1)
+        n, m = len(self), len(X)
+        if getattr(self, "bufs_", None) is None or n + m > len(self.bufs_[0]):
+            old = self.bufs_ or ((self.X_ if self.rows_ is None else self.X_[self.rows_]), self.sq_norms_, self.y_idx_)
+            cap = 2 * (n + m)
+            self.bufs_ = (np.empty((cap, X.shape[1]), dtype=old[0].dtype), np.empty(cap), np.empty(cap, np.int64))
+            for buf, a in zip(self.bufs_, old):
+                buf[:n] = np.asarray(a[:n]).reshape(n, *buf.shape[1:])
+            self.rows_ = None
+        Xb, nb, yb = self.bufs_
+        Xb[n:n + m] = X
+        nb[n:n + m] = np.einsum("ij,ij->i", Xb[n:n + m], Xb[n:n + m], dtype=np.float64)
+        classes = np.union1d(self.classes_, np.asarray(y))
+        if len(classes) > len(self.classes_):  # a new class shifts the indices of the old rows
+            yb[:n] = np.searchsorted(classes, self.classes_)[yb[:n]]
+        yb[n:n + m] = np.searchsorted(classes, y)
+        self.classes_, self.X_, self.sq_norms_, self.y_idx_ = classes, Xb[:n + m], nb[:n + m], yb[:n + m]
+        return self
+
+    def __len__(self) -> int:
+        return len(self.rows_) if self.rows_ is not None else self.X_.shape[0]
+
+    def _read(self, s: int, e: int) -> np.ndarray:
+        """Database rows s:e (of the subset), as a float64 block."""
+        B = self.X_[s:e] if self.rows_ is None else self.X_[self.rows_[s:e]]
+        return np.asarray(B, dtype=np.float64).reshape(e - s, -1)
+
+    def sizes(self, n_queries: int, d: int) -> Tuple[int, int]:
+        """(query batch, block rows) that fit the memory budget."""
+        budget = self.memory_mb * 2 ** 20
+        itemsize = np.dtype(getattr(self.X_, "dtype", np.float64)).itemsize
+        qb = int(max(1, min(n_queries, budget // 4 // (8 * d))))
+        k = self.n_neighbors
+        # per database row: native read + float64 copy, then qb distances + qb (k + rows) candidates
+        per_row = d * (itemsize + 8) + qb * 8 * 3
+        rows = int(max(k, (budget - qb * 8 * d - qb * k * 16) // per_row))
+        return qb, rows
+
+    def _blocks(self, n_queries: int, d: int):
+        _, rows = self.sizes(n_queries, d)
+        n = len(self)
+        return ((s, min(s + rows, n)) for s in range(0, n, rows))
+
+    def kneighbors(self, Q: np.ndarray, k: int = None):
+        """Return (distances, indices into the database) of the k nearest samples, closest first."""
+        k = min(k or self.n_neighbors, len(self))
+        Q = np.asarray(Q).reshape(len(Q), -1)
+        qb, _ = self.sizes(len(Q), Q.shape[1])
+        dist, ind = np.empty((len(Q), k)), np.empty((len(Q), k), dtype=np.int64)
+        for qs in range(0, len(Q), qb):
+            q = np.asarray(Q[qs:qs + qb], dtype=np.float64)
+            q_sq = np.einsum("ij,ij->i", q, q)
+            best_d = np.full((len(q), 0), np.inf)
+            best_i = np.empty((len(q), 0), dtype=np.int64)
+            for s, e in self._blocks(len(q), q.shape[1]):
+                d2 = q @ self._read(s, e).T
+                d2 *= -2
+                d2 += q_sq[:, None]
+                d2 += self.sq_norms_[None, s:e]
+                best_d, best_i = merge_topk(best_d, best_i, np.maximum(d2, 0, out=d2), np.arange(s, e), k)
+            order = np.argsort(best_d, axis=1, kind="stable")
+            dist[qs:qs + qb] = np.sqrt(np.take_along_axis(best_d, order, axis=1))
+            ind[qs:qs + qb] = np.take_along_axis(best_i, order, axis=1)
+        return dist, ind
+
+    def predict(self, Q: np.ndarray) -> np.ndarray:
+        _, idx = self.kneighbors(Q)
+        votes = vote_counts(self.y_idx_[idx], len(self.classes_))
+        return self.classes_[votes.argmax(axis=1)]
+
+    def __getstate__(self) -> dict:
+        """Pickle a memory-mapped database as its file location and fingerprint, not its contents."""
+        state = self.__dict__.copy()
+        state["bufs_"] = None  # X_ and the norms/labels are views of them; the next partial_fit regrows
+        X = state.get("X_")
+        if isinstance(X, np.memmap) and X.filename is not None:
+            st = os.stat(X.filename)
+            state["X_"] = {"filename": X.filename, "offset": X.offset, "dtype": X.dtype.str, "shape": X.shape,
+                           "order": "F" if X.flags.f_contiguous and not X.flags.c_contiguous else "C",
+                           "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        """Reopen the database file, refusing one rewritten since the model was saved (its rows may have moved)."""
+        X = state.get("X_")
+        if isinstance(X, dict):
+            st = os.stat(X["filename"])
+            if (st.st_size, st.st_mtime_ns) != (X["size"], X["mtime_ns"]):
+                raise ValueError(f"{X['filename']} changed since this model was saved (feature store re-synced?); "
+                                 "refit it with tsr.knn_baseline --index chunked")
+            state["X_"] = np.memmap(X["filename"], dtype=np.dtype(X["dtype"]), mode="r", offset=X["offset"],
+                                    shape=tuple(X["shape"]), order=X["order"])
+        self.__dict__.update(state)
@@ -0,0 +1,112 @@
+"""kNN over a uint8 reference database.
+
+Pixels are 8-bit, so the database is kept as uint8 (1 byte per feature instead of 8)
+and only widened one cache-sized block at a time while computing distances:
+
+- 'ssd' (sum of squared differences): ||q||^2 + ||x||^2 - 2 q.x, where q.x is a GEMM on
+  the widened block. Operands are integers far below 2**53, so the float64 products and
+  sums are exact integer arithmetic and rankings match the float path. Blocks hold at
+  least GEMM_ROWS database rows whatever the feature width (a 4 MB block of 30,000-dim
+  rows widened to float64 is only 17 rows, too thin for the GEMM to run at full speed)
+  and are widened into one buffer reused across blocks.
+- 'sad' (sum of absolute differences): int16 differences summed into int32.
+"""
+import numpy as np
+
+from .knn_fast import vote_counts
+
+GEMM_ROWS = 64  # minimum database rows per 'ssd' block
+
+def quantize(X: np.ndarray, scale: float = 1.0, offset: float = 0.0) -> np.ndarray:
+    """Map float features to uint8 with x ~ offset + scale * q."""
+    X = np.asarray(X)
+    if scale == 1.0 and offset == 0.0:
+        if X.dtype == np.uint8:
+            return X
+        Y = np.rint(X)
+    else:
+        Y = np.subtract(X, offset, dtype=np.result_type(X.dtype, np.float32))
+        Y /= scale
+        np.rint(Y, out=Y)
+    return np.clip(Y, 0, 255, out=Y).astype(np.uint8)
+
+class QuantizedKNNClassifier:
+    """Brute-force kNN on uint8 features, with the fit/predict interface of KNeighborsClassifier."""
+
+    def __init__(self, n_neighbors: int = 5, metric: str = "ssd", block_bytes: int = 1 << 22):
+        if metric not in ("ssd", "sad"):
+            raise ValueError(f"Unknown metric: {metric!r}")
+        self.n_neighbors, self.metric, self.block_bytes = n_neighbors, metric, block_bytes
+
+    def fit(self, X: np.ndarray, y: np.ndarray) -> "QuantizedKNNClassifier":
+        X = np.asarray(X)
+        lo, hi = float(X.min()), float(X.max())
+        if X.dtype == np.uint8 or (lo >= 0 and hi <= 255 and np.array_equal(X, np.rint(X))):
+            self.scale_, self.offset_ = 1.0, 0.0  # already 8-bit pixel values: lossless
+        else:
+            self.scale_, self.offset_ = max(hi - lo, 1e-12) / 255.0, lo
+        self.X_ = np.ascontiguousarray(quantize(X, self.scale_, self.offset_))
+        self.sq_norms_ = np.einsum("ij,ij->i", self.X_, self.X_, dtype=np.int64)
+        self.classes_, self.y_idx_ = np.unique(np.asarray(y), return_inverse=True)
+        return self
+
+    def partial_fit(self, X: np.ndarray, y: np.ndarray) -> "QuantizedKNNClassifier":
+        """Append samples with the scale/offset chosen at fit(); values outside that range clip."""
+        Xq = quantize(np.asarray(X).reshape(len(X), -1), self.scale_, self.offset_)
+        classes = np.union1d(self.classes_, np.asarray(y))
+        self.y_idx_ = np.concatenate([np.searchsorted(classes, self.classes_)[self.y_idx_], np.searchsorted(classes, y)])
+        self.classes_ = classes
+        self.X_ = np.concatenate([self.X_, Xq])
+        self.sq_norms_ = np.concatenate([self.sq_norms_, np.einsum("ij,ij->i", Xq, Xq, dtype=np.int64)])
+        return self
+
+    def _block_rows(self, n_queries: int) -> int:
+        d = self.X_.shape[1]
+        if self.metric == "ssd":
+            return max(GEMM_ROWS, self.block_bytes // (8 * d))
+        return max(1, self.block_bytes // (2 * d * n_queries))
+
+    def distances(self, Q: np.ndarray) -> np.ndarray:
+        """(n_queries, n_db) SSD or SAD in quantized units, as int64."""
+        Q = quantize(np.asarray(Q).reshape(len(Q), -1), self.scale_, self.offset_)
+        n = self.X_.shape[0]
+        out = np.empty((len(Q), n), dtype=np.int64)
+        rows = self._block_rows(len(Q))
+        if self.metric == "ssd":
+            q = Q.astype(np.float64)
+            q_sq = np.einsum("ij,ij->i", q, q)[:, None]
+            buf = np.empty((min(rows, n), self.X_.shape[1]))
+            for s in range(0, n, rows):
+                B = buf[:min(rows, n - s)]
+                np.copyto(B, self.X_[s:s + len(B)])
+                d2 = q @ B.T
+                d2 *= -2  # still exact integers in float64
+                d2 += q_sq
+                d2 += self.sq_norms_[s:s + len(B)]
+                out[:, s:s + len(B)] = d2
+        else:
+            q = Q.astype(np.int16)[:, None, :]
+            for s in range(0, n, rows):
+                diff = np.abs(q - self.X_[None, s:s + rows].astype(np.int16))
+                out[:, s:s + rows] = diff.sum(axis=2, dtype=np.int32)
+        return out
+
+    def kneighbors(self, Q: np.ndarray, k: int = None):
+        """Return (distances, indices) of the k nearest samples, closest first.
+
+        Distances are euclidean ('ssd') or L1 ('sad') in the original feature units.
+        """
+        k = min(k or self.n_neighbors, self.X_.shape[0])
+        d = self.distances(Q)
+        idx = np.argpartition(d, k - 1, axis=1)[:, :k] if k < d.shape[1] \
+            else np.broadcast_to(np.arange(d.shape[1]), d.shape).copy()
+        part = np.take_along_axis(d, idx, axis=1)
+        order = np.argsort(part, axis=1, kind="stable")
+        part, idx = np.take_along_axis(part, order, axis=1), np.take_along_axis(idx, order, axis=1)
+        dist = np.sqrt(part) if self.metric == "ssd" else part.astype(np.float64)
+        return dist * self.scale_, idx
+
+    def predict(self, Q: np.ndarray) -> np.ndarray:
+        _, idx = self.kneighbors(Q)
+        votes = vote_counts(self.y_idx_[idx], len(self.classes_))
+        return self.classes_[votes.argmax(axis=1)]
@@ -0,0 +1,193 @@
+"""Plain .npz model format and a NumPy-only kNN predictor that memory-maps it.
+
+A joblib bundle needs sklearn and joblib just to unpickle it. The exported .npz holds
+the same model as plain arrays:
+
+    X          (N, D) reference features (float32, or uint8 for the quantized engine)
+    sq_norms   (N,) float64 squared norms of X, so nothing is recomputed at load
+    y          (N,) class indices into `classes`
+    classes    class labels;  k, scale, offset, version as scalars
+    condensed  optional JSON record of a tsr.condense step (method, rows before/after)
+    pipeline   JSON parameters of the FeaturePipeline, with pipeline_mean /
+               pipeline_components for a fitted projection
+
+np.savez stores members uncompressed, so X and sq_norms are memory-mapped straight
+from the zip file: load time does not grow with the database size. IVF models are
+exported as their full matrix and searched exactly. A CascadeClassifier is exported as
+its kNN plus cascade_* members (first-stage thumbnails and centroids, threshold,
+calibration curve) and loads back as a cascade over the NumPy predictor. load_bundle()
+also accepts a tsr.cnn network .npz (recognized by its `cnn` member).
+
+Usage:
+    python -m tsr.knn_baseline --save models/knn.joblib --export models/knn.npz
+    python -m tsr.npz_model --model models/knn.joblib --out models/knn.npz      # convert a saved bundle
+"""
+import argparse
+import json
+import struct
+import zipfile
+from typing import Dict, Optional
+
+import numpy as np
+
+from .cascade import CascadeClassifier
+from .cnn import CNNClassifier, is_cnn_npz
+from .features import FeaturePipeline
+from .knn_fast import vote_counts
+
+PIPELINE_PARAMS = ("thumb", "hist_bins", "pixels", "projection", "n_components", "hist_weight", "pixel_scale", "seed")
+
+def model_arrays(clf) -> Dict[str, np.ndarray]:
+    """X (uint8 or float32), y (class indices), k, scale and offset of a fitted kNN engine."""
+    if getattr(clf, "metric", "ssd") not in ("ssd", "minkowski", "euclidean") or getattr(clf, "p", 2) != 2:
+        raise ValueError(f"Only euclidean models can be exported, not metric={clf.metric!r}")
+    if hasattr(clf, "_fit_X"):  # sklearn KNeighborsClassifier
+        X, y = clf._fit_X, clf.classes_[clf._y]
+    elif getattr(clf, "rows_", None) is not None:  # ChunkedKNNClassifier over a subset of its matrix
+        X, y = clf.X_[clf.rows_], clf.classes_[clf.y_idx_]
+    else:  # IVFKNNClassifier / QuantizedKNNClassifier / ChunkedKNNClassifier
+        X, y = clf.X_, clf.classes_[clf.y_idx_]
+    X = np.ascontiguousarray(X, dtype=None if X.dtype == np.uint8 else np.float32)  # sklearn fits on float64
+    return {"X": X, "y": np.asarray(y, dtype=np.int64), "k": np.int64(clf.n_neighbors),
+            "scale": np.float64(getattr(clf, "scale_", 1.0)), "offset": np.float64(getattr(clf, "offset_", 0.0))}
+
+CASCADE_ARRAYS = ("classes_", "counts_", "centroids_", "thumbs_", "thumb_y_", "thumb_sq_",
+                  "curve_scores_", "curve_accuracy_")
+
+def cascade_arrays(c: CascadeClassifier) -> Dict[str, np.ndarray]:
+    arrays = {"cascade_" + name.rstrip("_"): getattr(c, name) for name in CASCADE_ARRAYS}
+    arrays["cascade_params"] = np.array(json.dumps({"thumb": c.thumb, "first": c.first, "first_k": c.first_k,
+                                                    "image_shape": c.image_shape, "threshold": c.threshold}))
+    return arrays
+
+def cascade_from_npz(z, full) -> CascadeClassifier:
+    c = CascadeClassifier(full, **json.loads(str(z["cascade_params"])))
+    for name in CASCADE_ARRAYS:
+        setattr(c, name, z["cascade_" + name.rstrip("_")])
+    return c
+
+def export_npz(bundle: dict, path: str) -> None:
+    clf = bundle["model"]
+    cascade = clf if isinstance(clf, CascadeClassifier) else None
+    arrays = model_arrays(cascade.full if cascade is not None else clf)
+    if cascade is not None:
+        arrays.update(cascade_arrays(cascade))
+    X = arrays["X"]
+    arrays["sq_norms"] = np.einsum("ij,ij->i", X, X, dtype=np.float64)
+    arrays["classes"] = np.array([str(c) for c in bundle["classes"]])
+    arrays["version"] = np.int64(bundle.get("version", 0))
+    if "condensed" in bundle:
+        arrays["condensed"] = np.array(json.dumps(bundle["condensed"]))
+    p: Optional[FeaturePipeline] = bundle.get("pipeline")
+    if p is not None:
+        arrays["pipeline"] = np.array(json.dumps({k: getattr(p, k) for k in PIPELINE_PARAMS}))
+        if p.components_ is not None:
+            arrays["pipeline_mean"], arrays["pipeline_components"] = p.mean_, p.components_
+    np.savez(path, **arrays)
+
+def mmap_npz_member(path: str, name: str) -> np.ndarray:
+    """Read-only memmap of one uncompressed .npy member of an .npz file."""
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(name + ".npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f"{name} is compressed in {path}; save with np.savez to memory-map it")
+    with open(path, "rb") as f:
+        f.seek(info.header_offset)
+        name_len, extra_len = struct.unpack("<HH", f.read(30)[26:30])
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+        version = np.lib.format.read_magic(f)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, fortran, dtype = read_header(f)
+        offset = f.tell()
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape, order="F" if fortran else "C")
+
+def pipeline_from_npz(z) -> Optional[FeaturePipeline]:
+    if "pipeline" not in z.files:
+        return None
+    p = FeaturePipeline(**json.loads(str(z["pipeline"])))
+    if "pipeline_components" in z.files:
+        p.mean_, p.components_ = z["pipeline_mean"], z["pipeline_components"]
+    return p
+
+class NpzKNNClassifier:
+    """Exact kNN over an exported .npz, with the predict/kneighbors interface of the other engines.
+
+    Distances are computed with one float64 GEMM per block of `block_rows` database rows,
+    so a memory-mapped uint8 or float32 matrix is only widened a block at a time.
+    """
+
+    def __init__(self, path: str, mmap: bool = True, block_rows: int = 4096):
+        with np.load(path) as z:
+            if mmap:
+                self.X_, self.sq_norms_ = mmap_npz_member(path, "X"), mmap_npz_member(path, "sq_norms")
+            else:
+                self.X_, self.sq_norms_ = z["X"], z["sq_norms"]
+            self.y_ = z["y"]
+            self.n_neighbors = int(z["k"])
+            self.scale_, self.offset_ = float(z["scale"]), float(z["offset"])
+            self.class_names = z["classes"].tolist()
+            self.version = int(z["version"]) if "version" in z.files else 0
+            self.pipeline = pipeline_from_npz(z)
+        self.classes_, self.y_idx_ = np.unique(self.y_, return_inverse=True)
+        self.block_rows = block_rows
+
+    def sq_distances(self, Q: np.ndarray) -> np.ndarray:
+        Q = np.asarray(Q, dtype=np.float64).reshape(len(Q), -1)
+        if self.scale_ != 1.0 or self.offset_ != 0.0:
+            Q = np.clip(np.rint((Q - self.offset_) / self.scale_), 0, 255)  # into the uint8 codes of X
+        n = self.X_.shape[0]
+        d2 = np.empty((len(Q), n))
+        for s in range(0, n, self.block_rows):
+            d2[:, s:s + self.block_rows] = Q @ np.asarray(self.X_[s:s + self.block_rows], dtype=np.float64).T
+        d2 *= -2
+        d2 += np.einsum("ij,ij->i", Q, Q)[:, None]
+        d2 += self.sq_norms_[None, :]
+        return np.maximum(d2, 0, out=d2)
+
+    def kneighbors(self, Q: np.ndarray, k: int = None):
+        """Return (distances, indices) of the k nearest samples, closest first."""
+        k = min(k or self.n_neighbors, self.X_.shape[0])
+        d2 = self.sq_distances(Q)
+        idx = np.argpartition(d2, k - 1, axis=1)[:, :k] if k < d2.shape[1] \
+            else np.broadcast_to(np.arange(d2.shape[1]), d2.shape).copy()
+        part = np.take_along_axis(d2, idx, axis=1)
+        order = np.argsort(part, axis=1, kind="stable")
+        idx = np.take_along_axis(idx, order, axis=1)
+        return np.sqrt(np.take_along_axis(part, order, axis=1)) * self.scale_, idx
+
+    def predict(self, Q: np.ndarray) -> np.ndarray:
+        _, idx = self.kneighbors(Q)
+        votes = vote_counts(self.y_idx_[idx], len(self.classes_))
+        return self.classes_[votes.argmax(axis=1)]
+
+def load_bundle(path: str) -> dict:
+    """Model bundle from a .npz export (NumPy only) or a joblib file (needs joblib + sklearn)."""
+    if path.endswith(".npz"):
+        with np.load(path) as z:
+            if is_cnn_npz(z):
+                cnn = CNNClassifier.from_npz(path)
+                return {"model": cnn, "classes": cnn.class_names, "version": "cnn"}
+        clf = NpzKNNClassifier(path)
+        bundle = {"model": clf, "classes": clf.class_names, "version": clf.version}
+        if clf.pipeline is not None:
+            bundle["pipeline"] = clf.pipeline
+        with np.load(path) as z:
+            if "cascade_params" in z.files:
+                bundle["model"] = cascade_from_npz(z, clf)
+            if "condensed" in z.files:
+                bundle["condensed"] = json.loads(str(z["condensed"]))
+        return bundle
+    import joblib
+    return joblib.load(path)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="models/knn.joblib", help="joblib bundle to convert")
+    ap.add_argument("--out", default="", help="output .npz (default: next to the model)")
+    args = ap.parse_args()
+    out = args.out or args.model.rsplit(".", 1)[0] + ".npz"
+    export_npz(load_bundle(args.model), out)
+    print("Exported", args.model, "to", out)
+
+if __name__ == "__main__":
+    main()
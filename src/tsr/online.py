@@ -0,0 +1,166 @@
+"""Append newly labelled crops to a deployed model bundle, and hot-reload it.
+
+Only the new crops are decoded and featurized (through the bundle's pipeline, which
+is not refitted), and every engine inserts them with partial_fit() at a cost that
+grows with the new rows, not the model. sklearn's KNeighborsClassifier cannot append,
+so on the first update its rows move into an exact ChunkedKNNClassifier (same
+neighbours), whose growable buffers take later updates in place. Labels not seen
+before are appended to bundle["classes"], so existing class indices stay valid.
+
+Every update bumps bundle["version"], keeps a copy as <model>.v0003.joblib and then
+atomically replaces <model>.joblib; a running loop picks it up between frames with
+ModelWatcher. Files already added (same path, size and mtime) are skipped.
+
+Captures are labelled either by folder (captures/<label>/*.png) or with --label for a
+flat folder such as the one the realtime script's `s` key fills.
+
+Usage:
+    python -m tsr.online --model models/knn.joblib --captures captures --label 50
+    python -m tsr.online --model models/knn.joblib --captures captures_sorted      # one subfolder per label
+    python -m tsr.online --model models/knn.joblib --captures captures --label 50 --export models/knn.npz
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .dataset import list_image_paths
+from .feature_store import fingerprint
+from .features import crops_to_features
+from .knn_ooc import ChunkedKNNClassifier
+from .npz_model import export_npz, load_bundle
+from .sources import IMAGE_EXTENSIONS
+
+def labelled_paths(folder: str, label: str = "") -> Tuple[List[str], List[str]]:
+    """(paths, labels): every image of a flat folder with `label`, or class subfolders."""
+    if label:
+        paths = sorted(str(p) for p in Path(folder).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+        return paths, [label] * len(paths)
+    return list_image_paths(folder)
+
+def source_key(path: str) -> str:
+    size, mtime_ns = fingerprint(path)
+    return f"{os.path.abspath(path)}:{size}:{mtime_ns}"
+
+def append_samples(bundle: dict, crops_rgb: List[np.ndarray], labels: List[str]) -> dict:
+    """Add RGB crops with their labels to the bundle's model, in place; returns the bundle."""
+    if not crops_rgb:
+        return bundle
+    classes = bundle["classes"]
+    for lbl in labels:
+        if lbl not in classes:
+            classes.append(lbl)
+    y = np.array([classes.index(lbl) for lbl in labels], dtype=int)
+    X = crops_to_features(crops_rgb, bundle.get("pipeline"))
+    clf = bundle["model"]
+    cascade = clf if hasattr(clf, "add_samples") else None
+    if cascade is not None:  # CascadeClassifier: both stages learn the new rows
+        clf = cascade.add_samples(X, y).full
+    if hasattr(clf, "_fit_X"):  # sklearn cannot append: move its rows once into an engine that can
+        clf = ChunkedKNNClassifier(clf.n_neighbors).fit(clf._fit_X, clf.classes_[clf._y])
+        if cascade is not None:
+            cascade.full = clf
+        else:
+            bundle["model"] = clf
+    if not hasattr(clf, "partial_fit"):
+        raise TypeError(f"Cannot append samples to a {type(clf).__name__}")
+    clf.partial_fit(X, y)
+    return bundle
+
+def versioned_path(model_path: str, version: int) -> str:
+    p = Path(model_path)
+    return str(p.with_name(f"{p.stem}.v{version:04d}{p.suffix}"))
+
+def save_version(bundle: dict, model_path: str) -> int:
+    """Bump the version, keep a versioned copy and atomically replace `model_path`."""
+    import joblib
+    bundle["version"] = bundle.get("version", 0) + 1
+    joblib.dump(bundle, versioned_path(model_path, bundle["version"]))
+    tmp = model_path + ".tmp"
+    joblib.dump(bundle, tmp)
+    os.replace(tmp, model_path)  # readers see the old or the new bundle, never half of one
+    return bundle["version"]
+
+def replace_export(bundle: dict, npz_path: str) -> None:
+    """Rewrite an .npz export next to the bundle, swapped in atomically like the bundle."""
+    tmp = npz_path[:-len(".npz")] + ".tmp.npz"  # np.savez insists on the .npz suffix
+    export_npz(bundle, tmp)
+    os.replace(tmp, npz_path)
+
+def update_model(model_path: str, folder: str, label: str = "", export: str = "") -> dict:
+    """Append the not-yet-added images of `folder` to the bundle; returns counts."""
+    import joblib
+    bundle = joblib.load(model_path)
+    added = set(bundle.get("sources", ()))
+    paths, labels = labelled_paths(folder, label)
+    new = [(p, lbl, source_key(p)) for p, lbl in zip(paths, labels) if source_key(p) not in added]
+    crops, crop_labels, keys = [], [], []
+    for p, lbl, key in new:
+        img = cv2.imread(p)
+        if img is None:
+            continue
+        crops.append(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        crop_labels.append(lbl)
+        keys.append(key)
+    stats = {"found": len(paths), "skipped": len(paths) - len(new), "added": len(crops),
+             "version": bundle.get("version", 0)}
+    if not crops:
+        return stats
+    t0 = time.perf_counter()
+    append_samples(bundle, crops, crop_labels)
+    stats["append_ms"] = 1e3 * (time.perf_counter() - t0)
+    bundle["sources"] = sorted(added | set(keys))
+    stats["version"] = save_version(bundle, model_path)
+    if export:
+        replace_export(bundle, export)
+    return stats
+
+class ModelWatcher:
+    """Reloads a bundle when its file changes; poll() is cheap enough to call every frame."""
+
+    def __init__(self, path: str, interval: float = 1.0):
+        self.path, self.interval = path, interval
+        self.t_next = time.perf_counter() + interval
+        self.mtime_ns = self._mtime()
+
+    def _mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def poll(self) -> Optional[dict]:
+        """The new bundle if the file changed since the last load, else None."""
+        now = time.perf_counter()
+        if not self.interval or now < self.t_next:
+            return None
+        self.t_next = now + self.interval
+        mtime = self._mtime()
+        if mtime is None or mtime == self.mtime_ns:
+            return None
+        self.mtime_ns = mtime
+        return load_bundle(self.path)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="models/knn.joblib", help="model bundle to update in place")
+    ap.add_argument("--captures", default="captures", help="folder of new crops")
+    ap.add_argument("--label", default="", help="label for every image of a flat folder (else subfolders are labels)")
+    ap.add_argument("--export", default="", help="also refresh this .npz export (for robots running on it)")
+    args = ap.parse_args()
+    if args.export and not args.export.endswith(".npz"):
+        ap.error("--export must end with .npz")
+
+    stats = update_model(args.model, args.captures, args.label, args.export)
+    if not stats["added"]:
+        print(f"Nothing new in {args.captures} ({stats['skipped']} already added); model stays at version {stats['version']}")
+        return
+    print(f"Added {stats['added']} samples in {stats['append_ms']:.1f} ms "
+          f"({stats['skipped']} already added); saved version {stats['version']} to {args.model}")
+
+if __name__ == "__main__":
+    main()
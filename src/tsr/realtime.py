@@ -0,0 +1,161 @@
+"""Serial and pipelined execution of the capture -> detect -> classify loop.
+
+In pipelined mode each stage runs in its own thread and stages are linked by bounded
+LatestQueues: when a downstream stage is busy, the queued frame is replaced by the
+newest one instead of piling up, so latency stays bounded by the slowest stage.
+All crops of a frame are classified in one batch. With a tsr.tracking.SignTracker,
+only new or changed tracks are classified and labels are vote-smoothed per track.
+
+    detect(frame)  -> (circles, crops)     circles: list of (x, y, r)
+    classify(crops) -> labels              one label per crop
+"""
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+_CLOSED = object()
+
+@dataclass
+class FrameResult:
+    index: int
+    frame: np.ndarray
+    t_capture: float
+    circles: list = field(default_factory=list)
+    crops: list = field(default_factory=list)
+    labels: list = field(default_factory=list)
+    t_done: float = 0.0
+
+    @property
+    def latency(self) -> float:
+        """Seconds from capture to classification."""
+        return self.t_done - self.t_capture
+
+class LatestQueue:
+    """Bounded queue; with drop_stale, put() on a full queue discards the oldest item.
+
+    Once closed, put() discards the new item instead and returns False.
+    """
+
+    def __init__(self, maxsize: int = 1, drop_stale: bool = True):
+        self.items = deque()
+        self.maxsize, self.drop_stale = maxsize, drop_stale
+        self.dropped = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def put(self, item) -> bool:
+        with self.cond:
+            while len(self.items) >= self.maxsize and not self.drop_stale and not self.closed:
+                self.cond.wait()
+            if self.closed:
+                return False  # the consumer has stopped: keep what it may still drain
+            if len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.cond.notify_all()
+            return True
+
+    def get(self):
+        """Next item, or _CLOSED once the queue is closed and drained."""
+        with self.cond:
+            while not self.items and not self.closed:
+                self.cond.wait()
+            item = self.items.popleft() if self.items else _CLOSED
+            self.cond.notify_all()
+            return item
+
+    def close(self) -> None:
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+def label_crops(res: FrameResult, classify: Callable, tracker=None) -> FrameResult:
+    if tracker is not None:
+        res.labels = tracker.labels(res.circles, res.crops, classify)
+    else:
+        res.labels = list(classify(res.crops)) if res.crops else []
+    res.t_done = time.perf_counter()
+    return res
+
+def run_serial(frames: Iterable[np.ndarray], detect: Callable, classify: Callable,
+               tracker=None) -> Iterator[FrameResult]:
+    """Reference single-threaded loop."""
+    for i, frame in enumerate(frames):
+        res = FrameResult(i, frame, time.perf_counter())
+        res.circles, res.crops = detect(frame)
+        yield label_crops(res, classify, tracker)
+
+class StagePipeline:
+    """Capture, detection and classification as three threads linked by LatestQueues."""
+
+    def __init__(self, frames: Iterable[np.ndarray], detect: Callable, classify: Callable,
+                 drop_stale: bool = True, tracker=None):
+        self.frames, self.detect, self.classify, self.tracker = frames, detect, classify, tracker
+        self.q_detect = LatestQueue(1, drop_stale)
+        self.q_classify = LatestQueue(1, drop_stale)
+        self.q_out = LatestQueue(1, drop_stale)
+        self.stop_event = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.threads: List[threading.Thread] = []
+
+    @property
+    def dropped(self) -> int:
+        return self.q_detect.dropped + self.q_classify.dropped + self.q_out.dropped
+
+    def _stage(self, fn: Callable, q_in: Optional[LatestQueue], q_out: LatestQueue) -> None:
+        try:
+            fn(q_in, q_out)
+        except BaseException as e:
+            self.error = e
+            self.stop_event.set()
+        finally:
+            q_out.close()
+
+    def _capture(self, _, q_out: LatestQueue) -> None:
+        for i, frame in enumerate(self.frames):
+            if self.stop_event.is_set():
+                break
+            q_out.put(FrameResult(i, frame, time.perf_counter()))
+
+    def _detect(self, q_in: LatestQueue, q_out: LatestQueue) -> None:
+        while (res := q_in.get()) is not _CLOSED and not self.stop_event.is_set():
+            res.circles, res.crops = self.detect(res.frame)
+            q_out.put(res)
+
+    def _classify(self, q_in: LatestQueue, q_out: LatestQueue) -> None:
+        while (res := q_in.get()) is not _CLOSED and not self.stop_event.is_set():
+            q_out.put(label_crops(res, self.classify, self.tracker))
+
+    def __iter__(self) -> Iterator[FrameResult]:
+        stages = [(self._capture, None, self.q_detect),
+                  (self._detect, self.q_detect, self.q_classify),
+                  (self._classify, self.q_classify, self.q_out)]
+        self.threads = [threading.Thread(target=self._stage, args=s, daemon=True) for s in stages]
+        for t in self.threads:
+            t.start()
+        try:
+            while (res := self.q_out.get()) is not _CLOSED:
+                yield res
+        finally:
+            self.stop()
+        if self.error is not None:
+            raise self.error
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        for q in (self.q_detect, self.q_classify, self.q_out):
+            q.close()
+        for t in self.threads:
+            t.join(timeout=1.0)
+
+def latency_summary(latencies: List[float]) -> str:
+    if not latencies:
+        return "no frames processed"
+    ms = np.array(latencies) * 1e3
+    return (f"{len(ms)} frames, latency mean {ms.mean():.1f} ms, "
+            f"p50 {np.percentile(ms, 50):.1f} ms, p95 {np.percentile(ms, 95):.1f} ms")
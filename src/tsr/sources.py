@@ -0,0 +1,183 @@
+"""Frame sources for the realtime and robot loops: a camera, a video file or a folder of images.
+
+A FrameSource is opened once and read() many times. Frames are written into a ring of
+preallocated buffers, so steady-state capture does no allocation and no disk round trip;
+a frame returned by read() stays valid for the next `ring_size - 1` reads
+(ring_size=0 allocates a fresh array per frame instead).
+
+Usage:
+    with make_source("0", ring_size=2) as src:          # camera 0
+        frame = src.read()
+    for frame in open_frames("drive.mp4"): ...          # video file
+    for frame in open_frames("data/frames"): ...        # sorted image folder
+"""
+import time
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.bmp'}
+
+def is_live(source: Union[str, int]) -> bool:
+    """True for camera indices, where stale frames should be dropped rather than queued."""
+    return isinstance(source, int) or str(source).isdigit()
+
+class FrameSource:
+    """Base class: subclasses implement _open, _close and _grab(out) -> frame or None."""
+
+    def __init__(self, ring_size: int = 2):
+        self.ring_size = ring_size
+        self.ring = []
+        self.pos = 0
+        self.frames_read = 0
+
+    def __enter__(self) -> "FrameSource":
+        self.open()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        while (frame := self.read()) is not None:
+            yield frame
+
+    def open(self) -> None:
+        self._open()
+
+    def close(self) -> None:
+        self._close()
+        self.ring = []
+
+    def _next_buffer(self) -> Optional[np.ndarray]:
+        """Ring slot to fill next; None until the frame shape is known or when not ringing."""
+        if not self.ring_size or not self.ring:
+            return None
+        buf = self.ring[self.pos]
+        self.pos = (self.pos + 1) % self.ring_size
+        return buf
+
+    def read(self) -> Optional[np.ndarray]:
+        """Next BGR frame, or None when the source is exhausted."""
+        out = self._next_buffer()
+        frame = self._grab(out)
+        if frame is None:
+            return None
+        if self.ring_size and not self.ring:
+            self.ring = [np.empty_like(frame) for _ in range(self.ring_size)]
+            np.copyto(self.ring[0], frame)
+            frame, self.pos = self.ring[0], 1 % self.ring_size
+        elif out is not None and frame is not out:
+            if frame.shape != out.shape:
+                raise ValueError(f"frame shape changed from {out.shape} to {frame.shape}")
+            np.copyto(out, frame)
+            frame = out
+        self.frames_read += 1
+        return frame
+
+    def _open(self) -> None:
+        pass
+
+    def _close(self) -> None:
+        pass
+
+    def _grab(self, out: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        raise NotImplementedError
+
+class VideoCaptureSource(FrameSource):
+    """cv2.VideoCapture on a camera index or a video file, decoding straight into the ring."""
+
+    def __init__(self, target: Union[int, str], ring_size: int = 2, retry_s: float = 0.02):
+        super().__init__(ring_size)
+        self.target, self.retry_s = target, retry_s
+        self.cap = None
+
+    @property
+    def live(self) -> bool:
+        return isinstance(self.target, int)
+
+    def _open(self) -> None:
+        self.cap = cv2.VideoCapture(self.target)
+        if not self.cap.isOpened():
+            raise SystemExit(f"Could not open {'camera' if self.live else 'video'} {self.target}")
+
+    def _close(self) -> None:
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def _grab(self, out):
+        while True:
+            ok, frame = self.cap.read(out) if out is not None else self.cap.read()
+            if ok:
+                return frame
+            if not self.live:
+                return None
+            time.sleep(self.retry_s)
+
+class ReplaySource(FrameSource):
+    """Replays an image folder (or any list of frames) as a camera stand-in.
+
+    `fps` throttles reads to a camera-like rate; `loop` restarts at the end.
+    """
+
+    def __init__(self, folder: Union[str, Path, None] = None, frames=None, ring_size: int = 2,
+                 fps: float = 0.0, loop: bool = False, preload: bool = True):
+        super().__init__(ring_size)
+        self.folder, self.frames, self.fps, self.loop, self.preload = folder, frames, fps, loop, preload
+        self.paths = []
+        self.i = 0
+        self.t_next = 0.0
+
+    def _open(self) -> None:
+        if self.frames is None:
+            folder = Path(self.folder)
+            self.paths = sorted(p for p in folder.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+            if not self.paths:
+                raise SystemExit(f"No images in {folder}")
+            if self.preload:
+                self.frames = [f for f in (cv2.imread(str(p)) for p in self.paths) if f is not None]
+        self.i = 0
+        self.t_next = time.perf_counter()
+
+    def _grab(self, out):
+        n = len(self.frames) if self.frames is not None else len(self.paths)
+        frame, misses = None, 0
+        while frame is None:  # skip unreadable files
+            if self.i >= n:
+                if not self.loop or n == 0:
+                    return None
+                self.i = 0
+            if misses == n:
+                raise SystemExit(f"No readable images in {self.folder}")
+            frame = self.frames[self.i] if self.frames is not None else cv2.imread(str(self.paths[self.i]))
+            self.i += 1
+            misses += 1
+        if self.fps:
+            delay = self.t_next - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self.t_next = max(self.t_next, time.perf_counter() - 1.0 / self.fps) + 1.0 / self.fps
+        if out is not None:
+            np.copyto(out, frame)
+            return out
+        return frame if self.ring_size else frame.copy()
+
+def make_source(source: Union[str, int], ring_size: int = 2, fps: float = 0.0, loop: bool = False) -> FrameSource:
+    """FrameSource for a camera index, a video file or an image folder (fps/loop: folders only)."""
+    if is_live(source):
+        return VideoCaptureSource(int(source), ring_size)
+    if Path(source).is_dir():
+        return ReplaySource(source, ring_size=ring_size, fps=fps, loop=loop)
+    return VideoCaptureSource(str(source), ring_size)
+
+def open_frames(source: Union[str, int], ring_size: int = 0) -> Iterator[np.ndarray]:
+    """Yield BGR frames from a camera index, a video file or an image folder.
+
+    The default ring_size=0 yields independent arrays, which is what threaded consumers
+    that hold several frames at once need.
+    """
+    with make_source(source, ring_size) as src:
+        yield from src
@@ -0,0 +1,120 @@
+"""Cross-frame tracking of detected signs, with classification caching and vote smoothing.
+
+Circles are associated with existing tracks by centre distance (relative to the radius)
+and radius ratio. A track's crop is only sent to the classifier when the track is new,
+when its crop has changed noticeably since it was last classified, or every
+`reclassify_every` frames. Each classification adds a vote; the track's label is the
+majority over its last `history` votes, so one bad frame does not flip the decision.
+"""
+from collections import Counter, deque
+from typing import Callable, List, Sequence, Tuple
+
+import numpy as np
+
+from .features import thumbnail
+
+def crop_signature(crop: np.ndarray, size: int = 8) -> np.ndarray:
+    """Tiny grey thumbnail used to tell whether a crop changed since its last classification."""
+    return thumbnail(crop[None, ..., :3].astype(np.float32), size)[0].mean(axis=-1)
+
+class Track:
+    def __init__(self, track_id: int, circle: Tuple[int, int, int], history: int):
+        self.id = track_id
+        self.x, self.y, self.r = (int(v) for v in circle)
+        self.votes = deque(maxlen=history)
+        self.signature = None
+        self.hits = 1
+        self.misses = 0
+        self.since_classified = 0
+
+    @property
+    def label(self):
+        """Majority of the recent votes; ties go to the most recent vote."""
+        if not self.votes:
+            return None
+        counts = Counter(self.votes)
+        best = max(counts.values())
+        return next(v for v in reversed(self.votes) if counts[v] == best)
+
+    @property
+    def confidence(self) -> float:
+        """Fraction of the recent votes that agree with the label."""
+        return Counter(self.votes)[self.label] / len(self.votes) if self.votes else 0.0
+
+    def cost(self, circle) -> float:
+        x, y, r = circle
+        return np.hypot(x - self.x, y - self.y) / max(self.r, 1)
+
+class SignTracker:
+    def __init__(self, max_move: float = 0.6, max_radius_ratio: float = 1.4, max_misses: int = 5,
+                 history: int = 7, change_thresh: float = 12.0, reclassify_every: int = 15):
+        self.max_move, self.max_radius_ratio = max_move, max_radius_ratio
+        self.max_misses, self.history = max_misses, history
+        self.change_thresh, self.reclassify_every = change_thresh, reclassify_every
+        self.tracks: List[Track] = []
+        self.next_id = 0
+        self.crops_seen = 0
+        self.crops_classified = 0
+
+    def _associate(self, circles: Sequence) -> List[Track]:
+        """Greedy nearest matching; returns one track per circle (new ones included)."""
+        pairs = []
+        for ci, c in enumerate(circles):
+            for ti, t in enumerate(self.tracks):
+                ratio = max(c[2], 1) / max(t.r, 1)
+                if 1 / self.max_radius_ratio <= ratio <= self.max_radius_ratio:
+                    cost = t.cost(c)
+                    if cost <= self.max_move:
+                        pairs.append((cost, ci, ti))
+        matched, used = [None] * len(circles), set()
+        for _, ci, ti in sorted(pairs):
+            if matched[ci] is None and ti not in used:
+                matched[ci] = self.tracks[ti]
+                used.add(ti)
+        for t in self.tracks:
+            if id(t) not in {id(m) for m in matched if m is not None}:
+                t.misses += 1
+        for ci, c in enumerate(circles):
+            t = matched[ci]
+            if t is None:
+                t = Track(self.next_id, c, self.history)
+                self.next_id += 1
+                self.tracks.append(t)
+                matched[ci] = t
+            else:
+                t.x, t.y, t.r = (int(v) for v in c)
+                t.hits += 1
+                t.misses = 0
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+        return matched
+
+    def update(self, circles: Sequence, crops: Sequence[np.ndarray], classify: Callable) -> List[Track]:
+        """Match this frame's circles/crops to tracks, classify only what needs it; one Track per circle."""
+        tracks = self._associate(circles)
+        todo, sigs = [], []
+        for i, (t, crop) in enumerate(zip(tracks, crops)):
+            sig = crop_signature(crop)
+            t.since_classified += 1
+            stale = self.reclassify_every and t.since_classified >= self.reclassify_every
+            changed = t.signature is None or np.abs(sig - t.signature).mean() > self.change_thresh
+            if changed or stale:
+                todo.append(i)
+                sigs.append(sig)
+        self.crops_seen += len(crops)
+        if todo:
+            labels = classify([crops[i] for i in todo])
+            self.crops_classified += len(todo)
+            for i, sig, label in zip(todo, sigs, labels):
+                tracks[i].votes.append(label)
+                tracks[i].signature = sig
+                tracks[i].since_classified = 0
+        return tracks
+
+    def labels(self, circles: Sequence, crops: Sequence[np.ndarray], classify: Callable) -> list:
+        """Smoothed label for every circle of the frame."""
+        return [t.label for t in self.update(circles, crops, classify)]
+
+    def stats(self) -> str:
+        saved = 1 - self.crops_classified / self.crops_seen if self.crops_seen else 0.0
+        return (f"{self.crops_classified}/{self.crops_seen} crops classified "
+                f"({100 * saved:.0f}% served from track cache), {len(self.tracks)} live tracks")
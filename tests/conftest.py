@@ -0,0 +1,8 @@
+"""Make `tsr` (src/) and `raspberry` importable, as PYTHONPATH=src:. does for the scripts."""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+for p in (ROOT / "src", ROOT):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
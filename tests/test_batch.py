@@ -0,0 +1,43 @@
+"""tsr.batch must run on the NumPy-only .npz export like on the joblib bundle."""
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from tsr import batch
+from tsr.bench import fit_default_model, synthetic_frames
+from tsr.dataset import list_image_paths
+from tsr.npz_model import export_npz, load_bundle
+
+DATA = Path(__file__).resolve().parents[1] / "data" / "train"
+
+pytestmark = pytest.mark.skipif(not DATA.is_dir(), reason="data/train not available")
+
+@pytest.fixture(scope="module")
+def drive(tmp_path_factory):
+    joblib = pytest.importorskip("joblib")
+    tmp = tmp_path_factory.mktemp("batch")
+    bundle = fit_default_model(str(DATA))
+    joblib.dump(bundle, tmp / "knn.joblib")
+    export_npz(bundle, str(tmp / "knn.npz"))
+    frames = tmp / "frames"
+    frames.mkdir()
+    paths, _ = list_image_paths(str(DATA))
+    for i, (frame, _) in enumerate(synthetic_frames(paths, 4, (480, 360), np.random.default_rng(0))):
+        cv2.imwrite(str(frames / f"{i:03d}.png"), frame)
+    return tmp
+
+def test_npz_model_matches_joblib(drive):
+    assert load_bundle(str(drive / "knn.npz"))["model"].X_.dtype == np.float32  # not sklearn's float64
+    ref = batch.run(str(drive / "frames"), str(drive / "knn.joblib"), "", workers=1, chunk=2)
+    cols = batch.run(str(drive / "frames"), str(drive / "knn.npz"), "", workers=1, chunk=2)
+    assert len(ref["frame"]) > 0
+    for c in ("frame", "x", "y", "r", "label", "confidence"):
+        np.testing.assert_array_equal(cols[c], ref[c])
+    np.testing.assert_allclose(cols["distance"], ref["distance"], rtol=1e-4)
+
+def test_npz_model_in_worker_processes(drive):
+    cols = batch.run(str(drive / "frames"), str(drive / "knn.npz"), str(drive / "out.csv"), workers=2, chunk=2)
+    assert len(cols["frame"]) > 0 and not np.isnan(cols["confidence"]).any()
+    assert (drive / "out.csv").read_text().splitlines()[0] == ",".join(batch.COLUMNS)
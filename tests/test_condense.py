@@ -0,0 +1,42 @@
+"""fit_condensed keeps the condensed set only within its accuracy budget."""
+import numpy as np
+
+from tsr.condense import cross_validate, fit_condensed, holdout
+from tsr.knn_ooc import ChunkedKNNClassifier
+
+def blobs(noise: float, n: int = 60, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    y = np.arange(n) % 3
+    return np.eye(3)[y] * 10 + rng.normal(0, noise, (n, 3)), y
+
+def knn(k: int):
+    return lambda n: ChunkedKNNClassifier(min(k, n))
+
+def test_separable_classes_are_condensed():
+    F, y = blobs(0.5)
+    clf, info = fit_condensed(F, y, ["enn", "cnn"], knn(5), knn(1), log=None)
+    assert info["rows_after"] < len(F) and info["method"] == "enn+cnn"
+    assert info["cv_accuracy"] == info["cv_accuracy_full"] == 1.0
+
+def test_over_budget_keeps_the_full_set():
+    F, y = blobs(8.0)
+    logged = []
+    clf, info = fit_condensed(F, y, ["cnn"], knn(5), knn(1), max_loss=0.0, log=logged.append)
+    assert info["cv_accuracy"] < info["cv_accuracy_full"]
+    assert info["method"] == "none (cnn over budget)" and info["rows_after"] == len(F) and clf.n_neighbors == 5
+    assert len(logged) == 1 and "keeping the full training set" in logged[0]
+    clf, info = fit_condensed(F, y, ["cnn"], knn(5), knn(1), max_loss=np.inf, log=None)
+    assert info["method"] == "cnn" and "cv_accuracy" not in info
+
+def test_held_out_sources_are_not_fitted():
+    F, y = blobs(0.5, n=30)
+    F_aug = np.concatenate([F, F])  # exact copies of every image: a leak would be a perfect match
+    sources = np.concatenate([np.arange(30), np.arange(30)]).astype(str)
+    y_noisy = np.concatenate([y, (y + 1) % 3])  # the copies carry wrong labels
+    full, _ = cross_validate(F_aug, y_noisy, ["enn"], knn(1), knn(1), np.arange(30), sources)
+    assert full == 1.0
+
+def test_holdout_is_per_class():
+    y = np.array([0] * 8 + [1] * 4 + [2])
+    cal = holdout(np.arange(len(y)), y, 0.25)
+    assert np.bincount(y[cal], minlength=3).tolist() == [2, 1, 0]
@@ -0,0 +1,50 @@
+"""Streaming a dataset in batches, and the feature store sync built on it."""
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from tsr.dataset import iter_batches, list_image_paths
+from tsr.feature_store import FeatureStore
+from tsr.features import image_paths_to_feature_matrix
+
+@pytest.fixture
+def dataset(tmp_path):
+    """Two classes of 6x4 PNGs (7 and 4 images), plus one 10x8 image in class b."""
+    rng = np.random.default_rng(0)
+    for label, n in (("a", 7), ("b", 4)):
+        (tmp_path / label).mkdir()
+        for i in range(n):
+            cv2.imwrite(str(tmp_path / label / f"{i}.png"), rng.integers(0, 256, (4, 6, 3), dtype=np.uint8))
+    cv2.imwrite(str(tmp_path / "b" / "big.png"), rng.integers(0, 256, (8, 10, 3), dtype=np.uint8))
+    return tmp_path
+
+def test_batches_shapes_and_labels(dataset):
+    paths, labels = list_image_paths(str(dataset))
+    batches = list(iter_batches(str(dataset), batch_size=5, size=(6, 4), workers=2))
+    assert [X.shape for X, _ in batches] == [(5, 72), (5, 72), (2, 72)]
+    assert all(X.dtype == np.float32 for X, _ in batches)
+    assert np.concatenate([y for _, y in batches]).tolist() == labels
+
+def test_batches_match_features_and_resize(dataset):
+    paths, labels = list_image_paths(str(dataset))
+    small = [i for i, p in enumerate(paths) if not p.endswith("big.png")]
+    X = np.concatenate([X for X, _ in iter_batches(([paths[i] for i in small], [labels[i] for i in small]), 4)])
+    np.testing.assert_array_equal(X, image_paths_to_feature_matrix([paths[i] for i in small]))
+    big = paths.index(str(dataset / "b" / "big.png"))
+    (Xb, yb), = iter_batches(([paths[big]], ["b"]), size=(6, 4))
+    assert Xb.shape == (1, 72) and yb.tolist() == ["b"]
+
+def test_store_sync_matches_direct_features(dataset, tmp_path_factory):
+    os.remove(dataset / "b" / "big.png")
+    store = FeatureStore(str(tmp_path_factory.mktemp("store")))
+    assert store.sync(str(dataset))["decoded"] == 11
+    cv2.imwrite(str(dataset / "a" / "3.png"), np.zeros((4, 6, 3), np.uint8))  # change one, add one
+    cv2.imwrite(str(dataset / "b" / "9.png"), np.full((4, 6, 3), 7, np.uint8))
+    stats = store.sync(str(dataset))
+    assert (stats["reused"], stats["decoded"]) == (10, 2)
+    X, labels = store.open()
+    paths, expected = list_image_paths(str(dataset))
+    np.testing.assert_array_equal(X, image_paths_to_feature_matrix(paths))
+    assert labels.tolist() == expected
@@ -0,0 +1,59 @@
+"""images_to_feature_matrix must reproduce the original per-pixel feature loop."""
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from tsr.features import image_array_to_rgb_list, images_to_feature_matrix
+
+DATA = Path(__file__).resolve().parents[1] / "data" / "train"
+
+def reference_rgb_list(img: np.ndarray) -> list:
+    """The original per-pixel implementation of image_array_to_rgb_list."""
+    h, w = img.shape[0:2]
+    out = []
+    for l in range(h):
+        for c in range(w):
+            r, g, b = img[l][c][:3]
+            out += [float(r), float(g), float(b)]
+    return out
+
+def crops(channels: int, dtype, n: int = 3, size=(7, 5)):
+    rng = np.random.default_rng(channels)
+    if dtype == np.uint8:
+        return [rng.integers(0, 256, size=(*size, channels), dtype=np.uint8) for _ in range(n)]
+    return [rng.random((*size, channels)).astype(dtype) for _ in range(n)]  # plt.imread of a PNG: floats in 0..1
+
+@pytest.mark.parametrize("channels", [3, 4])
+@pytest.mark.parametrize("dtype", [np.uint8, np.float32])
+def test_matches_per_pixel_loop(channels, dtype):
+    imgs = crops(channels, dtype)
+    ref = np.array([reference_rgb_list(im) for im in imgs], dtype=float)
+    np.testing.assert_array_equal(images_to_feature_matrix(imgs, dtype=np.float64), ref)
+    np.testing.assert_array_equal(images_to_feature_matrix(np.stack(imgs), dtype=np.float64), ref)
+    assert [image_array_to_rgb_list(im) for im in imgs] == ref.tolist()
+
+def test_rgba_alpha_is_dropped():
+    rgba = crops(4, np.uint8, n=1)[0]
+    opaque = rgba.copy()
+    opaque[..., 3] = 255
+    np.testing.assert_array_equal(images_to_feature_matrix([rgba]), images_to_feature_matrix([opaque]))
+
+def test_out_buffer_and_shape_checks():
+    imgs = crops(3, np.uint8)
+    out = np.empty((len(imgs), 7 * 5 * 3), np.float32)
+    assert images_to_feature_matrix(imgs, out=out) is out
+    np.testing.assert_array_equal(out, np.array([reference_rgb_list(im) for im in imgs]))
+    with pytest.raises(ValueError):
+        images_to_feature_matrix(imgs + crops(3, np.uint8, n=1, size=(5, 5)))
+    with pytest.raises(ValueError):
+        images_to_feature_matrix(imgs, out=np.empty((len(imgs), 10), np.float32))
+
+@pytest.mark.skipif(not DATA.is_dir(), reason="data/train not available")
+def test_matches_on_dataset_crops():
+    from tsr.dataset import list_image_paths
+    from tsr.features import read_image_to_array
+    paths, _ = list_image_paths(str(DATA))
+    imgs = [read_image_to_array(p) for p in paths[::40][:4]]
+    ref = np.array([reference_rgb_list(im) for im in imgs], dtype=float)
+    np.testing.assert_array_equal(images_to_feature_matrix(imgs, dtype=np.float64), ref)
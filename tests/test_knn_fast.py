@@ -0,0 +1,33 @@
+"""KNNIndex over a memmapped feature store must match the in-memory index."""
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from tsr.feature_store import FeatureStore
+from tsr.knn_fast import KNNIndex
+
+DATA = Path(__file__).resolve().parents[1] / "data" / "train"
+
+def test_blocks_match_one_gemm():
+    rng = np.random.default_rng(0)
+    X, Q = rng.integers(0, 256, size=(300, 50)), rng.integers(0, 256, size=(9, 50))
+    y = np.arange(len(X)) % 3
+    whole = KNNIndex(X, y, k=5)
+    blocked = KNNIndex(X.astype(np.uint8), y, k=5, dtype=None, block_bytes=1)  # 64-row blocks
+    assert blocked.X.dtype == np.uint8 and blocked.block_rows == 64
+    np.testing.assert_array_equal(blocked.sq_distances(Q), whole.sq_distances(Q))
+    np.testing.assert_array_equal(blocked.predict(Q), whole.predict(Q))
+
+@pytest.mark.skipif(not DATA.is_dir(), reason="data/train not available")
+@pytest.mark.parametrize("dtype", ["uint8", "float32"])
+def test_from_store_keeps_the_memmap(tmp_path, dtype):
+    FeatureStore(str(tmp_path)).sync(str(DATA), dtype=dtype)
+    index = KNNIndex.from_store(str(tmp_path))
+    assert isinstance(index.X, np.memmap) and index.X.dtype == dtype
+    X = np.array(index.X)
+    ref = KNNIndex(X, index.labels, dtype=index.dtype)
+    d, i = index.kneighbors(X[:20])
+    d_ref, i_ref = ref.kneighbors(X[:20])
+    np.testing.assert_array_equal(i, i_ref)
+    np.testing.assert_allclose(d, d_ref)
@@ -0,0 +1,53 @@
+"""The uint8 kNN must rank neighbours exactly like the float path."""
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from tsr.knn_fast import KNNIndex
+from tsr.knn_quant import QuantizedKNNClassifier, quantize
+
+DATA = Path(__file__).resolve().parents[1] / "data" / "train"
+
+def pixels(n: int, d: int = 300, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, size=(n, d)).astype(np.float64)
+
+def brute(Q: np.ndarray, X: np.ndarray, metric: str) -> np.ndarray:
+    diff = Q[:, None, :] - X[None, :, :]
+    return (diff ** 2).sum(axis=2) if metric == "ssd" else np.abs(diff).sum(axis=2)
+
+@pytest.mark.parametrize("metric", ["ssd", "sad"])
+@pytest.mark.parametrize("block_bytes", [1 << 22, 1])  # one block / one database row per block
+def test_distances_match_brute_force(metric, block_bytes):
+    X, Q = pixels(150), pixels(7, seed=1)
+    clf = QuantizedKNNClassifier(metric=metric, block_bytes=block_bytes).fit(X, np.arange(len(X)) % 3)
+    assert clf.X_.dtype == np.uint8 and (clf.scale_, clf.offset_) == (1.0, 0.0)
+    np.testing.assert_array_equal(clf.distances(Q), brute(Q, X, metric))
+
+def test_rankings_match_float_index():
+    X, Q = pixels(200), pixels(20, seed=1)
+    y = np.arange(len(X)) % 4
+    ref = KNNIndex(X, y, k=7)
+    clf = QuantizedKNNClassifier(n_neighbors=7).fit(X.astype(np.uint8), y)
+    d_ref, i_ref = ref.kneighbors(Q)
+    d_q, i_q = clf.kneighbors(Q)
+    np.testing.assert_array_equal(i_q, i_ref)
+    np.testing.assert_allclose(d_q, d_ref, rtol=0, atol=1e-6)
+    np.testing.assert_array_equal(clf.predict(Q), ref.predict(Q))
+
+@pytest.mark.skipif(not DATA.is_dir(), reason="data/train not available")
+def test_rankings_match_float_index_on_dataset():
+    from tsr.feature_store import load_features
+    X, labels = load_features(str(DATA))
+    ref = KNNIndex(X, labels, k=9)
+    clf = QuantizedKNNClassifier(n_neighbors=9).fit(X, labels)
+    d_ref, i_ref = ref.kneighbors(X[:40])
+    d_q, i_q = clf.kneighbors(X[:40])
+    np.testing.assert_allclose(d_q, d_ref, rtol=0, atol=1e-6)
+    np.testing.assert_array_equal(i_q, i_ref)
+
+def test_quantize_scaled_range():
+    X = np.array([[-1.0, 0.0, 1.0, 3.0]])
+    np.testing.assert_array_equal(quantize(X, scale=4 / 255, offset=-1.0), [[0, 64, 128, 255]])
+    u8 = np.arange(4, dtype=np.uint8)[None]
+    assert quantize(u8) is u8
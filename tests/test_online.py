@@ -0,0 +1,53 @@
+"""Appending samples to a deployed model: same neighbours as a refit, cost of the new rows only."""
+import pickle
+
+import numpy as np
+import pytest
+
+from tsr.knn_ooc import ChunkedKNNClassifier
+from tsr.online import append_samples
+
+def rows(n: int, seed: int, d: int = 48) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, size=(n, d)).astype(np.float32)
+
+def test_partial_fit_matches_refit():
+    X, y = rows(60, 0), np.arange(60) % 3
+    Q = rows(15, 9)
+    clf = ChunkedKNNClassifier(5).fit(X, y, rows=np.arange(0, 60, 2))  # start from a subset view
+    parts = [(rows(7, 1), np.full(7, 3)), (rows(2, 2), np.arange(2)), (rows(40, 3), np.arange(40) % 4)]
+    for Xa, ya in parts:
+        clf.partial_fit(Xa, ya)
+    X_all = np.concatenate([X[::2]] + [p[0] for p in parts])
+    y_all = np.concatenate([y[::2]] + [p[1] for p in parts])
+    ref = ChunkedKNNClassifier(5).fit(X_all, y_all)
+    np.testing.assert_array_equal(clf.kneighbors(Q)[1], ref.kneighbors(Q)[1])
+    np.testing.assert_array_equal(clf.predict(Q), ref.predict(Q))
+    np.testing.assert_array_equal(clf.classes_, [0, 1, 2, 3])
+
+def test_appends_reuse_the_buffers():
+    clf = ChunkedKNNClassifier(3).fit(rows(50, 0), np.arange(50) % 2)
+    clf.partial_fit(rows(10, 1), np.zeros(10))
+    buf = clf.bufs_[0]
+    assert len(buf) == 120
+    clf.partial_fit(rows(10, 2), np.ones(10))
+    assert clf.bufs_[0] is buf and np.shares_memory(clf.X_, buf) and len(clf) == 70
+
+def test_pickle_keeps_rows_not_spare_capacity():
+    clf = ChunkedKNNClassifier(3).fit(rows(50, 0), np.arange(50) % 2).partial_fit(rows(5, 1), np.zeros(5))
+    back = pickle.loads(pickle.dumps(clf))
+    assert back.bufs_ is None and back.X_.shape == (55, 48)
+    back.partial_fit(rows(5, 2), np.ones(5))
+    np.testing.assert_array_equal(back.X_[:55], clf.X_)
+
+def test_sklearn_bundle_moves_to_an_appendable_engine():
+    KNeighborsClassifier = pytest.importorskip("sklearn.neighbors").KNeighborsClassifier
+    X, y = rows(40, 0, d=12), np.arange(40) % 2
+    bundle = {"model": KNeighborsClassifier(n_neighbors=3).fit(X.astype(np.float64), y), "classes": ["a", "b"]}
+    crops = [im.reshape(2, 2, 3).astype(np.uint8) for im in rows(6, 1, d=12)]
+    append_samples(bundle, crops, ["b", "c", "c", "a", "c", "b"])
+    clf = bundle["model"]
+    assert isinstance(clf, ChunkedKNNClassifier) and bundle["classes"] == ["a", "b", "c"]
+    X_new = np.stack([c.reshape(-1) for c in crops]).astype(np.float64)
+    ref = KNeighborsClassifier(n_neighbors=3).fit(np.concatenate([X, X_new]), np.concatenate([y, [1, 2, 2, 0, 2, 1]]))
+    Q = rows(10, 5, d=12)
+    np.testing.assert_array_equal(clf.predict(Q), ref.predict(Q))
@@ -0,0 +1,27 @@
+"""LatestQueue hand-off between the realtime pipeline stages."""
+import threading
+
+from tsr.realtime import LatestQueue, _CLOSED
+
+def test_drop_stale_replaces_the_oldest():
+    q = LatestQueue(1)
+    assert q.put(1) and q.put(2)
+    assert (q.get(), q.dropped) == (2, 1)
+
+def test_put_after_close_keeps_queued_items():
+    for drop_stale in (True, False):
+        q = LatestQueue(1, drop_stale)
+        q.put("kept")
+        q.close()
+        assert q.put("late") is False
+        assert (q.get(), q.get(), q.dropped) == ("kept", _CLOSED, 0)
+
+def test_blocked_put_returns_on_close():
+    q = LatestQueue(1, drop_stale=False)
+    q.put("kept")
+    results = []
+    t = threading.Thread(target=lambda: results.append(q.put("blocked")))
+    t.start()
+    q.close()
+    t.join(timeout=2.0)
+    assert results == [False] and q.get() == "kept"
@@ -0,0 +1,68 @@
+"""Reaction latency of RobotRuntime on a short simulated drive (fake camera, echo sensor and motors)."""
+import asyncio
+import time
+from pathlib import Path
+
+import cv2
+import pytest
+
+from tsr.bench import fit_default_model
+from tsr.detect import CircleDetector, PRESETS
+from raspberry.motor import FakePCA9685, Motor
+from raspberry.ranging import FakeEchoBackend, Ranger
+from raspberry.robot_async import RobotRuntime, Scenario, SimCamera, STOP_COMMANDS, reaction_latencies
+
+DATA = Path(__file__).resolve().parents[1] / "data" / "train"
+SIGN = DATA / "50.bmp"
+STALE_S = 0.3
+MAX_REACTION_S = 0.6  # obstacle: ranger window median (~0.2 s); watchdog: STALE_S plus a tick
+
+pytestmark = pytest.mark.skipif(not SIGN.exists(), reason="data/train not available")
+
+@pytest.fixture(scope="module")
+def bundle():
+    return fit_default_model(str(DATA))
+
+class StallingCamera(SimCamera):
+    """SimCamera whose read blocks from stall_on to stall_off (scenario time)."""
+
+    def __init__(self, sc: Scenario, stall_on: float, stall_off: float, **kw):
+        super().__init__(cv2.imread(str(SIGN)), sc.sign_visible, **kw)
+        self.sc, self.stall_on, self.stall_off = sc, stall_on, stall_off
+
+    def _grab(self, out):
+        if self.stall_on <= self.sc.now() < self.stall_off:
+            time.sleep(self.stall_off - self.sc.now())
+        return super()._grab(out)
+
+def drive(bundle, sc: Scenario, cam: SimCamera, hang: bool = True) -> RobotRuntime:
+    motor = Motor(FakePCA9685())
+    ranger = Ranger(FakeEchoBackend(sc.distance_cm, noise_cm=1.0))
+    rt = RobotRuntime(cam, bundle, CircleDetector(PRESETS["robot"], pad=15), motor, ranger,
+                      stale_s=STALE_S, before_vision=sc.hang if hang else None, log=lambda msg: None)
+    with cam:
+        ranger.start()
+        sc.start()
+        try:
+            asyncio.run(rt.run(sc.end))
+        finally:
+            ranger.stop()
+            motor.close()
+    return rt
+
+def test_every_event_gets_a_timely_reaction(bundle):
+    sc = Scenario(sign_on=0.3, obstacle_on=0.9, obstacle_off=1.5, hang_on=2.1, hang_s=0.8, sign_off=3.3, end=3.8)
+    rt = drive(bundle, sc, SimCamera(cv2.imread(str(SIGN)), sc.sign_visible))
+    for name, _, latency, cmd in reaction_latencies(sc, rt.commands):
+        assert latency is not None, f"no reaction to {name!r}"
+        assert latency < MAX_REACTION_S, f"{name!r} answered by {cmd!r} after {latency * 1e3:.0f} ms"
+
+def test_watchdog_brakes_on_a_stalled_camera(bundle):
+    sc = Scenario(sign_on=0.2, obstacle_on=99, obstacle_off=99, hang_on=99, sign_off=99, end=2.4)
+    stall_on, stall_off = 0.9, 1.9
+    rt = drive(bundle, sc, StallingCamera(sc, stall_on, stall_off), hang=False)
+    during = [(t - sc.t0, c) for t, c in rt.commands if stall_on <= t - sc.t0 < stall_off]
+    assert during and during[0][1] == "watchdog"
+    assert during[0][0] - stall_on < MAX_REACTION_S
+    assert all(c in STOP_COMMANDS for _, c in during)  # held at zero until frames flow again
+    assert any(c not in STOP_COMMANDS for t, c in rt.commands if t - sc.t0 >= stall_off)
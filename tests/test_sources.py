@@ -0,0 +1,27 @@
+"""ReplaySource skips unreadable files instead of recursing into them."""
+import cv2
+import numpy as np
+import pytest
+
+from tsr.sources import ReplaySource
+
+@pytest.fixture
+def folder(tmp_path):
+    for i in range(3):
+        cv2.imwrite(str(tmp_path / f"{i}.png"), np.full((4, 6, 3), i, np.uint8))
+    for i in range(3, 3000):  # deeper than the recursion limit
+        (tmp_path / f"{i}.png").write_bytes(b"not an image")
+    return tmp_path
+
+def test_unreadable_files_are_skipped(folder):
+    with ReplaySource(folder, preload=False, loop=True) as src:
+        assert [int(src.read()[0, 0, 0]) for _ in range(5)] == [0, 1, 2, 0, 1]
+    with ReplaySource(folder, preload=False) as src:
+        assert len(list(src)) == 3
+
+def test_raises_after_a_pass_without_frames(tmp_path):
+    for i in range(3):
+        (tmp_path / f"{i}.png").write_bytes(b"")
+    with ReplaySource(tmp_path, preload=False, loop=True) as src:
+        with pytest.raises(SystemExit, match="No readable images"):
+            src.read()